@@ -30,7 +30,13 @@ class CfgSettings():
                 'scanPath': '{}'.format(self.my_cwd),           # path to scan for ROS data types
                 'scanDbStorePath': '{}'.format(self.my_cwd),    # path to store the resulting scan database file
                 'lastLoadedDbFiles': [],                        # list of databases to auto-load (if selected)
-                'reloadLastDbOnStartup': True                   # automatically load database on startup
+                'reloadLastDbOnStartup': True,                  # automatically load database on startup
+                'scanWorkers': 0,                               # number of parser processes for a scan (0 = one per CPU)
+                'scanParser': 'lexer',                          # parsing engine: 'lexer' or 'legacy'
+                'scanCacheFile': '',                            # parse cache file ('' = no cache)
+                'scanAmentIndex': False,                        # scan an install prefix by its ament index (not walking it)
+                'scanCheckpointEvery': 0,                       # files between the checkpoints of a scan (0 = commit at the end)
+                'scanReadThreads': 0                            # threads that read the files ahead of the parser (0 = none)
             }
             self.updateFile()
 
@@ -11,6 +11,9 @@ import os, shutil
 from pathlib import Path
 from idlp import idltypex
 
+# the code templates are next to this file (so an export works from any directory)
+templateDir = os.path.dirname(os.path.realpath(__file__))
+
 # export (create/write) a buildable project (source, CMake, IDL) given a list of types.
 # The resulting file structure will be:
 # <export_dir>:         CMakeLists.txt, USER_QOS_PROFILES.xml
@@ -52,7 +55,7 @@ def export_idl_cxx11_app(trec, typeFileName, typeNameList):
     # typName[0=idKey, 1=typeName, 2=typePath, 3=dbFileName]
     for typName in typeNameList:
         # read & modify template wrap.cxx file
-        fr = open('./cxxp/classwrapexample.cxx.txt', "r")
+        fr = open(os.path.join(templateDir, 'classwrapexample.cxx.txt'), "r")
         frbuf = fr.read()
         fr.close()
         rosPathAndTypeName = '{}::msg::dds_::{}_'.format(typName[2], typName[1])
@@ -67,7 +70,7 @@ def export_idl_cxx11_app(trec, typeFileName, typeNameList):
         fw.close
 
         # read & modify template wrap.hpp file
-        fr = open('./cxxp/classwrapexample.hpp.txt', "r")
+        fr = open(os.path.join(templateDir, 'classwrapexample.hpp.txt'), "r")
         frbuf = fr.read()
         fr.close()
         rosPathAndTypeName = '{}::msg::dds_::{}_'.format(typName[2], typName[1])
@@ -82,11 +85,11 @@ def export_idl_cxx11_app(trec, typeFileName, typeNameList):
         fw.write(frbuf)
         fw.close
 
-    shutil.copyfile('./cxxp/cros2_common.cxx.txt', Path(tfDir, 'src/typeclass', 'cros2_common.cxx'))
-    shutil.copyfile('./cxxp/cros2_common.hpp.txt', Path(tfDir, 'src/typeclass', 'cros2_common.hpp'))
+    shutil.copyfile(os.path.join(templateDir, 'cros2_common.cxx.txt'), Path(tfDir, 'src/typeclass', 'cros2_common.cxx'))
+    shutil.copyfile(os.path.join(templateDir, 'cros2_common.hpp.txt'), Path(tfDir, 'src/typeclass', 'cros2_common.hpp'))
 
     # create example app source file
-    with open('./cxxp/example_app.cxx.txt') as fr:
+    with open(os.path.join(templateDir, 'example_app.cxx.txt')) as fr:
         frbuf = fr.readlines()
     fr.close()
 
@@ -145,7 +148,7 @@ def export_idl_cxx11_app(trec, typeFileName, typeNameList):
     # create CMakeLists.txt file if it doesn't already exist
     # if it does exist, create CMakeLists_typefilename.txt
     # FIXME: figure out how to merge contents of CMakeLists.txt files.
-    with open('./cxxp/CMakeLists.txt.txt') as fr:
+    with open(os.path.join(templateDir, 'CMakeLists.txt.txt')) as fr:
         frbuf = fr.readlines()
     fr.close()
     idx = 0
@@ -176,13 +179,13 @@ def export_idl_cxx11_app(trec, typeFileName, typeNameList):
     fw.close
 
     # copy the CMake support files to the project dir
-    shutil.copyfile('./cxxp/cmake/ConnextDdsAddExample.cmake', Path(tfDir, 'resources/cmake', 'ConnextDdsAddExample.cmake'))
-    shutil.copyfile('./cxxp/cmake/ConnextDdsArgumentChecks.cmake', Path(tfDir, 'resources/cmake', 'ConnextDdsArgumentChecks.cmake'))
-    shutil.copyfile('./cxxp/cmake/ConnextDdsCodegen.cmake', Path(tfDir, 'resources/cmake', 'ConnextDdsCodegen.cmake'))
-    shutil.copyfile('./cxxp/cmake/FindRTIConnextDDS.cmake', Path(tfDir, 'resources/cmake', 'FindRTIConnextDDS.cmake'))
+    shutil.copyfile(os.path.join(templateDir, 'cmake/ConnextDdsAddExample.cmake'), Path(tfDir, 'resources/cmake', 'ConnextDdsAddExample.cmake'))
+    shutil.copyfile(os.path.join(templateDir, 'cmake/ConnextDdsArgumentChecks.cmake'), Path(tfDir, 'resources/cmake', 'ConnextDdsArgumentChecks.cmake'))
+    shutil.copyfile(os.path.join(templateDir, 'cmake/ConnextDdsCodegen.cmake'), Path(tfDir, 'resources/cmake', 'ConnextDdsCodegen.cmake'))
+    shutil.copyfile(os.path.join(templateDir, 'cmake/FindRTIConnextDDS.cmake'), Path(tfDir, 'resources/cmake', 'FindRTIConnextDDS.cmake'))
 
     # copy USER_QOS_PROFILES.xml file if it doesn't already exist
-    shutil.copyfile('./cxxp/USER_QOS_PROFILES.xml.txt', Path(tfDir, 'USER_QOS_PROFILES.xml'))
+    shutil.copyfile(os.path.join(templateDir, 'USER_QOS_PROFILES.xml.txt'), Path(tfDir, 'USER_QOS_PROFILES.xml'))
 
     return str(typeFileName)
 
@@ -5,238 +5,543 @@
 # must display this notice unaltered.
 # This code contains trade secrets of Real-Time Innovations, Inc.
 #
-import os, sys
+# idlparser.py -- parse OMG IDL files into the datatypes/typemembers tables (the '.idl' scan type).
+#   modules are the typePath (a last 'msg'/'srv'/'action' module sets the typeKind, a 'dds_' module is dropped);
+#   structs, consts ('<module>_Constants'), enums and typedefs become records as a .msg file's would.
+#   Unions, bitmasks, bitsets and interfaces are skipped.  A file with a syntax error writes nothing.
 import re
-import json
-from pathlib import Path
-from sqldb import sql3db
+import json, base64
+from sqldb import recbatch
+from sqldb import types as idltypes
+from rosp import roslexer
+
+# tokens: string/char literals, identifiers, numbers, '::' and any other single character
+_tokenPattern = re.compile(r'''
+    \s+ | //[^\n]* | /\*.*?\*/ | ^[ \t]*\#[^\n]*
+  | ( L?"(?:[^"\\\n]|\\.)*" | L?'(?:[^'\\\n]|\\.)*'
+    | [A-Za-z_][A-Za-z0-9_]*
+    | (?:0[xX][0-9a-fA-F]+|[0-9]+\.?[0-9]*(?:[eE][+-]?[0-9]+)?|\.[0-9]+(?:[eE][+-]?[0-9]+)?)[A-Za-z]*
+    | :: | \S )
+''', re.MULTILINE | re.DOTALL | re.VERBOSE)
+_identifier = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# an integer expression that can be evaluated (after the consts it names are replaced by their values)
+_integerExpression = re.compile(r'[0-9a-fA-FxX+\-*/%()<>|&^~ ]+')
+
+_idlTypeLookup = idltypes.typeNumberLookup['idl']
+
+# declarations that are skipped: the types they declare are not stored
+_skippedDeclarations = {'union', 'bitmask', 'bitset', 'interface', 'exception', 'valuetype', 'eventtype', 'abstract',
+                        'local', 'custom', 'component', 'home', 'porttype', 'connector', 'native', 'import', 'typeid', 'typeprefix'}
+
+# the typeKind of a struct in a rosidl 'srv'/'action' module, by its name suffix (see rosparser.rostopic_kinds)
+_kindModules = {'msg', 'srv', 'action'}
+_kindSuffixes = {'srv': [('_Request', 'srv-rq'), ('_Response', 'srv-rr')],
+                 'action': [('_Goal', 'act-g'), ('_Result', 'act-r'), ('_Feedback', 'act-f')]}
+
+# placeholder member for otherwise empty structs (as ROSParser.insert_placeholder_member)
+_placeholderFields = {'memberName': 'structure_needs_at_least_one_member', 'typeName': 'uint8', 'typePath': '', 'attributes': '',
+                      'idkeyRef': str(_idlTypeLookup['uint8']), 'valdefs': '', 'flags': '', 'notes': ''}
+
+
+class IDLError(Exception):
+    pass
+
+
+# split IDL text into tokens
+def tokenize(data):
+    return [token for token in _tokenPattern.findall(data) if token]
+
+# the typePath of a list of modules: (typePath, kind module, in a 'dds_' module)
+def type_path(modules):
+    modules = list(modules)
+    inDds = len(modules) > 0 and modules[-1] == 'dds_'
+    if inDds:
+        modules.pop()
+    kindModule = 'msg'
+    if len(modules) > 0 and modules[-1] in _kindModules:
+        kindModule = modules.pop()
+    return '/'.join(modules), kindModule, inDds
+
+# the typeKind of a type, by the module it is in
+def type_kind(typeName, kindModule):
+    for suffix, typeKind in _kindSuffixes.get(kindModule, []):
+        if typeName.endswith(suffix):
+            return typeKind
+    return 'msg'
+
+# member attributes (JSON) from a list of attributes, outermost first: ['q3', 's10'] -> '{"0": "q3", "1": "s10"}'
+def attributes_json(attribs):
+    if len(attribs) == 0:
+        return ''
+    return json.dumps({str(idx): attrib for idx, attrib in enumerate(attribs)})
+
+# a string literal's text
+def unquote(value):
+    if value.startswith('L'):
+        value = value[1:]
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
 
 class IDLParser():
 
-    def __init__(self, dbase, msg_dirs=[], verbose=False):
-        self._dirs = msg_dirs
-        self._verbose = verbose
-        self._parsed_files = []
-
-    @property
-    def global_message(self):
-        return self._global_message
-
-    def is_primitive(self, name):
-        return msg_type.is_primitive(name)
-
-    @property
-    def dirs(self):
-        return self._dirs
-
-    def prepare_input(self, data):
-        from re import compile, UNICODE, MULTILINE
-        flags = UNICODE | MULTILINE
-
-        pattern = compile('\[[ \n]+', flags)
-        data = pattern.sub('[', data)
-
-        pattern = compile('[ \n]+\]', flags)
-        data = pattern.sub(']', data)
-
-        pattern = compile('\<[ \n]+', flags)
-        data = pattern.sub('<', data)
-
-        pattern = compile('[ \n]+\>', flags)
-        data = pattern.sub('>', data)
-        return data
-
-    # from a file contents, update the database
-    def extract(self, file_contents, file_path, dbase):
-        # clean up contents and make them consistent for easier parsing
-        file_contents = self.prepare_input(file_contents)
-        lines = file_contents.split('\n')
-        lines = self._clear_comments(lines)
-
-        # get the parts of the data type name
-        fileparts = file_path.parts
-        name_base = file_path.stem		# the base of the typenames to be produced
-        file_suffix = file_path.suffix
-        module_path = fileparts[-3] + '/' + fileparts[-2]
-        #path_type = fileparts[-2]		# msg, srv, action
-        #path_group = fileparts[-3]		# the 'group', such as: std_msgs, sensor_msgs, etc.
-
-        # start holders for a datatype or constmodule
-        # datatypes: idkey, kind, name, mpath, inhids, mids, tags, flags, notes
-        dtype = { 'idkey': '0', 'kind': 'msg', 'name': name_base, 'mpath': module_path, 'inhids': '', 'mids': '', 'flags': '', 'notes': '' }
-        dtype_midrefs = []
-        typemember_count = 0
-        ctype = { 'idkey': '0', 'kind': 'msg-const', 'name': name_base + '_Constants', 'mpath': module_path, 'inhids': '', 'mids': '', 'flags': '', 'notes': '' }
-        const_member_ids = []
-        const_count = 0
-        type_name = name_base
-        commit_type = False
-        # for each file, set the type (this helps select the topic names)
-        if file_suffix == '.msg':
-            rtypePair = rostopic_kinds[0]
-        elif file_suffix == '.srv':
-            rtypePair = rostopic_kinds[1]
-        elif file_suffix == '.action':
-            rtypePair = rostopic_kinds[3]
-        
-        # parse each line, building and storing as items are completed
-        for line in lines:
-            # get the parts of each line
-            line = line.strip()
-            # print(line)
-         
-            # if there's a divider in a SRV or ACTION file, update the mode and database
-            if 'msg' not in rtypePair and line.find('---') >= 0 and line.find('----') < 0:
-                type_name = name_base + list(rtypePair.values())[0]
-                if const_count > 0:
-                    ctype['mids'] = json.dumps(const_member_ids)
-                    ctype['name'] = type_name + '_Constants'
-                    ctype['kind'] = list(rtypePair.keys())[0] + '-const'
-                    typeid = dbase.datatype_insert(ctype)
-                    dtype['inhids'] = typeid
-                    const_count = 0
-                    const_member_ids.clear()
-
-                if typemember_count > 0:
-                    dtype['mids'] = json.dumps(dtype_midrefs)
-                    dtype['name'] = type_name
-                    dtype['kind'] = list(rtypePair.keys())[0]
-                    dbase.datatype_insert(dtype)
-                    typemember_count = 0
-                    dtype_midrefs.clear()
-                else:
-                    # if a data type has no members, create a default 
-                    dummy_id = [self.placeholder_member_id]
-                    dtype['mids'] = json.dumps(dummy_id)
-                    dtype['name'] = type_name
-                    dtype['kind'] = list(rtypePair.keys())[0]
-                    dbase.datatype_insert(dtype)
-
-                # go to next kind
-                rtIdx = rostopic_idx(list(rtypePair.keys())[0])
-                rtypePair = rostopic_kinds[rtIdx + 1]
+    def __init__(self, dbase):
+        self.dbase = dbase
+
+    # from a file contents, update the database (same signature as ROSParser.extract)
+    # module_path is not used: the modules of the file give the typePath of its types
+    def extract(self, file_contents, file_path, tags, dbase, module_path=None):
+        self.tokens = tokenize(file_contents)
+        self.pos = 0
+        self.reset(file_path, tags)
+        try:
+            self.parse_definitions(None)
+            self.write_constants()
+        except IDLError as e:
+            dbase.diagnostic_add('error', 'parse', 'IDL parse error: {}'.format(e))
+            return
+        self.write_records(dbase)
+
+    # the parse state of a file (also used by xmlparser.XMLParser)
+    def reset(self, file_path, tags):
+        self.file_path = file_path
+        self.tags = tags
+        self.notes = roslexer.source_notes(file_path)
+        # (the records are collected first: nothing is written if the file has an error)
+        self.batch = recbatch.RecordBatch()
+        self.scope = []             # the names of the modules we are in
+        self.scopeConsts = [[]]     # per module (and the file): the idkeys of its const members
+        self.consts = {}            # scoped name: value text
+        self.typedefs = {}          # scoped name: type spec (see type_spec())
+        self.localTypes = {}        # scoped name: (typeName, typePath) of the structs/enums of this file
+        self.structIds = {}         # scoped name: idkey of the structs of this file
+        self.constTypes = {}        # (typePath, typeName): idkey of the _Constants types of this file
+        self.placeholderId = None
+
+    # replay the records collected into the database
+    def write_records(self, dbase):
+        for (tableName, record), (tableName_, idkey) in zip(self.batch.records, self.batch.recordIds):
+            if tableName == 'datatypes':
+                dbase.datatype_insert(record)
+            else:
+                dbase.member_insert(record, idkey)
+        for diagnostic in self.batch.diagnostics:
+            dbase.diagnostic_add(**diagnostic)
+
+    # token access
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        if self.pos >= len(self.tokens):
+            raise IDLError('unexpected end of file')
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def accept(self, token):
+        if self.peek() == token:
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, token):
+        found = self.next()
+        if found != token:
+            raise IDLError("expected '{}', found '{}' (near: {})".format(token, found, self.context()))
+
+    def identifier(self):
+        token = self.next()
+        if not _identifier.fullmatch(token):
+            raise IDLError("expected a name, found '{}' (near: {})".format(token, self.context()))
+        return token
+
+    def scoped_name(self, first=None):
+        token = self.next() if first is None else first
+        name = ''
+        if token == '::':
+            name = '::'
+            token = self.next()
+        if not _identifier.fullmatch(token):
+            raise IDLError("expected a type name, found '{}' (near: {})".format(token, self.context()))
+        name += token
+        while self.peek() == '::':
+            self.next()
+            name += '::' + self.identifier()
+        return name
+
+    # the tokens around the current one, for error messages
+    def context(self):
+        return ' '.join(self.tokens[max(0, self.pos - 5):self.pos + 3])
+
+    # the tokens between an opening token and its closing one (nested pairs included)
+    def balanced(self, opening, closing):
+        self.expect(opening)
+        tokens = []
+        depth = 1
+        while True:
+            token = self.next()
+            if token == opening:
+                depth += 1
+            elif token == closing:
+                depth -= 1
+                if depth == 0:
+                    return tokens
+            tokens.append(token)
+
+    # skip a declaration, up to its ';' (and over its {} body)
+    def skip_declaration(self):
+        depth = 0
+        while True:
+            token = self.next()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            elif token == ';' and depth <= 0:
+                return
 
+    # find a scoped name in one of the tables, as IDL does: from the innermost module out
+    def lookup(self, table, scopedName):
+        if scopedName.startswith('::'):
+            return table.get(scopedName[2:])
+        for idx in range(len(self.scope), -1, -1):
+            value = table.get('::'.join(self.scope[:idx] + [scopedName]))
+            if value is not None:
+                return value
+        return None
+
+    def scoped(self, name):
+        return '::'.join(self.scope + [name])
+
+
+    # definitions, up to the 'end' token (None: the end of the file)
+    def parse_definitions(self, end):
+        while self.peek() != end:
+            if self.peek() is None:
+                raise IDLError("missing '{}'".format(end))
+            self.parse_definition()
+
+    def parse_definition(self):
+        self.parse_annotations()
+        token = self.next()
+        if token == 'module':
+            self.parse_module()
+        elif token == 'struct':
+            self.parse_struct()
+        elif token == 'enum':
+            self.parse_enum()
+        elif token == 'typedef':
+            self.parse_typedef()
+        elif token == 'const':
+            self.parse_const()
+        elif token == ';':
+            pass
+        elif token in _skippedDeclarations:
+            self.batch.diagnostic_add('info', 'unsupported', 'Skipping IDL {} {} (not supported)'.format(token, self.peek()))
+            self.skip_declaration()
+        else:
+            raise IDLError("unexpected '{}' (near: {})".format(token, self.context()))
+
+    # annotations before a declaration or member: { name: [argument tokens] }
+    def parse_annotations(self):
+        annotations = {}
+        while self.peek() == '@':
+            self.next()
+            name = self.scoped_name()
+            if name == 'annotation':
+                # an annotation type declaration
+                self.skip_declaration()
+                continue
+            arguments = []
+            if self.peek() == '(':
+                arguments = self.balanced('(', ')')
+            annotations[name] = arguments
+        return annotations
+
+    def parse_module(self):
+        name = self.identifier()
+        self.expect('{')
+        self.scope.append(name)
+        self.scopeConsts.append([])
+        self.parse_definitions('}')
+        self.expect('}')
+        self.accept(';')
+        self.write_constants()
+        self.scopeConsts.pop()
+        self.scope.pop()
+
+    def parse_struct(self):
+        name = self.identifier()
+        if self.accept(';'):
+            return      # forward declaration
+        base = None
+        if self.accept(':'):
+            base = self.scoped_name()
+        self.expect('{')
+        memberIds = []
+        while not self.accept('}'):
+            memberIds.extend(self.parse_members())
+        self.expect(';')
+        self.write_struct(name, base, memberIds)
+
+    # one member line: type name[, name..];  returns the member idkeys
+    def parse_members(self):
+        annotations = self.parse_annotations()
+        typeSpec = self.type_spec()
+        memberIds = []
+        while True:
+            memberName = self.identifier()
+            dims = self.array_dims()
+            memberIds.append(self.write_member(memberName, typeSpec, dims, annotations))
+            if not self.accept(','):
+                break
+        self.expect(';')
+        return memberIds
+
+    def parse_enum(self):
+        name = self.identifier()
+        self.expect('{')
+        enumerators = []
+        value = 0
+        while True:
+            annotations = self.parse_annotations()
+            if 'value' in annotations:
+                try:
+                    value = int(self.evaluate(annotations['value']), 0)
+                except ValueError:
+                    raise IDLError('enumerator value is not an integer (near: {})'.format(self.context()))
+            enumerators.append((self.identifier(), value))
+            value += 1
+            if not self.accept(','):
+                break
+        self.expect('}')
+        self.expect(';')
+        self.write_enum(name, enumerators)
+
+    def parse_typedef(self):
+        typeSpec = self.type_spec()
+        while True:
+            name = self.identifier()
+            dims = self.array_dims()
+            self.typedefs[self.scoped(name)] = dict(typeSpec, attribs=dims + typeSpec['attribs'])
+            if not self.accept(','):
+                break
+        self.expect(';')
+
+    def parse_const(self):
+        typeSpec = self.type_spec()
+        name = self.identifier()
+        self.expect('=')
+        value = self.const_value(';')
+        self.expect(';')
+        self.consts[self.scoped(name)] = value
+        if self.scope[-1:] == ['dds_'] or (len(self.scope) > 1 and self.scope[-2] == 'dds_'):
+            name = name[:-1] if name.endswith('_') else name
+        value = unquote(value)
+        if typeSpec['typeName'] == 'boolean':
+            value = value.upper()
+        member = {'memberName': name, 'typeName': typeSpec['typeName'], 'typePath': typeSpec['typePath'], 'attributes': attributes_json(typeSpec['attribs']),
+                  'idkeyRef': typeSpec['idkeyRef'], 'valdefs': json.dumps({'const': value}), 'tags': self.tags, 'flags': typeSpec['flags'], 'notes': ''}
+        self.scopeConsts[-1].append(self.batch.member_insert(member))
+
+    # [N][M]..: ['aN', 'aM', ..]
+    def array_dims(self):
+        dims = []
+        while self.accept('['):
+            dims.append('a' + self.const_value(']'))
+            self.expect(']')
+        return dims
+
+    # a type: { typeName, typePath, idkeyRef, flags, attribs: [attributes, outermost first] }
+    def type_spec(self):
+        token = self.next()
+        if token == 'sequence':
+            self.expect('<')
+            elementSpec = self.type_spec()
+            bound = '-1'
+            if self.accept(','):
+                bound = self.const_value('>')
+            self.expect('>')
+            return dict(elementSpec, attribs=['q' + bound] + elementSpec['attribs'])
+        if token == 'string' or token == 'wstring':
+            bound = '-1'
+            if self.accept('<'):
+                bound = self.const_value('>')
+                self.expect('>')
+            return self.primitive(token, ['s' + bound])
+        if token == 'unsigned':
+            token += ' ' + self.next()
+            if token == 'unsigned long' and self.accept('long'):
+                token += ' long'
+        elif token == 'long':
+            if self.accept('long'):
+                token += ' long'
+            elif self.accept('double'):
+                token += ' double'
+        if token in _idlTypeLookup:
+            return self.primitive(token, [])
+        if token == 'fixed' and self.peek() == '<':
+            self.balanced('<', '>')
+
+        scopedName = self.scoped_name(token)
+        typedef = self.lookup(self.typedefs, scopedName)
+        if typedef is not None:
+            return typedef
+        return self.type_reference(scopedName)
+
+    def primitive(self, typeName, attribs):
+        typeNumber = _idlTypeLookup[typeName]
+        return {'typeName': idltypes.typeNumberToTypeName(typeNumber, 'idl'), 'typePath': '', 'idkeyRef': str(typeNumber), 'flags': '', 'attribs': attribs}
+
+    # a reference to a struct/enum (resolved after the scan, as a .msg file's)
+    def type_reference(self, scopedName):
+        localType = self.lookup(self.localTypes, scopedName)
+        if localType is not None:
+            return {'typeName': localType[0], 'typePath': localType[1], 'idkeyRef': '-1', 'flags': '', 'attribs': []}
+        names = scopedName.lstrip(':').split('::')
+        typeName = names[-1]
+        if len(names) > 1:
+            typePath, kindModule, inDds = type_path(names[:-1])
+            flags = ''
+        else:
+            # in the module of this file, or another one: found by name if not in this module
+            typePath, kindModule, inDds = type_path(self.scope)
+            flags = 'IMPLIEDPATH'
+        if inDds and typeName.endswith('_'):
+            typeName = typeName[:-1]
+        return {'typeName': typeName, 'typePath': typePath, 'idkeyRef': '-1', 'flags': flags, 'attribs': []}
+
+    # the value of an expression, up to the 'end' token: integer expressions are evaluated
+    # (with the values of the consts they name), anything else is kept as text
+    def const_value(self, end):
+        tokens = []
+        depth = 0
+        while True:
+            token = self.peek()
+            if token is None or (depth == 0 and (token == end or token == ';')):
+                break
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+            tokens.append(self.next())
+        if len(tokens) == 0:
+            raise IDLError("missing value (near: {})".format(self.context()))
+        return self.evaluate(tokens)
+
+    def evaluate(self, tokens):
+        if len(tokens) == 1 and tokens[0].isdigit():
+            return tokens[0]
+        values = []
+        for token in tokens:
+            value = self.lookup(self.consts, token) if _identifier.fullmatch(token) else None
+            values.append(token if value is None else value)
+        text = ''.join(values)
+        if _integerExpression.fullmatch(text) and '.' not in text:
+            try:
+                return str(int(eval(text.replace('/', '//'), {'__builtins__': {}})))
+            except Exception:
+                pass
+        return text
+
+    # the valdefs of a member, from its annotations
+    def member_valdefs(self, annotations):
+        valdefs = {}
+        if 'default' in annotations:
+            value = self.annotation_parameters(annotations['default']).get('value', '')
+            try:
+                valdefs['default'] = json.loads(value)
+            except ValueError:
+                # (as a .msg file's default that isn't JSON)
+                valdefs['default-x'] = base64.b64encode(value.encode('utf8')).decode('ascii')
+        if 'range' in annotations:
+            valdefs['range'] = True
+            valdefs.update(self.annotation_parameters(annotations['range']))
+        for name in ('min', 'max'):
+            if name in annotations:
+                valdefs[name] = self.annotation_parameters(annotations[name]).get('value', '')
+        return json.dumps(valdefs) if len(valdefs) > 0 else ''
+
+    # the parameters of an annotation: (value) or (name=value, ..)
+    def annotation_parameters(self, tokens):
+        parameters = {}
+        part = []
+        for token in tokens + [',']:
+            if token != ',':
+                part.append(token)
+                continue
+            if len(part) >= 2 and part[1] == '=':
+                parameters[part[0]] = self.evaluate(part[2:])
+            elif len(part) > 0:
+                parameters['value'] = self.evaluate(part)
+            part = []
+        return parameters
+
+
+    # write the records
+    def write_member(self, memberName, typeSpec, dims, annotations):
+        member = {'memberName': memberName, 'typeName': typeSpec['typeName'], 'typePath': typeSpec['typePath'],
+                  'attributes': attributes_json(dims + typeSpec['attribs']), 'idkeyRef': typeSpec['idkeyRef'],
+                  'valdefs': self.member_valdefs(annotations), 'tags': self.tags, 'flags': typeSpec['flags'], 'notes': ''}
+        return self.batch.member_insert(member)
+
+    def write_struct(self, name, base, memberIds):
+        typePath, kindModule, inDds = type_path(self.scope)
+        scopedName = self.scoped(name)
+        if inDds and name.endswith('_'):
+            name = name[:-1]
+        if len(memberIds) == 0:
+            if self.placeholderId is None:
+                self.placeholderId = self.batch.member_insert(dict(_placeholderFields, tags=self.tags))
+            memberIds = [self.placeholderId]
+        inheritIds = []
+        constId = self.constTypes.get((typePath, name + '_Constants'))
+        if constId is not None:
+            inheritIds.append(constId)
+        if base is not None:
+            baseId = self.lookup(self.structIds, base)
+            if baseId is None:
+                self.batch.diagnostic_add('warning', 'unsupported', 'IDL struct {}: base type {} is not in this file (not stored)'.format(name, base),
+                                          typeName=name, typePath=typePath)
             else:
-                new_const = False
-
-                # columns: idkey, name, tname, attrib, idref, valdef, tags, flags, notes
-                line_members = {'attrib': '', 'valdef': '', 'flags': '', 'notes': ''}
-
-                # insert code revision ------------------------------
-                # line[0] to first (' ' or '<' or '[') == typename
-                endIdx = -1
-                match = re.search('[^a-zA-Z0-9_/]', line)
-                if match:
-                    endIdx = match.start()
-                if endIdx == -1:
-                    print("Error parsing typename in line: {}".format(line))
-                    continue
-                line_members['typeName'] = line[0:endIdx]
-
-                # skip any whitespace
-                startIdx = endIdx
-                match = re.search('[^ \t]', line[startIdx:])
-                if match:
-                    startIdx += match.start()
-
-                # if '[' or '<' then attrib
-                if line[startIdx] == '[' or line[startIdx] == '<':
-                    # search ahead to the first non-(space, 0-9, <, =, [, ]) char
-                    endIdx = -1
-                    match = re.search('[^ 0-9<=\[\]]', line[startIdx:])
-                    if match:
-                        endIdx = match.start()
-                        endIdx += startIdx
-                    if endIdx == -1:
-                        print("attrib parse error on line: {}".format(line))
-                        continue
-                    line_members['attributes'] = ''.join(line[startIdx:endIdx].split())
-                    startIdx = endIdx
-
-                # next word is Name; get until ' ' or '=' or EOL
-                # find next space, '=', or end of buffer
-                endIdx = -1
-                match = re.search('[ =\n]', line[startIdx:])
-                if match == None:
-                    line_members['memberName'] = line[startIdx:]
-                else:
-                    endIdx = match.start()
-                    endIdx += startIdx
-                    line_members['memberName'] = line[startIdx:endIdx]
-                    startIdx = endIdx
-            
-                    # if ' ' move to next non-space
-                    match = re.search('[^ \t]', line[startIdx:])
-                    if match:
-                        startIdx += match.start()
-
-                    # if '=' then const
-                    if line[startIdx] == '=':
-                        line_members['valdef'] = '{{"const": "{}"}}'.format(line[startIdx+1:].strip())
-                        new_const = True
-
-                    # else default value
-                    else:
-                        line_members['valdef'] = '{{"default": "{}"}}'.format(line[startIdx:].strip())
-
-                # put this member into the database (returns the IDkey)
-                line_members['idkeyRef'] = str(idltypes.typeNameToTypeNumber(line_members['typeName'], 'idl'))
-                elemkey = dbase.member_insert(line_members)
-
-                # was this a const member?
-                if new_const:
-                    const_member_ids.append(elemkey)
-                    const_count += 1
-                else:
-                    dtype_midrefs.append(elemkey)
-                    typemember_count += 1
-
-        # when finished, commit the datatype and optional const group
-        type_name = name_base + list(rtypePair.values())[0]
-
-        if const_count > 0:
-            ctype['mids'] = json.dumps(const_member_ids)
-            ctype['name'] = type_name + '_Constants'
-            ctype['kind'] = list(rtypePair.keys())[0] + '-const'
-            typeid = dbase.datatype_insert(ctype)
-            dtype['inhids'] = typeid
-
-        if typemember_count > 0:
-            dtype['mids'] = json.dumps(dtype_midrefs)
-            dtype['name'] = type_name
-            dtype['kind'] = list(rtypePair.keys())[0]
-            dbase.datatype_insert(dtype)
+                inheritIds.append(baseId)
+        dtype = {'typeName': name, 'typePath': typePath, 'typeKind': type_kind(name, kindModule),
+                 'inherits': json.dumps(inheritIds) if len(inheritIds) > 0 else '', 'memberList': json.dumps(memberIds),
+                 'tags': self.tags, 'flags': '', 'notes': self.notes}
+        self.structIds[scopedName] = self.batch.datatype_insert(dtype)
+        self.localTypes[scopedName] = (name, typePath)
+
+    # an enum: [(enumerator, value)] as const int32 members
+    def write_enum(self, name, enumerators):
+        typePath, kindModule, inDds = type_path(self.scope)
+        memberIds = []
+        for enumerator, value in enumerators:
+            self.consts[self.scoped(enumerator)] = str(value)
+            member = {'memberName': enumerator, 'typeName': 'int32', 'typePath': '', 'attributes': '', 'idkeyRef': str(_idlTypeLookup['int32']),
+                      'valdefs': json.dumps({'const': str(value)}), 'tags': self.tags, 'flags': '', 'notes': ''}
+            memberIds.append(self.batch.member_insert(member))
+        dtype = {'typeName': name, 'typePath': typePath, 'typeKind': kindModule + '-enum', 'inherits': '', 'memberList': json.dumps(memberIds),
+                 'tags': self.tags, 'flags': '', 'notes': self.notes}
+        self.batch.datatype_insert(dtype)
+        self.localTypes[self.scoped(name)] = (name, typePath)
+
+    # the consts of the module being closed, as a _Constants datatype
+    def write_constants(self):
+        constIds = self.scopeConsts[-1]
+        if len(constIds) == 0:
+            return
+        moduleName = self.scope[-1] if len(self.scope) > 0 else ''
+        if moduleName.endswith('_Constants'):
+            # rosidl: module Foo_Constants { const .. }; struct Foo { .. };
+            typeName = moduleName
+            typePath, kindModule, inDds = type_path(self.scope[:-1])
+            typeKind = type_kind(moduleName[:-len('_Constants')], kindModule) + '-const'
         else:
-            # if a data type has no members, create a default 
-            dummy_id = [self.placeholder_member_id]
-            dtype['mids'] = json.dumps(dummy_id)
-            dtype['name'] = type_name
-            dtype['kind'] = list(rtypePair.keys())[0]
-            dbase.datatype_insert(dtype)
-            
-    def _clear_comments(self, lines):
-        output_lines = []
-        in_comment = False
-
-        for line in lines:
-            line = line.strip()
-            output_line = ''
-            if line.find('#') >= 0:
-                line = line[:line.find('#')]
-
-            for token in line.split(' '):
-                if token.find('{') >= 0:
-                    token = token.replace('{', ' { ')
-                if token.find(':') >= 0:
-                    token = re.sub(r'([a-zA-Z0-9_]{1}):([a-zA-Z0-9_]{1}|$)', r'\1 : \2', token)
-                if token.find(';') >= 0:
-                    token = token.replace(';', ' ;')
-                if token.find('(') >= 0:
-                    token = token.replace('(', ' ( ')
-                token = token.replace(',', ' , ')
-                token = token.replace(')', ' ) ')
-                token = token.replace('}', ' } ')
-                output_line = output_line + ' ' + token.strip()
-            if len(output_line.strip()) > 0:
-                output_lines.append(output_line.strip() + '\n')
-        return output_lines
+            # (consts outside of any module, or in a kind module: 'Constants')
+            typePath, kindModule, inDds = type_path(self.scope)
+            typeName = 'Constants' if len(moduleName) == 0 or moduleName in _kindModules or moduleName == 'dds_' else moduleName + '_Constants'
+            typeKind = kindModule + '-const'
+        dtype = {'typeName': typeName, 'typePath': typePath, 'typeKind': typeKind, 'inherits': '', 'memberList': json.dumps(constIds),
+                 'tags': self.tags, 'flags': '', 'notes': self.notes}
+        self.constTypes[(typePath, typeName)] = self.batch.datatype_insert(dtype)
@@ -0,0 +1,98 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# test_idlparser.py -- the IDL exported from a scanned workspace parses back to the same types
+#   python3 -m pytest idlp
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from sqldb import sql3db, recbatch
+from rosp import rosscan
+from idlp import idlparser, idltypex
+
+# a small workspace: constants, nested/sequence/bounded members, a service
+workspaceFiles = {
+    'geo/msg/Point.msg': 'float64 x\nfloat64 y\nfloat64 z\n',
+    'geo/msg/Pose.msg': 'uint8 RED=1\nuint8 GREEN=2\nPoint position\nPoint[] path\nstring<=10 name\nint32[4] fixed\nuint16[<=3] few\nstring[] names\n',
+    'geo/srv/Add.srv': 'int64 a\nint64 b\n---\nint64 sum\n'
+}
+
+def write_files(rootDir, files):
+    for relPath, text in files.items():
+        filePath = os.path.join(rootDir, relPath)
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+        with open(filePath, 'w') as fileOut:
+            fileOut.write(text)
+
+# export all the types of a database (each with its dependencies, once, as scan_cli export does)
+def export_types(dbName, exportFunction, fileName):
+    mydb = sql3db.SQL3Util(dbName, readOnly=True)
+    try:
+        refTree = mydb.datatypes_reftree()
+        typeInfoToExport = []
+        exportedIds = set()
+        for dtKey in sorted(refTree, key=lambda dtKey: (refTree[dtKey][1], refTree[dtKey][0])):
+            for typeItem in reversed(mydb.get_record_tree_by_typename_or_idkey('', '', dtKey)):
+                if typeItem[0][0] not in exportedIds:
+                    exportedIds.add(typeItem[0][0])
+                    typeInfoToExport.append(typeItem)
+    finally:
+        mydb.database_close()
+    exportFunction(typeInfoToExport, fileName)
+    with open(fileName, 'r') as fileIn:
+        return fileIn.read()
+
+# {(typeName, typePath)} of a database
+def type_names(dbName):
+    mydb = sql3db.SQL3Util(dbName, readOnly=True)
+    try:
+        return {(dtVal[0], dtVal[1]) for dtVal in mydb.datatypes_reftree().values()}
+    finally:
+        mydb.database_close()
+
+def parse_idl(text, filePath):
+    batch = recbatch.RecordBatch(filePath)
+    idlparser.IDLParser(batch).extract(text, Path(filePath), ['t'], batch)
+    return batch
+
+class TestIDLRoundTrip(unittest.TestCase):
+
+    def test_export_parse_export(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            write_files(os.path.join(tmpDir, 'ws'), workspaceFiles)
+            rosDb = os.path.join(tmpDir, 'ros.db')
+            rosscan.scan_paths([os.path.join(tmpDir, 'ws')], rosscan.rosDataTypes, ['t'], rosDb)
+            idlText = export_types(rosDb, idltypex.export_idl_type_file, os.path.join(tmpDir, 'ros_types.idl'))
+
+            write_files(os.path.join(tmpDir, 'idl'), {'types.idl': idlText})
+            idlDb = os.path.join(tmpDir, 'idl.db')
+            rosscan.scan_paths([os.path.join(tmpDir, 'idl')], rosscan.idlDataTypes, ['t'], idlDb)
+            self.assertEqual(export_types(idlDb, idltypex.export_idl_type_file, os.path.join(tmpDir, 'idl_types.idl')), idlText)
+
+            # the types keep their ROS names and paths
+            self.assertEqual(type_names(idlDb), type_names(rosDb))
+
+class TestIDLConstants(unittest.TestCase):
+
+    def const_types(self, text):
+        batch = parse_idl(text, '/tmp/ws/geo/msg/C.idl')
+        return [(record['typeName'], record['typePath'], record['typeKind']) for tableName, record in batch.records
+                if tableName == 'datatypes' and record['typeKind'].endswith('-const')]
+
+    def test_kind_module_constants(self):
+        self.assertEqual(self.const_types('module geo { module msg { const long N = 1; struct S { long a; }; }; };'),
+                         [('Constants', 'geo', 'msg-const')])
+        self.assertEqual(self.const_types('module geo { module msg { module dds_ { const long N = 1; }; }; };'),
+                         [('Constants', 'geo', 'msg-const')])
+
+    def test_type_constants(self):
+        self.assertEqual(self.const_types('module geo { module msg { module S_Constants { const long N = 1; }; struct S { long a; }; }; };'),
+                         [('S_Constants', 'geo', 'msg-const')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# amentindex.py -- find the interface files of an installed ROS 2 prefix from its ament resource index
+#   (share/ament_index/resource_index/rosidl_interfaces/<package>), without walking the install tree.
+import os
+
+resourceIndexDir = os.path.join('share', 'ament_index', 'resource_index')
+interfacesResource = 'rosidl_interfaces'
+
+# does this install prefix have an index of its interfaces?
+def has_index(prefix):
+    return os.path.isdir(os.path.join(prefix, resourceIndexDir, interfacesResource))
+
+# the install prefixes with an index under a scan path ([] = none: walk the path)
+def index_prefixes(path):
+    if has_index(path):
+        return [path]
+    if os.path.isfile(os.path.join(path, '.colcon_install_layout')):
+        try:
+            entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+        except OSError:
+            return []
+        return [entry.path for entry in entries if entry.is_dir() and has_index(entry.path)]
+    return []
+
+# yield (package name, package share directory, [interface paths relative to it]) per package in the index
+def index_packages(prefix):
+    resourceDir = os.path.join(prefix, resourceIndexDir, interfacesResource)
+    for entry in sorted(os.scandir(resourceDir), key=lambda entry: entry.name):
+        if entry.name.startswith('.') or not entry.is_file():
+            continue
+        try:
+            with open(entry.path, 'r', encoding='utf8') as resourceFile:
+                relPaths = [line.strip() for line in resourceFile.read().splitlines()]
+        except (OSError, UnicodeDecodeError) as e:
+            print('Cannot read {}: {}'.format(entry.path, e))
+            continue
+        yield entry.name, os.path.join(prefix, 'share', entry.name), [relPath for relPath in relPaths if len(relPath) > 0]
+
+# yield (file path, package name) for each interface file of the index with one of the rosTypes suffixes.
+# fileCounts: {'idl': count} is updated with the .idl files listed
+def index_files(prefix, rosTypes, fileCounts=None):
+    for packageName, packageDir, relPaths in index_packages(prefix):
+        listed = set(relPaths)
+        for relPath in relPaths:
+            stem, suffix = os.path.splitext(relPath)
+            if suffix == '.idl' and fileCounts is not None:
+                fileCounts['idl'] += 1
+            if suffix in rosTypes:
+                yield os.path.join(packageDir, relPath), packageName
+            elif suffix == '.idl':
+                # (older indexes list only the generated .idl)
+                rosType = '.' + os.path.basename(os.path.dirname(relPath))
+                if rosType in rosTypes and stem + rosType not in listed and os.path.isfile(os.path.join(packageDir, stem + rosType)):
+                    yield os.path.join(packageDir, stem + rosType), packageName
@@ -0,0 +1,99 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# parsebench.py -- check that the parsing engines write the same records, and time them
+#   python3 -m rosp.parsebench <paths..> [--repeat N]
+import sys, time, gc
+import json
+from pathlib import Path
+from sqldb import recbatch
+from rosp import rosscan, roslexer
+
+# the records of a batch, less the scan time in the notes of the datatypes
+def comparable_records(batch):
+    records = []
+    for tableName, record in batch.records:
+        record = dict(record)
+        if tableName == 'datatypes':
+            notes = json.loads(record['notes'])
+            notes.pop('scan', None)
+            record['notes'] = notes
+        records.append((tableName, record))
+    return records
+
+# parse all sources with one engine: (list of seconds per file, list of RecordBatch)
+def parse_all(sources, tags, engine):
+    # each run starts like a new scan (no member lines cached from the last one)
+    roslexer._memberCache.clear()
+    roslexer._attributesCache.clear()
+    batches = [recbatch.RecordBatch(source['path']) for source in sources]
+    filePaths = [Path(source['path']) for source in sources]
+    parserClass = rosscan.parserEngines[engine]
+    # (as timeit does: no garbage collection while timing)
+    fileTimes = []
+    gc.collect()
+    gc.disable()
+    try:
+        for source, filePath, batch in zip(sources, filePaths, batches):
+            startTime = time.perf_counter()
+            parserClass(batch).extract(source['data'], filePath, tags, batch)
+            fileTimes.append(time.perf_counter() - startTime)
+    finally:
+        gc.enable()
+    return fileTimes, batches
+
+def run_bench(paths, tags, repeat=5):
+    myRosTypes = set(rosscan.rosDataTypes)
+    fileCounts = {'ros': 0, 'idl': 0, 'xml': 0}
+    sources = []
+    for filePath in rosscan.walk_datatype_files(paths, myRosTypes, fileCounts):
+        source = rosscan.read_source(filePath)
+        if source is not None and 'diagnostic' not in source:
+            sources.append(source)
+    if len(sources) == 0:
+        print('No data typedef files found')
+        return 1
+
+    # the best time of each file, over the runs
+    times = {}
+    results = {}
+    for engine in rosscan.parserEngines:
+        for i in range(repeat):
+            fileTimes, results[engine] = parse_all(sources, tags, engine)
+            times[engine] = fileTimes if i == 0 else [min(t) for t in zip(times[engine], fileTimes)]
+
+    # the records must be the same as those of the legacy parser
+    mismatches = 0
+    for engine in rosscan.parserEngines:
+        if engine == 'legacy':
+            continue
+        for legacyBatch, batch in zip(results['legacy'], results[engine]):
+            if comparable_records(legacyBatch) != comparable_records(batch):
+                print('{}: records differ from legacy for {}'.format(engine, batch.srcPath))
+                mismatches += 1
+
+    recordCount = sum(len(batch) for batch in results['legacy'])
+    print('{} files, {} records, best of {} runs:'.format(len(sources), recordCount, repeat))
+    print('  engine      total      per file   speedup  (per file: median, slowest)')
+    legacyTotal = sum(times['legacy'])
+    for engine in rosscan.parserEngines:
+        total = sum(times[engine])
+        speedups = sorted(legacyTime / fileTime for legacyTime, fileTime in zip(times['legacy'], times[engine]))
+        print('  {:8s} {:8.1f} ms {:7.1f} us  {:5.1f}x  ({:.1f}x, {:.1f}x)'.format(engine, total * 1000, total * 1e6 / len(sources), legacyTotal / total,
+                                                                               speedups[len(speedups) // 2], speedups[0]))
+    print('records: {}'.format('identical' if mismatches == 0 else '{} files differ'.format(mismatches)))
+    return 0 if mismatches == 0 else 1
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Compare the ROS typedef parsing engines')
+    parser.add_argument('paths', nargs='+', help='paths to scan for .msg/.srv/.action files')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per engine (the best is reported)')
+    parser.add_argument('--tags', nargs='*', default=[], help='tags to add to the parsed types')
+    args = parser.parse_args()
+    sys.exit(run_bench(args.paths, args.tags, args.repeat))
@@ -0,0 +1,214 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# rosarchive.py -- scan the data typedef files inside tarballs, .zip and .deb archives, without extracting them.
+#   Each entry is a source dict with the path <archive path>/<entry path>; a damaged archive is a diagnostic.
+import os, io, time
+import tarfile, zipfile
+from pathlib import Path
+from sqldb import hashutil
+from rosp import roswalk, scanlimits
+
+tarSuffixes = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+zipSuffixes = ('.zip',)
+debSuffixes = ('.deb', '.ddeb')
+typeDirNames = {'msg', 'srv', 'action'}
+
+# is this scan path an archive (by its name)?
+def is_archive(path):
+    lowerPath = path.lower()
+    return lowerPath.endswith(tarSuffixes) or lowerPath.endswith(zipSuffixes) or lowerPath.endswith(debSuffixes)
+
+# is this archive entry a data typedef file: <package>/(msg|srv|action)/<name><suffix>?
+def is_type_entry(entryName, rosTypes):
+    parts = entryName.split('/')
+    return len(parts) >= 3 and parts[-2] in typeDirNames and os.path.splitext(parts[-1])[1] in rosTypes
+
+
+# reads the data typedef files of a set of archives (as rosscan.read_sources() does for files)
+class ArchiveScan():
+
+    # rosTypes: the suffixes to read ('.msg', ..)
+    # manifest: for an incremental scan, the { key: (mtime, size, hash) } of the previous scan
+    def __init__(self, archivePaths, rosTypes, manifest=None):
+        self.archivePaths = archivePaths
+        self.rosTypes = rosTypes
+        self.manifest = manifest
+        self.fileCount = 0          # entries found (by list_archives())
+        self.deletedKeys = []       # keys in the manifest under a (changed) archive, no longer in it
+        self.archiveInfo = []       # (key, mtime, size) of each archive read, for the manifest
+
+    # the manifest key of an archive entry
+    def entry_key(self, archiveKey, entryName):
+        return archiveKey + '/' + entryName
+
+    # count the data typedef entries of the archives, for the walk totals (a damaged archive counts as one)
+    def list_archives(self):
+        for archivePath in self.archivePaths:
+            archiveKey = os.path.abspath(archivePath)
+            try:
+                statInfo = os.stat(archivePath)
+                if self.manifest is not None:
+                    known = self.manifest.get(archiveKey)
+                    if known is not None and known[0] == statInfo.st_mtime_ns and known[1] == statInfo.st_size:
+                        self.fileCount += sum(1 for key in self.manifest if key.startswith(archiveKey + '/'))
+                        continue
+                for entry in self.entries(archivePath):
+                    self.fileCount += 1
+            except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile, ValueError):
+                self.fileCount += 1
+
+    # yield a source dict per (new/changed) data typedef file in the archives;
+    # touched[] gets the (key, mtime, size) of the entries with unchanged content
+    def read_sources(self, touched=None):
+        for archivePath in self.archivePaths:
+            archiveKey = os.path.abspath(archivePath)
+            try:
+                statInfo = os.stat(archivePath)
+            except OSError as e:
+                # gone: whatever it held is deleted
+                yield roswalk.diagnostic_source(archivePath, archiveKey, 0, 0, 'error', 'read', 'Cannot read {}: {}'.format(archivePath, e))
+                if self.manifest is not None:
+                    self.deletedKeys.extend(key for key in self.manifest if key.startswith(archiveKey + '/'))
+                continue
+            if self.manifest is not None:
+                known = self.manifest.get(archiveKey)
+                if known is not None and known[0] == statInfo.st_mtime_ns and known[1] == statInfo.st_size:
+                    continue
+            entryKeys = set()
+            try:
+                for entryName, mtime, size, readEntry in self.entries(archivePath):
+                    key = self.entry_key(archiveKey, entryName)
+                    entryKeys.add(key)
+                    source = self.read_entry(archivePath, entryName, key, mtime, size, readEntry, touched)
+                    if source is not None:
+                        yield source
+            except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile, ValueError) as e:
+                # (keep what was read; mtime 0: read it again next time)
+                yield roswalk.diagnostic_source(archivePath, archiveKey, 0, statInfo.st_size, 'error', 'read', 'Cannot read {}: {}'.format(archivePath, e))
+                continue
+            self.archiveInfo.append((archiveKey, statInfo.st_mtime_ns, statInfo.st_size))
+            if self.manifest is not None:
+                self.deletedKeys.extend(key for key in self.manifest if key.startswith(archiveKey + '/') and key not in entryKeys)
+
+    # one entry into a source dict (None if it is unchanged)
+    def read_entry(self, archivePath, entryName, key, mtime, size, readEntry, touched):
+        if self.manifest is not None:
+            known = self.manifest.get(key)
+            if known is not None and known[0] == mtime and known[1] == size:
+                return None
+        suffix = os.path.splitext(entryName)[1]
+        entryPath = str(Path(archivePath, entryName))
+        reason = roswalk.sniff_reject(b'', size, suffix)
+        if len(reason) > 0:
+            return roswalk.diagnostic_source(entryPath, key, mtime, size, 'warning', 'rejected', 'Not a data typedef file: {} ({})'.format(entryPath, reason))
+        rawData = readEntry()
+        scanlimits.read_bytes(len(rawData))
+        reason = roswalk.sniff_reject(rawData[:roswalk.sniffSize], size, suffix)
+        if len(reason) > 0:
+            return roswalk.diagnostic_source(entryPath, key, mtime, size, 'warning', 'rejected', 'Not a data typedef file: {} ({})'.format(entryPath, reason))
+        contentHash = hashutil.hash_file_contents(rawData)
+        if self.manifest is not None:
+            known = self.manifest.get(key)
+            if known is not None and known[2] == contentHash:
+                touched.append((key, mtime, size))
+                return None
+        try:
+            data = rawData.decode('utf8').replace('\r\n', '\n').replace('\r', '\n')
+        except UnicodeDecodeError as e:
+            return roswalk.diagnostic_source(entryPath, key, 0, size, 'error', 'read', 'Cannot read {}: {}'.format(entryPath, e))
+        return {'path': entryPath, 'key': key, 'mtime': mtime, 'size': size, 'hash': contentHash, 'data': data}
+
+    # yield (entry name, mtime in ns, size, function returning its bytes) for each data typedef entry
+    def entries(self, archivePath):
+        lowerPath = archivePath.lower()
+        if lowerPath.endswith(zipSuffixes):
+            yield from self.zip_entries(archivePath)
+        elif lowerPath.endswith(debSuffixes):
+            yield from self.deb_entries(archivePath)
+        else:
+            with tarfile.open(archivePath, mode='r|*') as tarFile:
+                yield from self.tar_entries(tarFile)
+
+    def tar_entries(self, tarFile):
+        # (a stream: an entry must be read before moving on to the next one)
+        for member in tarFile:
+            entryName = _entry_name(member.name)
+            if member.isfile() and is_type_entry(entryName, self.rosTypes):
+                yield entryName, member.mtime * 1000000000, member.size, lambda: tarFile.extractfile(member).read()
+
+    def zip_entries(self, archivePath):
+        with zipfile.ZipFile(archivePath) as zipFile:
+            for info in zipFile.infolist():
+                entryName = _entry_name(info.filename)
+                if not info.is_dir() and is_type_entry(entryName, self.rosTypes):
+                    mtime = int(_zip_time(info.date_time)) * 1000000000
+                    yield entryName, mtime, info.file_size, lambda: zipFile.read(info)
+
+    # a .deb is an 'ar' archive: '!<arch>\n', then a 60-byte header per member (name, mtime, uid,
+    # gid, mode, size, '`\n'), its data padded to an even size.  The files are in data.tar[.gz|.xz|.zst]
+    def deb_entries(self, archivePath):
+        with open(archivePath, 'rb') as debFile:
+            if debFile.read(8) != b'!<arch>\n':
+                raise ValueError('not a .deb (ar) archive')
+            while True:
+                header = debFile.read(60)
+                if len(header) < 60:
+                    raise ValueError('no data.tar member')
+                if header[58:60] != b'`\n':
+                    raise ValueError('bad ar member header')
+                memberName = header[0:16].decode('ascii').strip().rstrip('/')
+                memberSize = int(header[48:58].decode('ascii').strip())
+                if memberName.startswith('data.tar'):
+                    break
+                debFile.seek(memberSize + memberSize % 2, os.SEEK_CUR)
+
+            memberData = _LimitedReader(debFile, memberSize)
+            if memberName.endswith('.zst'):
+                try:
+                    import zstandard
+                except ImportError:
+                    raise ValueError("zstd-compressed data, needs the 'zstandard' module")
+                with zstandard.ZstdDecompressor().stream_reader(memberData) as tarStream:
+                    with tarfile.open(fileobj=tarStream, mode='r|') as tarFile:
+                        yield from self.tar_entries(tarFile)
+            else:
+                with tarfile.open(fileobj=memberData, mode='r|*') as tarFile:
+                    yield from self.tar_entries(tarFile)
+
+
+# an archive entry name, as a relative path ('./opt/ros/..' -> 'opt/ros/..')
+def _entry_name(name):
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
+
+# a zip entry's date_time (local time) in seconds since the epoch
+def _zip_time(dateTime):
+    try:
+        return time.mktime(dateTime + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0
+
+# a file object that reads at most 'size' bytes from another one
+class _LimitedReader(io.RawIOBase):
+
+    def __init__(self, fileObj, size):
+        self.fileObj = fileObj
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.fileObj.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
@@ -0,0 +1,309 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# rosbag.py -- scan the message definitions recorded in MCAP files and rosbag2 bags, without reading the messages.
+#   Each type of a definition is a source dict with the path <bag path>/<package>/msg/<name>.msg (or .idl).
+import os, re, struct
+import sqlite3
+from pathlib import Path
+from sqldb import hashutil
+from rosp import roswalk, scanlimits
+
+mcapSuffixes = ('.mcap',)
+db3Suffixes = ('.db3',)
+
+_mcapMagic = b'\x89MCAP0\r\n'
+_opFooter = 0x02
+_opSchema = 0x03
+_opChunk = 0x06
+_opSummaryOffset = 0x0E
+_opDataEnd = 0x0F
+_footerSize = 1 + 8 + 20        # opcode, length, (summary start, summary offset start, summary crc)
+
+# the schema encodings with ROS message definitions: the suffix of their sources
+definitionEncodings = {'ros2msg': '.msg', 'ros1msg': '.msg', 'ros2idl': '.idl'}
+_definitionSeparator = re.compile(r'^=+\s*$', re.MULTILINE)
+
+
+class BagError(Exception):
+    pass
+
+
+# is this scan path a recording (by its name, or a rosbag2 directory)?
+def is_bag(path):
+    lowerPath = path.lower()
+    if lowerPath.endswith(mcapSuffixes) or lowerPath.endswith(db3Suffixes):
+        return True
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, 'metadata.yaml'))
+
+# the recording files of a scan path (the files of a rosbag2 directory)
+def bag_files(path):
+    if not os.path.isdir(path):
+        return [path]
+    return sorted(entry.path for entry in os.scandir(path) if entry.is_file() and entry.name.lower().endswith(mcapSuffixes + db3Suffixes))
+
+# (package, 'msg'|'srv'|'action', name) of a type name: 'pkg/msg/Name' (ROS 2) or 'pkg/Name' (ROS 1)
+def split_type_name(typeName):
+    parts = typeName.strip().split('/')
+    if len(parts) == 3:
+        return parts[0], parts[1], parts[2]
+    if len(parts) == 2:
+        return parts[0], 'msg', parts[1]
+    raise BagError('bad type name {}'.format(typeName))
+
+# split a message definition into [(type name, definition text)]: the recorded type first,
+# then the types it uses (each after a separator line, with a 'MSG: <type name>' first line)
+def split_definition(typeName, text):
+    definitions = []
+    sections = _definitionSeparator.split(text.replace('\r\n', '\n'))
+    definitions.append((typeName, sections[0]))
+    for section in sections[1:]:
+        section = section.lstrip('\n')
+        firstLine, _, body = section.partition('\n')
+        label, _, name = firstLine.partition(':')
+        if label.strip() in ('MSG', 'IDL') and len(name.strip()) > 0:
+            definitions.append((name.strip(), body))
+    return definitions
+
+
+# the length-prefixed fields of an MCAP record
+class _RecordReader():
+
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def uint(self, fmt):
+        value = struct.unpack_from(fmt, self.data, self.offset)[0]
+        self.offset += struct.calcsize(fmt)
+        return value
+
+    def string(self):
+        return self.bytes('<I').decode('utf8')
+
+    def bytes(self, lengthFmt):
+        length = self.uint(lengthFmt)
+        value = self.data[self.offset:self.offset + length]
+        if len(value) < length:
+            raise BagError('truncated record')
+        self.offset += length
+        return bytes(value)
+
+# an MCAP Schema record: (name, encoding, data)
+def _schema_of(content):
+    reader = _RecordReader(content)
+    reader.uint('<H')           # (schema id)
+    name = reader.string()
+    encoding = reader.string()
+    return name, encoding, reader.bytes('<I')
+
+# yield (opcode, content) of the records in data (the records of a section, or of a chunk)
+def _records(data):
+    offset = 0
+    while offset + 9 <= len(data):
+        opcode, length = struct.unpack_from('<BQ', data, offset)
+        offset += 9
+        yield opcode, data[offset:offset + length]
+        offset += length
+
+
+# reads the schemas of MCAP files, seeking to them
+class MCAPReader():
+
+    def __init__(self, mcapFile):
+        self.mcapFile = mcapFile
+
+    def read_at(self, offset, length):
+        self.mcapFile.seek(offset)
+        data = self.mcapFile.read(length)
+        scanlimits.read_bytes(len(data))
+        if len(data) < length:
+            raise BagError('truncated file')
+        return data
+
+    # yield (name, encoding, data) of each schema
+    def schemas(self):
+        if self.mcapFile.read(len(_mcapMagic)) != _mcapMagic:
+            raise BagError('not an MCAP file')
+        fileSize = self.mcapFile.seek(0, os.SEEK_END)
+        summaryStart = summaryOffsetStart = 0
+        footerStart = fileSize - len(_mcapMagic) - _footerSize
+        if footerStart > len(_mcapMagic):
+            tail = self.read_at(footerStart, _footerSize + len(_mcapMagic))
+            if tail[_footerSize:] == _mcapMagic and tail[0] == _opFooter:
+                summaryStart, summaryOffsetStart = struct.unpack_from('<QQ', tail, 9)
+        if summaryStart == 0:
+            yield from self.scan_schemas(fileSize)
+            return
+
+        # the schema group of the summary, from its summary offset record (else the whole summary)
+        summaryEnd = summaryOffsetStart if summaryOffsetStart != 0 else footerStart
+        if summaryOffsetStart != 0:
+            for opcode, content in _records(self.read_at(summaryOffsetStart, footerStart - summaryOffsetStart)):
+                if opcode == _opSummaryOffset:
+                    groupOpcode, groupStart, groupLength = struct.unpack_from('<BQQ', content)
+                    if groupOpcode == _opSchema:
+                        summaryStart, summaryEnd = groupStart, groupStart + groupLength
+                        break
+        for opcode, content in _records(self.read_at(summaryStart, summaryEnd - summaryStart)):
+            if opcode == _opSchema:
+                yield _schema_of(content)
+
+    # no summary: read the records one by one (the schemas are in the data section, or in chunks)
+    def scan_schemas(self, fileSize):
+        offset = len(_mcapMagic)
+        seen = set()
+        while offset + 9 <= fileSize:
+            self.mcapFile.seek(offset)
+            opcode, length = struct.unpack('<BQ', self.mcapFile.read(9))
+            offset += 9
+            if opcode in (_opFooter, _opDataEnd):
+                return
+            if opcode == _opSchema:
+                schema = _schema_of(self.read_at(offset, length))
+                if schema[0] not in seen:
+                    seen.add(schema[0])
+                    yield schema
+            elif opcode == _opChunk:
+                for schema in self.chunk_schemas(self.read_at(offset, length)):
+                    if schema[0] not in seen:
+                        seen.add(schema[0])
+                        yield schema
+            offset += length
+
+    def chunk_schemas(self, content):
+        reader = _RecordReader(content)
+        reader.offset += 8 + 8              # (message start/end time)
+        uncompressedSize = reader.uint('<Q')
+        reader.uint('<I')                   # (crc)
+        compression = reader.string()
+        data = reader.bytes('<Q')
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise BagError("zstd-compressed chunks, needs the 'zstandard' module")
+            data = zstandard.ZstdDecompressor().decompress(data, max_output_size=uncompressedSize)
+        elif compression == 'lz4':
+            try:
+                import lz4.frame
+            except ImportError:
+                raise BagError("lz4-compressed chunks, needs the 'lz4' module")
+            data = lz4.frame.decompress(data)
+        elif len(compression) > 0:
+            raise BagError('unknown chunk compression {}'.format(compression))
+        for opcode, recordContent in _records(data):
+            if opcode == _opSchema:
+                yield _schema_of(recordContent)
+
+# yield (name, encoding, data) of each schema of an MCAP file
+def mcap_schemas(filePath):
+    with open(filePath, 'rb') as mcapFile:
+        yield from MCAPReader(mcapFile).schemas()
+
+# yield (name, encoding, data) of each message definition of a rosbag2 .db3 file
+def db3_schemas(filePath):
+    connection = sqlite3.connect(Path(filePath).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        tableNames = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if 'message_definitions' not in tableNames:
+            if 'topics' not in tableNames:
+                raise BagError('not a rosbag2 file')
+            raise BagError('no message definitions (recorded before ROS 2 Jazzy)')
+        for typeName, encoding, definition in connection.execute('SELECT topic_type, encoding, encoded_message_definition FROM message_definitions').fetchall():
+            yield typeName, encoding, definition.encode('utf8') if isinstance(definition, str) else definition
+    finally:
+        connection.close()
+
+
+# reads the message definitions of a set of recordings (as rosarchive.ArchiveScan does for archives)
+class BagScan():
+
+    # types: the suffixes to read ('.msg', .. '.idl')
+    # manifest: for an incremental scan, the { key: (mtime, size, hash) } of the previous scan
+    def __init__(self, bagPaths, types, manifest=None):
+        self.bagPaths = bagPaths
+        self.types = types
+        self.manifest = manifest
+        self.fileCount = 0          # definitions found
+        self.deletedKeys = []       # keys in the manifest under a (changed) recording, no longer in it
+        self.archiveInfo = []       # (key, mtime, size) of each recording read, for the manifest
+
+    # yield a source dict per (new/changed) type definition in the recordings;
+    # touched[] gets the (key, mtime, size) of the definitions with unchanged content
+    def read_sources(self, touched=None):
+        for bagPath in self.bagPaths:
+            for filePath in bag_files(bagPath):
+                yield from self.read_bag(filePath, touched)
+
+    def read_bag(self, filePath, touched):
+        bagKey = os.path.abspath(filePath)
+        try:
+            statInfo = os.stat(filePath)
+        except OSError as e:
+            self.fileCount += 1
+            yield roswalk.diagnostic_source(filePath, bagKey, 0, 0, 'error', 'read', 'Cannot read {}: {}'.format(filePath, e))
+            if self.manifest is not None:
+                self.deletedKeys.extend(key for key in self.manifest if key.startswith(bagKey + '/'))
+            return
+        if self.manifest is not None:
+            known = self.manifest.get(bagKey)
+            if known is not None and known[0] == statInfo.st_mtime_ns and known[1] == statInfo.st_size:
+                return
+        schemas = mcap_schemas(filePath) if filePath.lower().endswith(mcapSuffixes) else db3_schemas(filePath)
+        entryKeys = set()
+        try:
+            for schemaName, encoding, data in schemas:
+                suffix = definitionEncodings.get(encoding)
+                if suffix is None or suffix not in self.types:
+                    continue
+                try:
+                    definitions = split_definition(schemaName, data.decode('utf8'))
+                    for typeName, text in definitions:
+                        split_type_name(typeName)
+                except (UnicodeDecodeError, BagError) as e:
+                    # a manifest entry of its own, under the recording
+                    key = bagKey + '/' + schemaName
+                    entryKeys.add(key)
+                    self.fileCount += 1
+                    yield roswalk.diagnostic_source(str(Path(filePath, schemaName)), key, statInfo.st_mtime_ns, len(data), 'warning', 'read',
+                                                    'Cannot read {} schema {}: {}'.format(filePath, schemaName, e))
+                    continue
+                for typeName, text in definitions:
+                    package, kind, name = split_type_name(typeName)
+                    entryName = '/'.join((package, kind, name + suffix))
+                    key = bagKey + '/' + entryName
+                    if key in entryKeys:
+                        continue
+                    entryKeys.add(key)
+                    self.fileCount += 1
+                    source = self.read_definition(filePath, entryName, key, statInfo.st_mtime_ns, text, touched)
+                    if source is not None:
+                        yield source
+        except (OSError, BagError, ValueError, struct.error, sqlite3.Error) as e:
+            # (keep what was read; mtime 0: read it again next time)
+            self.fileCount += 1
+            yield roswalk.diagnostic_source(filePath, bagKey, 0, statInfo.st_size, 'error', 'read', 'Cannot read {}: {}'.format(filePath, e))
+            return
+        self.archiveInfo.append((bagKey, statInfo.st_mtime_ns, statInfo.st_size))
+        if self.manifest is not None:
+            self.deletedKeys.extend(key for key in self.manifest if key.startswith(bagKey + '/') and key not in entryKeys)
+
+    # one type definition into a source dict (None if it is unchanged)
+    def read_definition(self, filePath, entryName, key, mtime, text, touched):
+        rawData = text.encode('utf8')
+        reason = roswalk.sniff_reject(rawData[:roswalk.sniffSize], len(rawData), os.path.splitext(entryName)[1])
+        if len(reason) > 0:
+            entryPath = str(Path(filePath, entryName))
+            return roswalk.diagnostic_source(entryPath, key, mtime, len(rawData), 'warning', 'rejected', 'Not a data typedef file: {} ({})'.format(entryPath, reason))
+        contentHash = hashutil.hash_file_contents(rawData)
+        if self.manifest is not None:
+            known = self.manifest.get(key)
+            if known is not None and known[2] == contentHash:
+                touched.append((key, mtime, len(rawData)))
+                return None
+        return {'path': str(Path(filePath, entryName)), 'key': key, 'mtime': mtime, 'size': len(rawData), 'hash': contentHash, 'data': text}
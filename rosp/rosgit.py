@@ -0,0 +1,239 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# rosgit.py -- scan the data typedef files of a git revision, without checking it out.
+#   The files are listed by 'git ls-tree' and read by one 'git cat-file --batch' process per repository;
+#   each is a source dict with the path it has in a checkout, and the commit time as mtime.
+import os, subprocess, threading
+from pathlib import Path
+from sqldb import hashutil
+from rosp import roswalk, scanlimits
+
+# the git program
+gitCommand = 'git'
+# an .idl next to a file with one of these suffixes (same name) was generated from it
+rosSuffixes = ('.msg', '.srv', '.action')
+
+
+class GitError(Exception):
+    pass
+
+
+# run a git command in directory 'cwd', return its output (bytes)
+def run_git(cwd, *args):
+    try:
+        result = subprocess.run([gitCommand, '-C', cwd] + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError('cannot run {}: {}'.format(gitCommand, e))
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode('utf8', 'replace').strip() or 'git {} failed'.format(args[0]))
+    return result.stdout
+
+# (the work tree top, the path of 'path' in the tree) of the repository holding 'path'
+# (a bare repository: the repository itself, '')
+def repository_of(path):
+    try:
+        topLevel, prefix = run_git(path, 'rev-parse', '--show-toplevel', '--show-prefix').decode('utf8').split('\n')[:2]
+        return topLevel, prefix.rstrip('/')
+    except (GitError, ValueError):
+        if run_git(path, 'rev-parse', '--is-bare-repository').strip() == b'true':
+            return os.path.abspath(path), ''
+        raise
+
+# (commit id, commit time in ns) of a revision (a commit, branch or tag name)
+def resolve_revision(repoPath, revision):
+    try:
+        commitId = run_git(repoPath, 'rev-parse', '--verify', '--quiet', '--end-of-options', revision + '^{commit}').decode('ascii').strip()
+    except GitError:
+        commitId = ''
+    if len(commitId) == 0:
+        raise GitError('unknown revision {}'.format(revision))
+    commitTime = int(run_git(repoPath, 'show', '-s', '--format=%ct', commitId).decode('ascii').strip())
+    return commitId, commitTime * 1000000000
+
+# yield (path, blob id, size) for each file of the commit under 'prefix' ('' = all)
+def tree_files(repoPath, commitId, prefix=''):
+    args = ['ls-tree', '-r', '-l', '-z', '--full-tree', commitId]
+    if len(prefix) > 0:
+        args += ['--', prefix]
+    for line in run_git(repoPath, *args).split(b'\0'):
+        if len(line) == 0:
+            continue
+        info, entryPath = line.split(b'\t', 1)
+        mode, objectType, objectId, size = info.split()
+        # (links and submodules are not files of this repository)
+        if objectType == b'blob' and mode != b'120000':
+            yield entryPath.decode('utf8', 'surrogateescape'), objectId.decode('ascii'), int(size)
+
+
+# reads blobs through one 'git cat-file --batch' process
+class BlobReader():
+
+    def __init__(self, repoPath):
+        self.process = subprocess.Popen([gitCommand, '-C', repoPath, 'cat-file', '--batch'],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.feeder = None
+
+    # yield (blob id, contents) for each id of objectIds, in order (None: missing)
+    def read_blobs(self, objectIds):
+        objectIds = list(objectIds)
+
+        def feed():
+            try:
+                for objectId in objectIds:
+                    self.process.stdin.write(objectId.encode('ascii') + b'\n')
+                self.process.stdin.close()
+            except (OSError, ValueError):
+                pass        # (the reader was closed)
+        self.feeder = threading.Thread(target=feed, daemon=True)
+        self.feeder.start()
+        for objectId in objectIds:
+            # <id> SP <type> SP <size> LF <contents> LF, or <id> SP missing LF
+            header = self.process.stdout.readline().split()
+            if len(header) == 0:
+                raise GitError('git cat-file stopped')
+            if len(header) < 3:
+                yield objectId, None
+                continue
+            data = self.process.stdout.read(int(header[2]))
+            self.process.stdout.read(1)
+            yield objectId, data
+
+    def close(self):
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        self.process.wait()
+        if self.feeder is not None:
+            self.feeder.join()
+
+
+# reads the data typedef files of a set of repository paths at a revision
+# (as rosscan.read_sources() does for files, and rosarchive.ArchiveScan for archives)
+class RevisionScan():
+
+    # revision: a commit, branch or tag name
+    # types: the suffixes to read ('.msg', .. '.idl')
+    # manifest: for an incremental scan, the { key: (mtime, size, hash) } of the previous scan
+    # prune: skip the files in directories the walk would prune (see roswalk.py)
+    # accept: a function of a file path, False = skip the file (see rosscan.in_shard())
+    def __init__(self, paths, revision, types, manifest=None, prune=True, accept=None):
+        self.paths = paths
+        self.revision = revision
+        self.types = types
+        self.manifest = manifest
+        self.prune = prune
+        self.accept = accept
+        self.fileCount = 0          # files found
+        self.fileCounts = {}        # suffix: count of files found
+        self.deletedKeys = []       # keys in the manifest under the scan paths, not in the revision
+        self.archiveInfo = []       # (as ArchiveScan: nothing to add to the manifest)
+        self.repoFiles = []         # (path, repository top, commit time, [(file path, blob id, size)])
+        self.failures = []          # a diagnostic source per scan path that can't be read
+
+    # list the files of the revision in each scan path (before read_sources())
+    def list_revision(self):
+        for path in self.paths:
+            try:
+                topLevel, prefix = repository_of(path)
+                commitId, commitTime = resolve_revision(topLevel, self.revision)
+                files = self.list_files(topLevel, prefix, commitId)
+            except GitError as e:
+                self.failures.append(self.read_failure(path, e))
+                self.fileCount += 1
+                continue
+            self.repoFiles.append((path, topLevel, commitTime, files))
+            self.fileCount += len(files)
+            for filePath, objectId, size in files:
+                suffix = os.path.splitext(filePath)[1]
+                self.fileCounts[suffix] = self.fileCounts.get(suffix, 0) + 1
+            if self.manifest is not None:
+                fileKeys = {os.path.abspath(filePath) for filePath, objectId, size in files}
+                root = os.path.join(os.path.abspath(os.path.join(topLevel, prefix)), '')
+                self.deletedKeys.extend(key for key in self.manifest if key.startswith(root) and key not in fileKeys)
+                if os.path.abspath(path) in self.manifest:
+                    self.deletedKeys.append(os.path.abspath(path))
+
+    # the diagnostic source of a scan path that can't be read (mtime 0: it is read again next time)
+    def read_failure(self, path, e):
+        return roswalk.diagnostic_source(path, os.path.abspath(path), 0, 0, 'error', 'read',
+                                         'Cannot read {} at {}: {}'.format(path, self.revision, e))
+
+    # the files of a repository path to read: [(file path, blob id, size)]
+    def list_files(self, topLevel, prefix, commitId):
+        entries = list(tree_files(topLevel, commitId, prefix))
+        prunedDirs = set()
+        if self.prune:
+            prunedDirs = {os.path.dirname(entryPath) for entryPath, objectId, size in entries
+                          if os.path.basename(entryPath) in roswalk.ignoreMarkerFiles}
+        files = []
+        for entryPath, objectId, size in entries:
+            if os.path.splitext(entryPath)[1] not in self.types:
+                continue
+            if self.prune:
+                dirNames = entryPath.split('/')[:-1]
+                if not roswalk.defaultPruneDirs.isdisjoint(dirNames) or \
+                        any('/'.join(dirNames[:idx]) in prunedDirs for idx in range(len(dirNames) + 1)):
+                    continue
+            filePath = str(Path(topLevel, entryPath))
+            if self.accept is None or self.accept(filePath):
+                files.append((filePath, objectId, size))
+        # (a generated .idl holds the same types)
+        rosStems = {os.path.splitext(filePath)[0] for filePath, objectId, size in files if filePath.endswith(rosSuffixes)}
+        return [entry for entry in files if not entry[0].endswith('.idl') or os.path.splitext(entry[0])[0] not in rosStems]
+
+    # yield a source dict per (new/changed) data typedef file at the revision;
+    # touched[] gets the (key, mtime, size) of the files with unchanged content
+    def read_sources(self, touched=None):
+        yield from self.failures
+        for path, topLevel, commitTime, files in self.repoFiles:
+            readFiles = []
+            for filePath, objectId, size in files:
+                reason = roswalk.sniff_reject(b'', size, os.path.splitext(filePath)[1])
+                if len(reason) > 0:
+                    yield roswalk.diagnostic_source(filePath, os.path.abspath(filePath), commitTime, size, 'warning', 'rejected',
+                                                    'Not a data typedef file: {} ({})'.format(filePath, reason))
+                else:
+                    readFiles.append((filePath, objectId, size))
+            reader = BlobReader(topLevel)
+            try:
+                blobs = reader.read_blobs(objectId for filePath, objectId, size in readFiles)
+                for (filePath, objectId, size), (blobId, rawData) in zip(readFiles, blobs):
+                    if rawData is None:
+                        yield roswalk.diagnostic_source(filePath, os.path.abspath(filePath), 0, size, 'error', 'read',
+                                                        'Cannot read {} at {}: missing blob {}'.format(filePath, self.revision, objectId))
+                        continue
+                    source = self.read_blob(filePath, commitTime, rawData, touched)
+                    if source is not None:
+                        yield source
+            except GitError as e:
+                yield self.read_failure(path, e)
+            finally:
+                reader.close()
+
+    # one blob into a source dict (None if its content is unchanged)
+    def read_blob(self, filePath, mtime, rawData, touched):
+        scanlimits.read_bytes(len(rawData))
+        reason = roswalk.sniff_reject(rawData[:roswalk.sniffSize], len(rawData), os.path.splitext(filePath)[1])
+        key = os.path.abspath(filePath)
+        if len(reason) > 0:
+            return roswalk.diagnostic_source(filePath, key, mtime, len(rawData), 'warning', 'rejected',
+                                             'Not a data typedef file: {} ({})'.format(filePath, reason))
+        contentHash = hashutil.hash_file_contents(rawData)
+        if self.manifest is not None:
+            known = self.manifest.get(key)
+            if known is not None and known[2] == contentHash:
+                touched.append((key, mtime, len(rawData)))
+                return None
+        try:
+            data = rawData.decode('utf8').replace('\r\n', '\n').replace('\r', '\n')
+        except UnicodeDecodeError as e:
+            return roswalk.diagnostic_source(filePath, key, 0, len(rawData), 'error', 'read',
+                                             'Cannot read {} at {}: {}'.format(filePath, self.revision, e))
+        return {'path': filePath, 'key': key, 'mtime': mtime, 'size': len(rawData), 'hash': contentHash, 'data': data}
@@ -0,0 +1,324 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# roslexer.py -- single-pass parser for ROS .msg/.srv/.action files (the default scan engine).
+#   ROSLexer.extract() writes the same records as ROSParser.extract() (the 'legacy' engine).
+#   rosp.parsebench measures it at 2.5-3x ROSParser; most of the time left is building and hashing the records.
+import os, re, time, datetime
+import json, base64
+from json.encoder import encode_basestring_ascii
+from sqldb import hashutil
+from sqldb import types as idltypes
+from rosp import rosparser, scanprofile
+
+# line cleanup
+_bracketLineEnd = re.compile(r'[\[<] +\n')                      # a bracket that prepare_input() may join with the next line
+_bracketTrims = [(re.compile(r'\[ +'), '['), (re.compile(r' +\]'), ']'), (re.compile(r'< +'), '<'), (re.compile(r' +>'), '>')]
+# whitespace other than ' ' (as str.strip() sees it; all of it is below U+3001)
+_otherBlanks = re.escape(''.join(chr(c) for c in range(0x3001) if chr(c).isspace() and c != 0x20))
+_tokenRewrite = re.compile('[{:;(,)}' + _otherBlanks + ']')       # needs the _clear_comments() token pass
+_colonRewrite = re.compile(r'([a-zA-Z0-9_]{1}):([a-zA-Z0-9_]{1}|$)')
+_lineSpecial = re.compile('[#{:;(,)}<>\\[\\]' + _otherBlanks + ']')  # may need any of the above, or has a comment
+
+# member line: typeName, [attributes], memberName, ['='], value
+_memberLine = re.compile(r'([a-zA-Z0-9_/]*)(?=[^a-zA-Z0-9_/])[ \t]*([\[<][ 0-9<=\[\]]*)?([^ =\n]*)[ \t]*(=?)(.*)')
+
+# first characters that disqualify a file (see ROSParser.file_qualify)
+_rejectChars = frozenset('.,<>?;:"~`!@$%^&*()_+={}|')
+# first characters that need a closer look: bracket joined to the line above, rejected
+_firstSpecial = _rejectChars | frozenset(']')
+
+_rosTypeLookup = idltypes.typeNumberLookup['ros']
+# the IDL name of each primitive type number
+_idlTypeNames = {typeNumber: idltypes.typeNumberToTypeName(typeNumber, 'idl') for typeNumber in set(_rosTypeLookup.values())}
+_legacy = rosparser.ROSParser(None)
+
+# parsed member lines: (line, module_path): (member fields, idkey, isConst) or (error, None, None)
+_memberCache = {}
+_memberCacheMax = 100000
+
+# placeholder member for otherwise empty types (see ROSParser.insert_placeholder_member)
+_placeholderFields = {'memberName': 'structure_needs_at_least_one_member', 'typeName': idltypes.typeNumberToTypeName(_rosTypeLookup['uint8'], 'idl'),
+                      'typePath': '', 'attributes': '', 'idkeyRef': str(_rosTypeLookup['uint8']), 'valdefs': '', 'flags': '', 'notes': ''}
+_placeholderId = hashutil.hash_member(_placeholderFields)
+
+
+# attributes JSON by (attribute text, is a string type)
+_attributesCache = {}
+
+# convert the attribute text of a member ('[N]', '<=N', '<=N[]', ...) to its attributes (JSON)
+def _parse_attributes(attribPre, typeName):
+    isString = typeName == 'string' or typeName == 'wstring'
+    attributes = _attributesCache.get((attribPre, isString))
+    if attributes is None:
+        attributes = _attributes_json(attribPre, isString)
+        if len(_attributesCache) < _memberCacheMax:
+            _attributesCache[(attribPre, isString)] = attributes
+    return attributes
+
+def _attributes_json(attribPre, isString):
+    attribDict = {}
+    if not isString:
+        # non-string arrays and sequences
+        atribTmp = attribPre.strip('[').strip(']')
+        if atribTmp == '':
+            attribDict['0'] = 'q-1'
+        elif '<=' in atribTmp:
+            attribDict['0'] = 'q{}'.format(atribTmp.strip('<').strip('='))
+        else:
+            attribDict['0'] = 'a{}'.format(atribTmp)
+    else:
+        # bounded strings, and/or arrays of strings
+        attribList = attribPre.partition('[')
+        if attribList[1] == '':
+            attribDict['0'] = 's{}'.format(attribList[0].strip('<').strip('='))
+        elif attribList[0] == '':
+            if attribList[2] != ']':
+                attribDict['0'] = 'q{}'.format(attribList[2].strip('<').strip('=').strip(']'))
+            else:
+                attribDict['0'] = 'q-1'
+            attribDict['1'] = 's-1'
+        else:
+            attribDict['1'] = 's{}'.format(attribList[0].strip('<').strip('='))
+            if attribList[2] != ']':
+                attribDict['0'] = 'q{}'.format(attribList[2].strip('<').strip('=').strip(']'))
+            else:
+                attribDict['0'] = 'q-1'
+    # (nothing to escape: the same text as json.dumps())
+    return '{' + ', '.join('"{}": "{}"'.format(key, value) for key, value in attribDict.items()) + '}'
+
+
+# parse one cleaned member line: returns (member fields, isConst), or (error message, None)
+def parse_member_line(line, module_path):
+    member = {'memberName': '', 'typeName': '', 'typePath': '', 'attributes': '', 'idkeyRef': '', 'valdefs': '', 'flags': '', 'notes': ''}
+    match = _memberLine.fullmatch(line)
+    if match is None:
+        return 'typename', None
+    typeName, attribText, memberName, equals, value = match.groups()
+
+    # 'primitive', typePath/typeName or just typeName (in the module path of this file)
+    primTypeNumber = _rosTypeLookup.get(typeName, -1)
+    if primTypeNumber == -1:
+        if '/' in typeName:
+            pathAndName = typeName.split('/')
+            member['typePath'] = pathAndName[0]
+            typeName = pathAndName[1]
+            primTypeNumber = _rosTypeLookup.get(typeName, -1)
+        else:
+            member['typePath'] = module_path
+            member['flags'] = 'IMPLIEDPATH'
+
+    # '[' or '<': array / sequence / bounded string attributes
+    if attribText is not None:
+        if match.end(2) == len(line):
+            return 'attributes', None
+        member['attributes'] = _parse_attributes(''.join(attribText.split()), typeName)
+    elif typeName == 'string' or typeName == 'wstring':
+        member['attributes'] = '{"0": "s-1"}'
+
+    # member name, then an optional '=' const value or a default value
+    isConst = False
+    member['memberName'] = memberName
+    if match.end(3) < len(line):
+        if equals:
+            constValStr = value.strip().strip('"')
+            if typeName == 'bool' and (constValStr.lower() == 'true' or constValStr.lower() == 'false'):
+                constValStr = constValStr.upper()
+            member['valdefs'] = '{{"const": "{}"}}'.format(constValStr)
+            isConst = True
+        else:
+            try:
+                member['valdefs'] = json.dumps({'default': json.loads(value)})
+            except:
+                # default strings that aren't JSON are stored base64 encoded as 'default-x'
+                member['valdefs'] = json.dumps({'default-x': base64.b64encode(value.encode('ascii')).decode('ascii')})
+
+    if memberName == 'sequence':
+        member['memberName'] = 'sequence_'
+
+    # normalize the primitive typename
+    if primTypeNumber != -1:
+        typeName = _idlTypeNames[primTypeNumber]
+    member['typeName'] = typeName
+    member['idkeyRef'] = str(primTypeNumber)
+    return member, isConst
+
+
+# the token pass of ROSParser._clear_comments() on one line (comment removed): spaces around
+# punctuation, each ' '-separated token stripped
+def rewrite_tokens(line):
+    tokens = []
+    for token in line.split(' '):
+        if '{' in token:
+            token = token.replace('{', ' { ')
+        if ':' in token:
+            token = _colonRewrite.sub(r'\1 : \2', token)
+        tokens.append(token.replace(';', ' ;').replace('(', ' ( ').replace(',', ' , ').replace(')', ' ) ').replace('}', ' } ').strip())
+    return ' '.join(tokens).strip()
+
+
+# the lines of a file as ROSParser sees them after prepare_input() + _clear_comments(), None = rejected
+# trimBrackets: False if prepare_input() was already applied to data
+def clean_lines(data, file_path, trimBrackets=True):
+    if trimBrackets and ('[\n' in data or '<\n' in data or (' \n' in data and _bracketLineEnd.search(data))):
+        # rare: a bracket that prepare_input() may join with the next line; do this the long way
+        return clean_lines(_legacy.prepare_input(data), file_path, False)
+
+    lines = []
+    checkEmail = file_path.suffix == '.msg'
+    # skip blank and comment lines (stripping first is the same: the bracket trims only remove spaces next to a bracket)
+    for line in [line for line in map(str.strip, data.split('\n')) if line and line[0] != '#']:
+        # (the cleanup below never changes the first character)
+        if line[0] in _firstSpecial:
+            if trimBrackets and line[0] in ']>':
+                # a bracket that prepare_input() may join with the line above
+                return clean_lines(_legacy.prepare_input(data), file_path, False)
+            if line[0] in _rejectChars:
+                return None
+        if _lineSpecial.search(line):
+            # brackets that prepare_input() trims on a line
+            if trimBrackets and ('[ ' in line or '< ' in line or ' ]' in line or ' >' in line):
+                for pattern, replacement in _bracketTrims:
+                    line = pattern.sub(replacement, line)
+            commentIdx = line.find('#')
+            if commentIdx >= 0:
+                line = line[:commentIdx]
+            if _tokenRewrite.search(line):
+                line = rewrite_tokens(line)
+            else:
+                line = line.strip()
+            if len(line) == 0:
+                continue
+        # is this an email message file?
+        if checkEmail:
+            if line.startswith('From:'):
+                return None
+            checkEmail = False
+        lines.append(line)
+    return lines
+
+
+class ROSLexer():
+
+    def __init__(self, dbase):
+        self.dbase = dbase
+        self.placeholder_member_id = ''
+
+    # insert the placeholder member (uint8 structure_needs_at_least_one_member)
+    def insert_placeholder_member(self, dbase, tags):
+        member = dict(_placeholderFields)
+        member['tags'] = tags
+        return dbase.member_insert(member, _placeholderId)
+
+    # from a file contents, update the database (same as ROSParser.extract)
+    def extract(self, file_contents, file_path, tags, dbase, module_path=None):
+        self.placeholder_member_id = self.insert_placeholder_member(dbase, tags)
+        placeholderList = _json_id_list([self.placeholder_member_id])
+
+        with scanprofile.phase('clean'):
+            lines = clean_lines(file_contents, file_path)
+        if lines is None:
+            dbase.diagnostic_add('warning', 'rejected', 'Not a data typedef file: {}'.format(str(file_path)))
+            return
+
+        # parse the member lines first (errors are reported in line order, as they are parsed)
+        name_base, file_suffix = os.path.splitext(file_path.name)
+        if module_path is None:
+            module_path = file_path.parts[-3]
+        if file_suffix == '.msg':
+            rtypePair = rostopic_kinds[0]
+        elif file_suffix == '.srv':
+            rtypePair = rostopic_kinds[1]
+        elif file_suffix == '.action':
+            rtypePair = rostopic_kinds[3]
+
+        fnotes = source_notes(file_path)
+        dtype = {'idkey': '0', 'typeName': name_base, 'typePath': module_path, 'typeKind': 'msg', 'inherits': '', 'memberList': '', 'tags': tags, 'flags': '', 'notes': fnotes}
+        ctype = {'idkey': '0', 'typeName': name_base + '_Constants', 'typePath': module_path, 'typeKind': 'msg-const', 'inherits': '', 'memberList': '', 'tags': tags, 'flags': '', 'notes': fnotes}
+        dtype_members = []
+        const_member_ids = []
+
+        for line in lines:
+            # a divider in a SRV or ACTION file completes the current type
+            if rtypePair[0] != 'msg' and '---' in line and '----' not in line:
+                self._insert_types(dbase, name_base, rtypePair, dtype, dtype_members, ctype, const_member_ids, placeholderList)
+                dtype_members = []
+                const_member_ids = []
+                rtypePair = rostopic_kinds[rostopic_kinds.index(rtypePair) + 1]
+                continue
+
+            cacheKey = (line, module_path)
+            cached = _memberCache.get(cacheKey)
+            if cached is None:
+                member, isConst = parse_member_line(line, module_path)
+                if isConst is None:
+                    cached = (member, None, None)
+                else:
+                    with scanprofile.phase('hash'):
+                        cached = (member, hashutil.hash_member(member), isConst)
+                if len(_memberCache) >= _memberCacheMax:
+                    _memberCache.clear()
+                _memberCache[cacheKey] = cached
+            fields, elemkey, isConst = cached
+            if elemkey is None:
+                if fields == 'typename':
+                    dbase.diagnostic_add('error', 'parse', 'Error parsing the typename in line: {}'.format(line))
+                else:
+                    dbase.diagnostic_add('error', 'parse', 'Error parsing the attributes in line: {}'.format(line))
+                continue
+
+            # (the database/batch copies the member, so the cached dict is passed as-is)
+            fields['tags'] = tags
+            dbase.member_insert(fields, elemkey)
+            if isConst:
+                const_member_ids.append(elemkey)
+            else:
+                dtype_members.append(elemkey)
+
+        self._insert_types(dbase, name_base, rtypePair, dtype, dtype_members, ctype, const_member_ids, placeholderList)
+
+    # insert the datatype (and its _Constants type, if any) of one kind (msg, srv-rq, ...)
+    def _insert_types(self, dbase, name_base, rtypePair, dtype, dtype_members, ctype, const_member_ids, placeholderList):
+        type_name = name_base + rtypePair[1]
+        if len(const_member_ids) > 0:
+            ctype['memberList'] = _json_id_list(const_member_ids)
+            ctype['typeName'] = type_name + '_Constants'
+            ctype['typeKind'] = rtypePair[0] + '-const'
+            typeid = dbase.datatype_insert(ctype)
+            # (like ROSParser, this carries over to the kinds that follow in the file)
+            dtype['inherits'] = _json_id_list([typeid])
+
+        if len(dtype_members) > 0:
+            dtype['memberList'] = _json_id_list(dtype_members)
+        else:
+            # if a data type has no members, use the placeholder
+            dtype['memberList'] = placeholderList
+        dtype['typeName'] = type_name
+        dtype['typeKind'] = rtypePair[0]
+        dbase.datatype_insert(dtype)
+
+
+# (kind, typename suffix) pairs, in the order of rosparser.rostopic_kinds
+rostopic_kinds = [(list(kind.keys())[0], list(kind.values())[0]) for kind in rosparser.rostopic_kinds]
+
+# the notes of the datatypes of a file: its 'src' path and the 'scan' time
+# (the same text as json.dumps() of the {'src', 'scan'} dict)
+def source_notes(file_path):
+    return '{"src": ' + encode_basestring_ascii(rosparser.source_notes_path(file_path)) + ', "scan": "' + scan_time() + '"}'
+
+# the current time, as datetime.now().isoformat() to the millisecond (formatted once per millisecond)
+_scanTime = [0, '']
+def scan_time():
+    now = time.time()
+    if int(now * 1000) != _scanTime[0]:
+        _scanTime[0] = int(now * 1000)
+        _scanTime[1] = datetime.datetime.fromtimestamp(now).isoformat(timespec='milliseconds')
+    return _scanTime[1]
+
+# json.dumps() of a list of idkeys (base64 text never needs escaping)
+def _json_id_list(idList):
+    return '["' + '", "'.join(idList) + '"]'
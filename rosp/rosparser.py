@@ -8,57 +8,21 @@
 import os, sys
 import re, datetime
 import json, base64
-from pathlib import Path
-from sqldb import sql3db
 from sqldb import types as idltypes
+from rosp import scanprofile
 
 # try this here
 # scan for data typedef files
-def scan_paths_for_datatype_files(paths, types, tags, dbname):
-    rosDataTypes = ['.msg','.srv','.action']
-    myRosTypes = {type for type in types if type in rosDataTypes}
-
-    # connect or create database and create table
-    mydb = sql3db.SQL3Util(dbname)
-    mydb.create_tables()
-
-    rosparser_ = ROSParser(mydb)
-    rosfilecount = 0
-    idlfilecount = 0
-
-    for path in paths:
-        for root, dirs, files in os.walk(path):
-            # check for data typedef files in this dir tree
-            if len(files) > 0:
-                for thisfile in files:
-                    filepath = Path("{}/{}".format(root, thisfile))
-                    thisname, thisext = os.path.splitext(thisfile)
-                    # ROS native file types
-                    if thisext in myRosTypes and os.path.exists('{}/{}'.format(root, thisfile)):
-                        rosfilecount += 1
-                        with open('{}/{}'.format(root, thisfile), "r", encoding="utf8" ) as f:
-                            ros_in = f.read()
-                            rosparser_.extract(ros_in, filepath, tags, mydb)
-        
-                    # IDL file (later)
-                    if thisfile.endswith('.idl'):
-                        idlfilecount += 1
-                        # open the file, read contents
-                        #print("IDL: {} : {}".format(root, thisfile))
-                        #with open('{}/{}'.format(root, thisfile), "r", encoding="utf8" ) as f:
-                            #idl_in = f.read()
-                            #idlparser_.extract(idl_in, filepath, mydb)
-        
-    mydb.database_commit()
-    print("ScanTotal: {} ros files, {} IDL files".format(rosfilecount, idlfilecount))
-
-    # now resolve any unresolved type references
-    mydb.resolve_member_trefs(tags)
-    mydb.database_commit()
-    # final check to flag types with unresolved members
-    mydb.datatypes_flag_member_errors()
-
-    mydb.database_close()
+# workers: number of parser processes (1 = single process, 0 = one per CPU)
+# incremental: only re-parse the files that changed since the last scan into dbname
+# prune: skip build/install/log/.git/.. trees and ignored directories
+# engine: 'lexer' or 'legacy' (ROSParser, below)
+# cacheFile: parse cache file ('' = none)
+# cancel: a threading.Event, set() to stop the scan; onEvent: called with each scan event
+# amentIndex: scan an install prefix by its ament index, instead of walking it
+def scan_paths_for_datatype_files(paths, types, tags, dbname, workers=1, incremental=False, prune=True, engine='lexer', cacheFile='', cancel=None, onEvent=None, amentIndex=False):
+    from rosp import rosscan
+    rosscan.scan_paths(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, onEvent, amentIndex)
 
 
 rostopic_kinds = [{'msg':''},{'srv-rq':'_Request'},{'srv-rr':'_Response'},{'act-g':'_Goal'},{'act-r':'_Result'},{'act-f':'_Feedback'}]
@@ -69,6 +33,24 @@ def rostopic_idx(rtype):
             return rostopic_kinds.index(kind)
     return -1
 
+# the 'src' note of a scanned file: its path, less the leading part it shares with the current directory
+# (cached by the first len(startDir) characters)
+_commonPaths = {}
+def source_notes_path(file_path):
+    startDir = os.getcwd().replace(os.sep, '/')
+    fileDir = str(file_path.as_posix())
+    commonPath = _commonPaths.get((startDir, fileDir[:len(startDir)]))
+    if commonPath is None:
+        commonPath = ''
+        for i, c in enumerate(startDir):
+            if c != fileDir[i]:
+                commonPath = startDir[:i]
+                break
+        if len(_commonPaths) > 1000:
+            _commonPaths.clear()
+        _commonPaths[(startDir, fileDir[:len(startDir)])] = commonPath
+    return fileDir.replace(commonPath, '')
+
 class ROSParser():
 
     def __init__(self, dbase):
@@ -108,44 +90,38 @@ class ROSParser():
             line = line.strip()
             if len(line) > 0:
                 if line[0] in repattern:
-                    print('Rejecting non-datatype file {}'.format(str(file_path)))
                     return False
         return True
 
 
 
     # from a file contents, update the database
-    def extract(self, file_contents, file_path, tags, dbase):
+    # module_path: the package of the file (the typePath of its types); None = the directory above msg/, srv/..
+    def extract(self, file_contents, file_path, tags, dbase, module_path=None):
 
         # FIXME: move this to be called only if INSERT fails
         # create a placeholder member (this is a ROS thing, for otherwise empty topics)
         self.placeholder_member_id = self.insert_placeholder_member(dbase, tags)
 
         # clean up contents and make them consistent for easier parsing
-        file_contents = self.prepare_input(file_contents)
-        lines = file_contents.split('\n')
-        lines = self._clear_comments(lines)
+        with scanprofile.phase('clean'):
+            file_contents = self.prepare_input(file_contents)
+            lines = file_contents.split('\n')
+            lines = self._clear_comments(lines)
 
         # disqualfy if not a ROS data typedef file
         if self.file_qualify(lines, file_path) == False:
+            dbase.diagnostic_add('warning', 'rejected', 'Not a data typedef file: {}'.format(str(file_path)))
             return
 
         # get the parts of the data type name
         fileparts = file_path.parts
         name_base = file_path.stem		# the base of the typenames to be produced
         file_suffix = file_path.suffix
-        module_path = fileparts[-3]
-
-        # tryit
-        startDir = str(Path.cwd().as_posix())
-        fileDir = str(file_path.as_posix())
-        commonPath = ''
-        for i, c in enumerate(startDir):
-            if c != fileDir[i]:
-                commonPath = startDir[:i]
-                break
-        relDir = fileDir.replace(commonPath, '')
+        if module_path is None:
+            module_path = fileparts[-3]
 
+        relDir = source_notes_path(file_path)
 
         # prepare the 'notes' for this file (filename and time/date now)
         fnotes = {'src': relDir, 'scan': datetime.datetime.now().isoformat(timespec='milliseconds')}
@@ -216,7 +192,7 @@ class ROSParser():
                 if match:
                     endIdx = match.start()
                 if endIdx == -1:
-                    print("Error parsing typename in line: {} for file {}".format(line, file_path))
+                    dbase.diagnostic_add('error', 'parse', 'Error parsing the typename in line: {}'.format(line))
                     continue
 
                 # type names are either 'primitive', or they ref another via typePath/typeName or just typeName
@@ -250,7 +226,7 @@ class ROSParser():
                         endIdx = match.start()
                         endIdx += startIdx
                     if endIdx == -1:
-                        print("attributes parse error on line: {}".format(line))
+                        dbase.diagnostic_add('error', 'parse', 'Error parsing the attributes in line: {}'.format(line))
                         continue
                     attribPre = ''.join(line[startIdx:endIdx].split())
 
@@ -0,0 +1,1059 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# rosscan.py -- the scan pipeline behind rosparser.scan_paths_for_datatype_files():
+#   walk --> read/hash (skip unchanged files) --> parse (in-process or worker pool) --> one writer thread --> resolve.
+#   Files with the same contents and type path are parsed once per scan.
+import os, time, datetime
+import json
+import queue, threading
+import collections, itertools
+import zlib
+import concurrent.futures
+from pathlib import Path
+from sqldb import sql3db, recbatch, hashutil, parsecache, dbbase
+from rosp import rosparser, roslexer, roswalk, rosarchive, rosbag, rosgit, amentindex, scanevents, scanprofile, scanlimits
+from idlp import idlparser
+from xmlp import xmlparser
+
+rosDataTypes = ['.msg','.srv','.action']
+idlDataTypes = ['.idl']
+xmlDataTypes = ['.xml']
+
+# parsing engines: 'lexer' (single pass, the default) or 'legacy' (the original ROSParser)
+parserEngines = {'lexer': roslexer.ROSLexer, 'legacy': rosparser.ROSParser}
+
+# walk the scan paths, yield the path of each data typedef file (depth-first, as os.walk)
+# myTypes: the suffixes of the files to scan ('.msg', .. '.idl'); the .idl files are counted anyway
+# fileCounts is updated when the walk is done: {'ros', 'idl', 'xml', 'pruned'}
+# onDir: called with the path of each directory listed; returns True to stop the walk
+# prune, sortEntries, yieldDirs: see roswalk.ScanWalker
+def walk_datatype_files(paths, myTypes, fileCounts, prune=True, onDir=None, sortEntries=False, yieldDirs=False):
+    walker = roswalk.ScanWalker(myTypes, idlDataTypes, prune, sortEntries=sortEntries)
+    for filePath in walker.walk(paths, onDir, yieldDirs):
+        yield filePath
+    fileCounts['ros'] += sum(walker.fileCounts.get(suffix, 0) for suffix in myTypes if suffix in rosDataTypes)
+    fileCounts['idl'] += walker.fileCounts.get('.idl', 0)
+    fileCounts['xml'] += walker.fileCounts.get('.xml', 0)
+    fileCounts['pruned'] = fileCounts.get('pruned', 0) + walker.prunedCount
+
+# as walk_datatype_files(), for install prefixes with an ament index; packages[path] = the package of each file
+# onDir: called with the index directory of each prefix; returns True to stop
+def index_datatype_files(prefixes, myTypes, fileCounts, packages, onDir=None):
+    for prefix in prefixes:
+        if onDir is not None and onDir(os.path.join(prefix, amentindex.resourceIndexDir)):
+            return
+        for filePath, packageName in amentindex.index_files(prefix, myTypes, fileCounts):
+            packages[filePath] = packageName
+            if os.path.splitext(filePath)[1] in rosDataTypes:
+                fileCounts['ros'] += 1
+            yield filePath
+
+# is this .idl one that rosidl generated from a .msg/.srv/.action next to it (same types)?
+def is_generated_idl(filePath, myRosTypes):
+    stem = os.path.splitext(filePath)[0]
+    return filePath.endswith('.idl') and any(os.path.isfile(stem + suffix) for suffix in myRosTypes)
+
+# is this file in a shard of the scan: shard = (index, count), index 0..count-1?
+# (by a hash of its path relative to its scan path: every machine deals the same shards)
+def in_shard(filePath, roots, shard):
+    return zlib.crc32(scan_relpath(filePath, roots).encode('utf8')) % shard[1] == shard[0]
+
+# the path of a file relative to the scan path (of roots) it was found under, with '/' separators
+# (its name if it is under none of them)
+def scan_relpath(filePath, roots):
+    relPath = os.path.basename(filePath)
+    rootLength = -1
+    for root in roots:
+        if len(root) > rootLength and filePath.startswith(os.path.join(root, '')):
+            relPath = os.path.relpath(filePath, root)
+            rootLength = len(root)
+    return relPath.replace(os.sep, '/')
+
+# a reproducible scan writes the same database for the same files, by a full or an incremental scan:
+# the 'src' note is relative to the scan path, the 'scan' note is SOURCE_DATE_EPOCH, the manifest has no mtimes
+# roots: the scan paths
+def reproducible_batch(batch, roots):
+    if batch.srcInfo is not None:
+        batch.srcInfo['mtime'] = 0
+    notes = None
+    for tableName, record in batch.records:
+        if tableName == 'datatypes' and len(record['notes']) > 0:
+            if notes is None:
+                notes = reproducible_notes(batch.srcPath, roots)
+            record['notes'] = notes
+
+def reproducible_notes(filePath, roots):
+    notes = {'src': scan_relpath(os.path.abspath(filePath), roots)}
+    sourceDateEpoch = os.environ.get('SOURCE_DATE_EPOCH', '')
+    if sourceDateEpoch.isdigit():
+        scanTime = datetime.datetime.fromtimestamp(int(sourceDateEpoch), datetime.timezone.utc).replace(tzinfo=None)
+        notes['scan'] = scanTime.isoformat(timespec='milliseconds')
+    return json.dumps(notes)
+
+# rewrite database 'dbname' in canonical form: a vacuumed copy, with the rows of each table in the
+# order of their contents (its key first), that replaces it
+def vacuum_database(dbname):
+    vacuumName = dbname + '.vacuum'
+    if os.path.exists(vacuumName):
+        os.remove(vacuumName)
+    mydb = sql3db.SQL3Util(vacuumName)
+    try:
+        mydb.cursor.execute('ATTACH DATABASE ? AS scanned', (dbname,))
+        schema = mydb.cursor.execute("SELECT type, name, sql FROM scanned.sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid").fetchall()
+        for objectType, name, sql in schema:
+            if objectType == 'table':
+                mydb.cursor.execute(sql)
+                columnCount = len(mydb.cursor.execute('SELECT * FROM scanned."{}" LIMIT 0'.format(name)).description)
+                mydb.cursor.execute('INSERT INTO main."{0}" SELECT * FROM scanned."{0}" ORDER BY {1}'.format(name, ', '.join(str(column + 1) for column in range(columnCount))))
+        # (the indexes are built once the rows are in)
+        for objectType, name, sql in schema:
+            if objectType != 'table':
+                mydb.cursor.execute(sql)
+        mydb.database_commit()
+        mydb.cursor.execute('DETACH DATABASE scanned')
+    finally:
+        mydb.database_close()
+    os.replace(vacuumName, dbname)
+
+# the manifest key for a scanned file
+def source_key(filePath):
+    return os.path.abspath(filePath)
+
+# read a file into a 'source' dict: {path, key, mtime, size, hash, data} (and 'package', when it is known)
+# a file that is not a data typedef file: a roswalk.diagnostic_source() instead
+def read_source(filePath, statInfo=None):
+    with scanprofile.phase('read'):
+        if statInfo is None:
+            statInfo = os.stat(filePath)
+        with open(filePath, 'rb') as f:
+            rawData = f.read(roswalk.sniffSize)
+            reason = roswalk.sniff_reject(rawData, statInfo.st_size, os.path.splitext(filePath)[1])
+            if len(reason) > 0:
+                return roswalk.diagnostic_source(filePath, source_key(filePath), statInfo.st_mtime_ns, statInfo.st_size,
+                                                 'warning', 'rejected', 'Not a data typedef file: {} ({})'.format(filePath, reason))
+            rawData += f.read()
+        scanlimits.read_bytes(len(rawData))
+        with scanprofile.phase('hash'):
+            contentHash = hashutil.hash_file_contents(rawData)
+        return {
+            'path': filePath,
+            'key': source_key(filePath),
+            'mtime': statInfo.st_mtime_ns,
+            'size': statInfo.st_size,
+            'hash': contentHash,
+            'data': rawData.decode('utf8').replace('\r\n', '\n').replace('\r', '\n')
+        }
+
+# parse one source dict, return its records as a RecordBatch (module-level, for the worker processes)
+# profile: set batch.profile to (seconds to read and parse, the phases of the worker or None)
+def parse_datatype_source(source, tags, engine='lexer', profile=False):
+    workerProfile = None
+    if profile and (scanprofile.active is None or scanprofile.active.pid != os.getpid()):
+        # in a worker process: profile this file, the scan adds it up
+        workerProfile = scanprofile.active = scanprofile.ScanProfile()
+    startTime = time.perf_counter()
+    batch = recbatch.RecordBatch(source['path'])
+    batch.srcInfo = {k: source[k] for k in ('key', 'mtime', 'size', 'hash')}
+    if source['path'].endswith('.idl'):
+        parser = idlparser.IDLParser(batch)
+    else:
+        parser = parserEngines[engine](batch)
+    with scanprofile.phase('parse'):
+        parser.extract(source['data'], Path(source['path']), tags, batch, source.get('package'))
+    if profile:
+        batch.profile = (source.get('readTime', 0) + time.perf_counter() - startTime, None if workerProfile is None else workerProfile.phases)
+    if workerProfile is not None:
+        scanprofile.active = None
+    return batch
+
+# parse a list of source dicts (a chunk of the files sent to a worker process): a list of RecordBatch
+def parse_datatype_sources(sources, tags, engine='lexer', profile=False):
+    return [parse_datatype_source(source, tags, engine, profile) for source in sources]
+
+# read and parse one file, return its records as a RecordBatch (or None if rejected)
+def parse_datatype_file(filePath, tags, engine='lexer'):
+    source = read_source(filePath)
+    if 'diagnostic' in source:
+        return None
+    return parse_datatype_source(source, tags, engine)
+
+# a RecordBatch for a roswalk.diagnostic_source(): no records, the diagnostic, and the manifest entry
+# part: of a file read in parts (see read_xml_batches()), the part that ends it
+def diagnostic_batch(source, part=0):
+    severity, code, message = source['diagnostic']
+    batch = recbatch.RecordBatch(source['path'])
+    batch.srcInfo = {k: source[k] for k in ('key', 'mtime', 'size', 'hash')}
+    batch.part = part
+    batch.failed = severity == 'error'
+    batch.diagnostic_add(severity, code, message)
+    return batch
+
+# the parse cache key of a source: the records parsed from a file only depend on its contents,
+# its name and its module path (the typePath of its types)
+def parse_cache_key(source):
+    filePath = Path(source['path'])
+    modulePath = source.get('package')
+    if modulePath is None:
+        modulePath = filePath.parts[-3] if len(filePath.parts) >= 3 else ''
+    return '{}:{}:{}/{}'.format(parsecache.cacheVersion, source['hash'], modulePath, filePath.name)
+
+# a RecordBatch for a source, from the cached records of a file with the same key
+def cached_datatype_source(source, tags, cached):
+    cachedRecords, recordIds, diagnostics = cached
+    batch = recbatch.RecordBatch(source['path'])
+    batch.srcInfo = {k: source[k] for k in ('key', 'mtime', 'size', 'hash')}
+    notes = roslexer.source_notes(Path(source['path']))
+    for tableName, record in cachedRecords:
+        record['tags'] = tags
+        if tableName == 'datatypes':
+            record['notes'] = notes
+        batch.records.append((tableName, record))
+    batch.recordIds = recordIds
+    batch.diagnostics = diagnostics
+    return batch
+
+# a RecordBatch for a source with the same key as a file already parsed in this scan:
+# no records to write, only the manifest entry (with the recordIds of that file)
+def shared_datatype_source(source, recordIds):
+    batch = recbatch.RecordBatch(source['path'])
+    batch.srcInfo = {k: source[k] for k in ('key', 'mtime', 'size', 'hash')}
+    batch.recordIds = recordIds
+    batch.shared = True
+    return batch
+
+
+# read the XML type libraries (see xmlparser.py): yield the RecordBatch parts of each file (not cached)
+# manifest, touched: as read_sources()
+# a file that can't be read, or is not well-formed XML, ends with a 'failed' part with the diagnostic
+def read_xml_batches(filePaths, tags, manifest=None, touched=None):
+    profile = scanprofile.active
+    for filePath in filePaths:
+        key = source_key(filePath)
+        statInfo = None
+        parser = None
+        try:
+            statInfo = os.stat(filePath)
+            known = None if manifest is None else manifest.get(key)
+            if known is not None and known[1] == statInfo.st_size:
+                if known[0] == statInfo.st_mtime_ns:
+                    continue
+                # only the mtime changed: is the content the same?
+                with scanprofile.phase('hash'):
+                    hasher = hashutil.file_hasher()
+                    with open(filePath, 'rb') as xmlFile:
+                        for block in iter(lambda: xmlFile.read(xmlparser.readSize), b''):
+                            scanlimits.read_bytes(len(block))
+                            hasher.update(block)
+                if hashutil.hash_digest(hasher) == known[2]:
+                    touched.append((key, statInfo.st_mtime_ns, statInfo.st_size))
+                    continue
+            startTime = time.perf_counter()
+            parser = xmlparser.XMLParser(None)
+            with scanprofile.phase('parse'):
+                parts = parser.parse_file(Path(filePath), tags, onRead=scanlimits.read_bytes)
+                batch = next(parts, None)
+            while batch is not None:
+                batch.srcPath = filePath
+                batch.srcInfo = {'key': key, 'mtime': statInfo.st_mtime_ns, 'size': statInfo.st_size, 'hash': ''}
+                if not batch.more:
+                    batch.srcInfo['hash'] = parser.contentHash
+                    if profile is not None:
+                        batch.profile = (time.perf_counter() - startTime, None)
+                yield batch
+                with scanprofile.phase('parse'):
+                    batch = next(parts, None)
+        except (OSError, xmlparser.XMLError, xmlparser.ET.ParseError) as e:
+            # (keep the parts read before the error; no hash: read the file again if it changes)
+            if isinstance(e, OSError) or statInfo is None:
+                # (mtime 0: read again by the next incremental scan)
+                mtime, code, message = 0, 'read', 'Cannot read {}: {}'.format(filePath, e)
+            else:
+                mtime, code, message = statInfo.st_mtime_ns, 'parse', 'XML parse error: {}'.format(e)
+            yield diagnostic_batch(roswalk.diagnostic_source(filePath, key, mtime, 0 if statInfo is None else statInfo.st_size, 'error', code, message),
+                                   0 if parser is None else parser.part)
+
+
+# the checkpoints of a scan (see scan_events(checkpointEvery=)): each commit records the key of the last
+# file committed, so the next scan with the same parameters resumes an interrupted one from there
+class ScanCheckpoint():
+
+    # scan: the parameters of the scan (JSON); every: files between checkpoints
+    def __init__(self, scan, every):
+        self.scan = scan
+        self.every = every
+        self.position = ''      # the key of the last file committed ('' = none: a new scan)
+        self.fileCount = 0      # files committed, by this scan and the ones it resumes
+
+    # the checkpoint of the interrupted scan with the same parameters in database 'dbname', if any
+    def read(self, dbname):
+        mydb = sql3db.SQL3Util(dbname)
+        try:
+            mydb.create_tables()
+            found = mydb.scancheckpoint_read(self.scan)
+        finally:
+            mydb.database_close()
+        if found is not None:
+            self.position, self.fileCount = found
+        return found is not None
+
+
+# the only thread that writes to the database during the parse phase;
+# batches are inserted in the order they were put().
+# A BatchCommitted event is appended to events[] after each commit.
+# records the database writer collects before it writes them (see ScanWriter.flush())
+writeRecords = 5000
+
+class ScanWriter(threading.Thread):
+
+    def __init__(self, dbname, maxQueued=64, commitEvery=0, checkpoint=None):
+        super().__init__(name='ScanWriter', daemon=True)
+        self.dbname = dbname
+        self.commitEvery = commitEvery  # commit after this many batches (0 = only at the end)
+        self.checkpoint = checkpoint    # a ScanCheckpoint, recorded with each commit (or None)
+        self.batchQueue = queue.Queue(maxQueued)
+        self.error = None
+        self.batchCount = 0
+        self.committedCount = 0         # batches written and committed
+        self.touchedMembers = set()     # members inserted, or reset by a retired type
+        self.newTypeNames = set()       # names of the datatypes inserted
+        self.events = collections.deque()
+        self.aborted = False            # drop the batches still queued, roll back to the last commit
+        self.knownPaths = set()         # the source files the database has records of, before this scan
+        # the batches collected since the last flush(): their records (with their idkeys), diagnostics,
+        # and the sourcefiles/sourcerecords rows of their files
+        self.pendingRecords = []
+        self.pendingIds = []
+        self.pendingDiagnostics = []
+        self.pendingFiles = []
+        self.pendingSourceRecords = []
+
+    def run(self):
+        # the connection must be created in the thread that uses it
+        mydb = sql3db.SQL3Util(self.dbname)
+        if scanprofile.active is not None:
+            mydb.connection.set_trace_callback(scanprofile.active.sql_tracer())
+        try:
+            mydb.scan_pragmas()
+            mydb.create_tables()
+            self.knownPaths = mydb.sourcefiles_paths()
+            while True:
+                batch = self.batchQueue.get()
+                if batch is None:
+                    break
+                if self.error is None and not self.aborted:
+                    with scanprofile.phase('write'):
+                        self.write_batch(mydb, batch)
+                    if self.commitEvery > 0 and not batch.more and self.batchCount % self.commitEvery == 0:
+                        with scanprofile.phase('write'):
+                            self.flush(mydb)
+                        self.write_checkpoint(mydb)
+                        mydb.database_commit()
+                        self.committedCount = self.batchCount
+                        self.events.append(scanevents.BatchCommitted(batchCount=self.batchCount))
+            if self.aborted:
+                mydb.database_rollback()
+            else:
+                with scanprofile.phase('write'):
+                    self.flush(mydb)
+                self.write_checkpoint(mydb)
+                mydb.database_commit()
+                self.committedCount = self.batchCount
+                self.events.append(scanevents.BatchCommitted(batchCount=self.batchCount))
+        except Exception as e:
+            # keep draining so the producer never blocks on a full queue
+            self.error = e
+            while self.batchQueue.get() is not None:
+                pass
+        finally:
+            mydb.scan_pragmas_end()
+            mydb.database_close()
+
+    # a file read in parts (batch.part, batch.more) is in the manifest once its last part is written.
+    # The batches are collected, and written together by flush() (one executemany per table)
+    def write_batch(self, mydb, batch):
+        srcInfo = batch.srcInfo
+        recordIds = batch.recordIds
+        if srcInfo is not None and batch.part == 0 and srcInfo['key'] in self.knownPaths:
+            # this file replaces whatever it produced in an earlier scan
+            # (once the batches before are written: it may have produced some of their records)
+            self.flush(mydb)
+            self.touchedMembers.update(mydb.sourcefile_retire(srcInfo['key']))
+        if not batch.shared:
+            self.pendingRecords.extend(batch.records)
+            self.pendingIds.extend(recordIds)
+            scanprofile.count('records', len(batch.records))
+        source = '' if srcInfo is None else srcInfo['key']
+        self.pendingDiagnostics.extend(dict(diag, source=diag['source'] or source) for diag in batch.diagnostics)
+        if srcInfo is not None:
+            self.pendingSourceRecords.extend((source, idkey, tableName) for tableName, idkey in sorted(set(recordIds)))
+            if not batch.more:
+                self.pendingFiles.append((source, srcInfo['mtime'], srcInfo['size'], srcInfo['hash']))
+        if len(self.pendingRecords) >= writeRecords:
+            self.flush(mydb)
+        for (tableName, record), (tableName_, idkey) in zip(batch.records, recordIds):
+            if tableName == 'datatypes':
+                self.newTypeNames.add(record['typeName'])
+            else:
+                self.touchedMembers.add(idkey)
+        if not batch.more:
+            self.batchCount += 1
+            if self.checkpoint is not None and srcInfo is not None:
+                self.checkpoint.position = srcInfo['key']
+                self.checkpoint.fileCount += 1
+
+    # write the batches collected by write_batch()
+    def flush(self, mydb):
+        mydb.records_insert(self.pendingRecords, self.pendingIds)
+        if len(self.pendingDiagnostics) > 0:
+            mydb.diagnostics_insert(self.pendingDiagnostics)
+        mydb.sourcefiles_add(self.pendingFiles, self.pendingSourceRecords)
+        self.pendingRecords = []
+        self.pendingIds = []
+        self.pendingDiagnostics = []
+        self.pendingFiles = []
+        self.pendingSourceRecords = []
+
+    # (in the transaction of the batches it follows)
+    def write_checkpoint(self, mydb):
+        if self.checkpoint is not None and len(self.checkpoint.position) > 0:
+            mydb.scancheckpoint_update(self.checkpoint.scan, self.checkpoint.position, self.checkpoint.fileCount)
+
+    def put(self, batch):
+        self.batchQueue.put(batch)
+
+    # signal end-of-scan, wait for all batches to be written
+    # abort: don't write the batches still queued, and roll back what was not committed yet
+    def finish(self, abort=False):
+        self.aborted = abort
+        self.batchQueue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+# sources sent to a worker process at a time
+parseChunkSize = 8
+
+# yield a RecordBatch per source, in the same order as sources.
+# A source with the same parse_cache_key() as one before it is not parsed: its batch is 'shared'.
+# parseCache: a parsecache.ParseCache (or None): sources found in it are not parsed either
+# written: the files a resumed scan skipped: { source key: (parse_cache_key(), recordIds) }
+# With worker processes, the sources are read ahead into a window (at most maxInFlight bytes in a
+# bounded scan) and sent to the workers in chunks; the head of the window is yielded when ready.
+def parse_sources(sources, tags, workers, engine='lexer', parseCache=None, written=None):
+    profile = scanprofile.active is not None
+    limits = scanlimits.active
+    maxInFlight = 0 if limits is None else limits.maxInFlight
+    executor = None
+    if workers > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        # (fork the workers before the read threads: a fork copies the locks other threads hold)
+        executor.submit(os.getpid).result()
+
+    window = collections.deque()    # [source, key, future, index in the future's chunk (-1: in chunk)], in scan order
+    windowBytes = 0
+    chunk = []                      # the window entries to parse, not sent to the workers yet
+    parseKeys = set()               # the keys sent to the workers (their later sources are shared)
+    scanIds = {}                    # key: recordIds of the first source with that key
+    if written is not None:
+        for key, recordIds in written.values():
+            scanIds.setdefault(key, recordIds)
+            parseKeys.add(key)
+
+    # the batch at the head of the window can be yielded now (not waiting for a parse)
+    def head_ready():
+        return len(window) > 0 and window[0][3] >= 0 and (window[0][2] is None or window[0][2].done())
+
+    def send_chunk():
+        future = executor.submit(parse_datatype_sources, [entry[0] for entry in chunk], tags, engine, profile)
+        for index, entry in enumerate(chunk):
+            entry[2] = future
+            entry[3] = index
+        chunk.clear()
+
+    try:
+        sourceIter = iter(sources)
+        readAll = False
+        while True:
+            # read ahead until the head is ready (without workers, one source at a time)
+            while not readAll and (len(window) == 0 or (executor is not None and (maxInFlight <= 0 or windowBytes < maxInFlight) and not head_ready())):
+                source = next(sourceIter, None)
+                if source is None:
+                    readAll = True
+                    break
+                key = parse_cache_key(source)
+                entry = [source, key, None, 0]
+                if executor is not None and key not in parseKeys and 'diagnostic' not in source:
+                    parseKeys.add(key)
+                    with scanprofile.phase('cache'):
+                        if parseCache is None or not parseCache.contains(key):
+                            entry[3] = -1
+                            chunk.append(entry)
+                    if len(chunk) >= parseChunkSize:
+                        send_chunk()
+                window.append(entry)
+                windowBytes += source['size']
+            if limits is not None:
+                limits.in_flight(windowBytes, held=not readAll and maxInFlight > 0 and windowBytes >= maxInFlight)
+            if len(chunk) > 0 and not head_ready():
+                send_chunk()
+            if len(window) == 0:
+                break
+
+            source, key, future, index = window.popleft()
+            windowBytes -= source['size']
+            if 'diagnostic' in source:
+                yield diagnostic_batch(source)
+                continue
+            if written is not None and source['key'] in written and written[source['key']][0] != key:
+                # (a file the interrupted scan wrote changed since: its records are replaced)
+                scanIds.pop(written[source['key']][0], None)
+            if key in scanIds:
+                yield shared_datatype_source(source, scanIds[key])
+                continue
+            with scanprofile.phase('cache'):
+                cached = None if parseCache is None else parseCache.get(key)
+                if cached is not None:
+                    batch = cached_datatype_source(source, tags, cached)
+            if cached is None:
+                if future is None:
+                    batch = parse_datatype_source(source, tags, engine, profile)
+                else:
+                    batch = future.result()[index]
+                if parseCache is not None:
+                    with scanprofile.phase('cache'):
+                        parseCache.put(key, batch.records, batch.recordIds, batch.diagnostics)
+            scanIds[key] = batch.recordIds
+            yield batch
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+# files read ahead of the parser by the read threads (see read_sources())
+readAheadFiles = 64
+
+# stat/read/hash the walked files into source dicts (a roswalk.diagnostic_source() for a rejected or unreadable file)
+# manifest: for an incremental scan, the { key: (mtime, size, hash) } of the previous scan; unchanged
+#   files are skipped, files with unchanged content are appended to touched[] (key, mtime, size)
+# packages: { filePath: package } of the files whose package is known
+# readThreads: threads that read the next files ahead of the caller (0 = none), in order
+def read_sources(filePaths, manifest=None, touched=None, packages=None, readThreads=0):
+    for source, unchanged in read_ahead(read_candidate, filePaths, (manifest, packages), readThreads, candidate_size):
+        if unchanged is not None:
+            touched.append(unchanged)
+        elif source is not None:
+            yield source
+
+# stat and read a file for read_sources(): (source dict, None), or (None, (key, mtime, size)) if only
+# its stat info changed, or (None, None) if it is skipped
+def read_candidate(filePath, manifest, packages):
+    statInfo = None
+    try:
+        statInfo = os.stat(filePath)
+        if manifest is not None:
+            known = manifest.get(source_key(filePath))
+            if known is not None and known[0] == statInfo.st_mtime_ns and known[1] == statInfo.st_size:
+                return None, None
+        startTime = time.perf_counter()
+        source = read_source(filePath, statInfo)
+        if scanprofile.active is not None:
+            source['readTime'] = time.perf_counter() - startTime
+    except (OSError, UnicodeDecodeError) as e:
+        # (mtime 0: read again by the next incremental scan)
+        return roswalk.diagnostic_source(filePath, source_key(filePath), 0, 0 if statInfo is None else statInfo.st_size,
+                                         'error', 'read', 'Cannot read {}: {}'.format(filePath, e)), None
+    if 'diagnostic' in source:
+        return source, None
+    if packages is not None and filePath in packages:
+        source['package'] = packages[filePath]
+    if manifest is not None:
+        known = manifest.get(source['key'])
+        if known is not None and known[2] == source['hash']:
+            return None, (source['key'], source['mtime'], source['size'])
+    return source, None
+
+# the bytes a read_candidate() result holds
+def candidate_size(result):
+    return 0 if result[0] is None else len(result[0].get('data', ''))
+
+# yield function(item, *args) for each of items, in order; threads > 0: that many threads run ahead
+# (at most readAheadFiles items, and maxInFlight bytes by size() in a bounded scan)
+def read_ahead(function, items, args, threads, size=None):
+    if threads <= 0:
+        for item in items:
+            yield function(item, *args)
+        return
+    limits = None if size is None else scanlimits.active
+    maxInFlight = 0 if limits is None else limits.maxInFlight
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='ScanRead')
+    try:
+        window = collections.deque()
+        itemIter = iter(items)
+        readAll = False
+        while True:
+            while not readAll and len(window) < readAheadFiles:
+                if limits is not None and len(window) > 0:
+                    # (the results still being read are not counted: at most 'threads' files)
+                    windowBytes = sum(size(future.result()) for future in window if future.done())
+                    inFlight = limits.in_flight(windowBytes, stage='read')
+                    if maxInFlight > 0 and inFlight >= maxInFlight:
+                        limits.in_flight(windowBytes, held=True, stage='read')
+                        break
+                item = next(itemIter, None)
+                if item is None:
+                    readAll = True
+                    break
+                window.append(executor.submit(function, item, *args))
+            if len(window) == 0:
+                break
+            yield window.popleft().result()
+    finally:
+        if limits is not None:
+            limits.in_flight(0, stage='read')
+        executor.shutdown(cancel_futures=True)
+
+
+# the sources of a resumed scan: those up to the checkpoint position (a key) that the interrupted
+# scan wrote (in the manifest 'written', with the same content hash) are skipped
+def resumed_sources(sources, position, written):
+    resumed = False
+    for source in sources:
+        if not resumed:
+            resumed = source['key'] == position
+            known = written.get(source['key'])
+            if known is not None and known[2] == source['hash']:
+                continue
+        yield source
+
+# the records of the files of filePaths a resumed scan skips (those in the manifest 'written'):
+# { source key: (parse_cache_key(), recordIds) } (see parse_sources())
+def written_records(dbname, filePaths, written, packages=None):
+    keyPaths = {source_key(filePath): filePath for filePath in filePaths if source_key(filePath) in written}
+    mydb = sql3db.SQL3Util(dbname)
+    try:
+        sourceRecords = mydb.sourcerecords_read(keyPaths.keys())
+    finally:
+        mydb.database_close()
+    records = {}
+    for key, recordIds in sourceRecords.items():
+        source = {'path': keyPaths[key], 'hash': written[key][2]}
+        if packages is not None and keyPaths[key] in packages:
+            source['package'] = packages[keyPaths[key]]
+        records[key] = (parse_cache_key(source), recordIds)
+    return records
+
+# read the source file manifest of database 'dbname' (creates the tables if needed)
+def read_manifest(dbname):
+    mydb = sql3db.SQL3Util(dbname)
+    mydb.create_tables()
+    manifest = mydb.sourcefiles_readall()
+    mydb.database_close()
+    return manifest
+
+# parse filePaths into database 'dbname', retire the files in deletedKeys, then resolve;
+# a generator of scanevents: FileParsed/BatchCommitted.., ResolveProgress.., ScanDone.
+# manifest: None = a full scan, or the { key: (mtime, size, hash) } of the last scan = an incremental scan
+# commitEvery: commit after this many files (0 = once at the end)
+# engine: the parsing engine, a key of parserEngines
+# cacheFile: the parse cache file (see parsecache.py); '' = no cache
+# cancel: a threading.Event, set() to stop the update; what was not committed is rolled back
+# archives: the readers of the files not on disk (ArchiveScan, BagScan, RevisionScan), parsed after filePaths
+# packages: { filePath: package } of the files whose package is known
+# reproducible: None, or the absolute scan paths of a reproducible scan (see reproducible_batch())
+# baseDbs: read-only databases to resolve the members against (see sqldb/dbbase.py)
+# checkpoint: a ScanCheckpoint = commit every checkpoint.every files; with a position, resume that scan
+# readThreads: threads that read the files ahead of the parser (see read_sources())
+# the .xml files of filePaths are read as XML type libraries (see read_xml_batches()), after the others
+def update_events(dbname, tags, filePaths, deletedKeys=(), manifest=None, workers=1, commitEvery=0, engine='lexer', cacheFile='', cancel=None, archives=None, packages=None,
+                  reproducible=None, baseDbs=(), checkpoint=None, readThreads=0):
+    touched = []
+    cancelled = False
+    parseCache = None
+    if len(cacheFile) > 0:
+        parseCache = parsecache.ParseCache(cacheFile)
+    xmlPaths = [filePath for filePath in filePaths if os.path.splitext(filePath)[1] in xmlDataTypes]
+    diskPaths = [filePath for filePath in filePaths if os.path.splitext(filePath)[1] not in xmlDataTypes]
+
+    # (the files in scan order: diskPaths, the archives, xmlPaths)
+    written = None
+    writtenRecords = None
+    resumedPaths = []
+    resumedXmlPaths = []
+    archivePosition = None
+    if checkpoint is not None and len(checkpoint.position) > 0:
+        written = read_manifest(dbname)
+        diskKeys = [source_key(filePath) for filePath in diskPaths]
+        xmlKeys = [source_key(filePath) for filePath in xmlPaths]
+        if checkpoint.position in diskKeys:
+            index = diskKeys.index(checkpoint.position) + 1
+            resumedPaths, diskPaths = diskPaths[:index], diskPaths[index:]
+        else:
+            resumedPaths, diskPaths = diskPaths, []
+            archivePosition = checkpoint.position
+            if checkpoint.position in xmlKeys:
+                index = xmlKeys.index(checkpoint.position) + 1
+                resumedXmlPaths, xmlPaths = xmlPaths[:index], xmlPaths[index:]
+        writtenRecords = written_records(dbname, resumedPaths, written, packages)
+    if checkpoint is not None:
+        commitEvery = checkpoint.every
+
+    writer = ScanWriter(dbname, commitEvery=commitEvery, checkpoint=checkpoint)
+    writer.start()
+    sources = itertools.chain(read_sources(resumedPaths, written, touched, packages, readThreads), read_sources(diskPaths, manifest, touched, packages, readThreads))
+    if archives is not None:
+        archiveSources = itertools.chain(*(archive.read_sources(touched) for archive in archives))
+        if archivePosition is not None:
+            archiveSources = resumed_sources(archiveSources, archivePosition, written)
+        sources = itertools.chain(sources, archiveSources)
+
+    def all_batches():
+        yield from parse_sources(sources, tags, workers, engine, parseCache, writtenRecords)
+        yield from read_xml_batches(resumedXmlPaths, tags, written, touched)
+        yield from read_xml_batches(xmlPaths, tags, manifest, touched)
+    batches = all_batches()
+
+    # (archive entries are counted as they are read)
+    def file_count():
+        return len(filePaths) + (sum(archive.fileCount for archive in archives) if archives is not None else 0)
+
+    profile = scanprofile.active
+    parsedCount = 0
+    failedCount = 0
+    rejectedCount = 0
+    parsed = False
+    try:
+        for batch in batches:
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                break
+            if profile is not None and not batch.more:
+                if batch.shared:
+                    profile.count('filesShared')
+                elif batch.profile is None:
+                    profile.count('filesCached')
+                else:
+                    profile.count('filesParsed')
+                    profile.file_time(batch.srcPath, batch.profile[0])
+                    if batch.profile[1] is not None:
+                        profile.merge_phases(batch.profile[1])
+            if reproducible is not None:
+                reproducible_batch(batch, reproducible)
+            writer.put(batch)
+            if batch.more:
+                continue
+            parsedCount += 1
+            if batch.failed:
+                failedCount += 1
+            elif any(diag['code'] == 'rejected' for diag in batch.diagnostics):
+                rejectedCount += 1
+            yield scanevents.FileParsed(path=batch.srcPath, recordCount=len(batch.records), parsedCount=parsedCount, fileCount=file_count())
+            while len(writer.events) > 0:
+                yield writer.events.popleft()
+        parsed = not cancelled
+    finally:
+        batches.close()
+        writer.finish(abort=not parsed)
+        if parseCache is not None:
+            parseCache.close()
+            if profile is not None:
+                profile.count('cacheHits', parseCache.hitCount)
+                profile.count('cacheMisses', parseCache.missCount)
+    while len(writer.events) > 0:
+        yield writer.events.popleft()
+    if cancelled:
+        if profile is not None:
+            profile.info.update(fileCount=file_count(), parsedCount=writer.committedCount, deletedCount=0, cancelled=True)
+        yield scanevents.ScanDone(fileCount=file_count(), parsedCount=writer.committedCount, failedCount=0, rejectedCount=0, deletedCount=0, cancelled=True,
+                                  diagnostics={})
+        return
+
+    deletedKeys = list(deletedKeys)
+    if archives is not None:
+        for archive in archives:
+            deletedKeys.extend(archive.deletedKeys)
+    mydb = sql3db.SQL3Util(dbname)
+    if profile is not None:
+        mydb.connection.set_trace_callback(profile.sql_tracer())
+    mydb.scan_pragmas()
+    if reproducible is not None:
+        # (an incremental scan's rowids are not those of a full scan)
+        mydb.typeOrder = 'idkey'
+    try:
+        # the archives read (their files are in the manifest already), so an unchanged archive can be skipped
+        if archives is not None:
+            for archive in archives:
+                for key, mtime, size in archive.archiveInfo:
+                    mydb.sourcefile_update(key, 0 if reproducible is not None else mtime, size, '', [])
+
+        for key, mtime, size in touched:
+            mydb.sourcefile_touch(key, 0 if reproducible is not None else mtime, size)
+
+        if manifest is None:
+            resolveIds = mydb.typemembers_unresolved()
+        else:
+            # retire the types from files that were deleted since the last scan
+            for key in deletedKeys:
+                writer.touchedMembers.update(mydb.sourcefile_retire(key))
+
+            # only the members touched by this scan, or that may now resolve to a new type
+            # (and those an earlier, cancelled, update left unresolved)
+            resolveIds = set(writer.touchedMembers)
+            resolveIds.update(mydb.typemembers_unresolved_by_typename(writer.newTypeNames))
+            resolveIds.update(mydb.typemembers_unresolved(uncheckedOnly=True))
+            if written is not None:
+                # (a resumed scan doesn't know the types the interrupted scan added)
+                resolveIds.update(mydb.typemembers_unresolved())
+            resolveIds = list(resolveIds)
+
+        # now resolve any unresolved type references
+        resolvedIds = []
+        for idx in range(0, len(resolveIds), resolveChunkSize):
+            if cancel is not None and cancel.is_set():
+                cancelled = True
+                break
+            with scanprofile.phase('resolve'):
+                resolvedIds.extend(mydb.resolve_member_trefs(tags, resolveIds[idx:idx + resolveChunkSize]))
+            yield scanevents.ResolveProgress(done=min(idx + resolveChunkSize, len(resolveIds)), total=len(resolveIds))
+        with scanprofile.phase('resolve'):
+            if len(baseDbs) > 0 and not cancelled:
+                # (all the members left unresolved)
+                baseCount = dbbase.resolve_from_bases(mydb, baseDbs)
+                mydb.diagnostics_clear_code('base')
+                mydb.diagnostic_add('info', 'base', 'Resolved {} members with the types of {}'.format(baseCount, ', '.join(baseDbs)),
+                                    source=', '.join(baseDbs))
+            # (flagged 'UNRES' by an earlier scan)
+            mydb.typemembers_clear_unres(resolvedIds)
+            if checkpoint is not None and not cancelled:
+                mydb.scancheckpoint_clear(checkpoint.scan)
+            mydb.database_commit()
+            # final check to flag types with unresolved members
+            mydb.datatypes_flag_member_errors()
+        diagnostics = mydb.diagnostics_counts()
+    finally:
+        mydb.scan_pragmas_end()
+        mydb.database_close()
+    if reproducible is not None and not cancelled:
+        with scanprofile.phase('vacuum'):
+            vacuum_database(dbname)
+    if profile is not None:
+        profile.count('membersResolved', len(resolveIds))
+        profile.info.update(fileCount=file_count(), parsedCount=writer.batchCount - failedCount - rejectedCount, failedCount=failedCount,
+                            rejectedCount=rejectedCount, deletedCount=len(deletedKeys), cancelled=cancelled)
+    yield scanevents.ScanDone(fileCount=file_count(), parsedCount=writer.batchCount - failedCount - rejectedCount, failedCount=failedCount,
+                              rejectedCount=rejectedCount, deletedCount=len(deletedKeys), cancelled=cancelled, diagnostics=diagnostics)
+
+# members resolved between two ResolveProgress events
+resolveChunkSize = 500
+
+# the files of an incremental scan that were skipped, as unchanged (of a ScanDone)
+def unchanged_count(doneEvent):
+    return doneEvent.fileCount - doneEvent.parsedCount - doneEvent.failedCount - doneEvent.rejectedCount
+
+# a line on the diagnostics of a database (ScanDone.diagnostics: { code: count })
+def diagnostics_summary(counts):
+    return 'Diagnostics: {}'.format(', '.join('{} {}'.format(count, code) for code, count in sorted(counts.items())))
+
+# update_events(), as a blocking call; returns the number of files that were parsed
+def update_database(dbname, tags, filePaths, deletedKeys=(), manifest=None, workers=1, commitEvery=0, engine='lexer', cacheFile='', cancel=None):
+    parsedCount = 0
+    for event in update_events(dbname, tags, filePaths, deletedKeys, manifest, workers, commitEvery, engine, cacheFile, cancel):
+        if event.kind == 'done':
+            parsedCount = event.parsedCount
+    return parsedCount
+
+
+# scan for data typedef files, store in database 'dbname'; a generator of scanevents (see scanevents.py)
+# paths: directories, archives (see rosarchive.py) and recordings (see rosbag.py)
+# workers: number of parser processes (1 = parse in this process, 0 = one per CPU)
+# incremental: only re-parse the files that changed since the last scan into 'dbname'
+# prune: skip the directories that can't hold type files (see roswalk.py)
+# engine: 'lexer' or 'legacy' (see parserEngines)
+# cacheFile: the parse cache file, '' = none
+# cancel: a threading.Event, set() to stop the scan
+# amentIndex: scan an install prefix by the interface files of its ament index (see amentindex.py)
+# profile: time the phases of the scan, into a report next to the database (see scanprofile.py)
+# shard: (index, count) = scan only the files of this shard (see in_shard())
+# revision: a git commit, branch or tag: scan the paths as they are at it (see rosgit.py)
+# reproducible: the same files give the same database file, byte for byte (see reproducible_batch())
+# baseDbs: read-only databases to resolve the members against (see sqldb/dbbase.py)
+# limits: a scanlimits.ScanLimits = a bounded scan (see scanlimits.py)
+# checkpointEvery: commit every this many files, so an interrupted scan is resumed (0 = commit at the end)
+# readThreads: threads that read the files ahead of the parser (0 = none)
+def scan_events(paths, types, tags, dbname, workers=1, incremental=False, prune=True, engine='lexer', cacheFile='', cancel=None, amentIndex=False, profile=False,
+                shard=None, revision=None, reproducible=False, baseDbs=(), limits=None, checkpointEvery=0, readThreads=0):
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if limits is None:
+        yield from _profiled_scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, profile,
+                                         shard, revision, reproducible, baseDbs, checkpointEvery, readThreads)
+        return
+    workers = limits.workers(workers)
+    readThreads = limits.workers(readThreads) if readThreads > 0 else 0
+    limits.lower_priority()
+    limits.start()
+    scanlimits.active = limits
+    try:
+        yield from _profiled_scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, profile,
+                                         shard, revision, reproducible, baseDbs, checkpointEvery, readThreads)
+    finally:
+        scanlimits.active = None
+        print(limits.summary(workers))
+
+def _profiled_scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, profile, shard, revision, reproducible, baseDbs,
+                          checkpointEvery, readThreads):
+    if not profile:
+        yield from _scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, shard, revision, reproducible, baseDbs,
+                                checkpointEvery, readThreads)
+        return
+    scanProfile = scanprofile.active = scanprofile.ScanProfile()
+    scanProfile.info['cancelled'] = True
+    try:
+        yield from _scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, shard, revision, reproducible, baseDbs,
+                                checkpointEvery, readThreads)
+    finally:
+        scanprofile.active = None
+        fileName = scanProfile.write_report(dbname, paths=list(paths), workers=workers, incremental=incremental, engine=engine, cacheFile=cacheFile)
+        print('Scan profile: {}'.format(fileName))
+
+def _scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, shard, revision, reproducible, baseDbs, checkpointEvery,
+                 readThreads):
+    myRosTypes = {type for type in types if type in rosDataTypes}
+    myTypes = myRosTypes | {type for type in types if type in idlDataTypes or type in xmlDataTypes}
+
+    checkpoint = None
+    if checkpointEvery > 0:
+        scan = json.dumps({'paths': [os.path.abspath(path) for path in paths], 'types': sorted(myTypes), 'tags': tags, 'incremental': incremental,
+                           'prune': prune, 'engine': engine, 'amentIndex': amentIndex, 'shard': shard, 'revision': revision,
+                           'reproducible': reproducible, 'baseDbs': [os.path.abspath(baseDb) for baseDb in baseDbs]}, sort_keys=True)
+        checkpoint = ScanCheckpoint(scan, checkpointEvery)
+        if checkpoint.read(dbname):
+            print('Resuming the scan into {} from its checkpoint: {} files written'.format(dbname, checkpoint.fileCount))
+
+    # read the manifest of the last scan
+    manifest = None
+    deletedKeys = []
+    if incremental:
+        manifest = read_manifest(dbname)
+
+    # (the scan paths of a reproducible scan; an archive's is its directory)
+    roots = None
+    if reproducible:
+        roots = [os.path.abspath(path if revision is not None or not os.path.isfile(path) else os.path.dirname(os.path.abspath(path))) for path in paths]
+
+    if revision is not None:
+        yield from revision_events(paths, revision, myTypes, tags, dbname, workers, manifest, prune, engine, cacheFile, cancel, shard, roots, baseDbs, checkpoint)
+        return
+
+    archivePaths = [path for path in paths if rosarchive.is_archive(path) and not os.path.isdir(path)]
+    bagPaths = [path for path in paths if rosbag.is_bag(path)]
+    paths = [path for path in paths if path not in archivePaths and path not in bagPaths]
+    indexPrefixes = []
+    walkPaths = paths
+    if amentIndex:
+        walkPaths = []
+        for path in paths:
+            prefixes = amentindex.index_prefixes(path)
+            if len(prefixes) > 0:
+                indexPrefixes.extend(prefixes)
+            else:
+                walkPaths.append(path)
+
+    fileCounts = {'ros': 0, 'idl': 0, 'xml': 0}
+    packages = {}
+    filePaths = []
+    dirPaths = []       # listed since the last step of the walk
+
+    def walk_dir(dirPath):
+        dirPaths.append(dirPath)
+        return cancel is not None and cancel.is_set()
+
+    # (a DirEntered for each directory listed)
+    walkedFiles = itertools.chain(walk_datatype_files(walkPaths, myTypes, fileCounts, prune, walk_dir, sortEntries=reproducible or checkpoint is not None,
+                                                      yieldDirs=True),
+                                  index_datatype_files(indexPrefixes, myTypes, fileCounts, packages, walk_dir))
+    for filePath in scanprofile.timed('walk', walkedFiles):
+        if filePath is not None:
+            filePaths.append(filePath)
+        for dirPath in dirPaths:
+            yield scanevents.DirEntered(path=dirPath)
+        dirPaths.clear()
+    for dirPath in dirPaths:
+        yield scanevents.DirEntered(path=dirPath)
+    if cancel is not None and cancel.is_set():
+        yield scanevents.ScanDone(fileCount=len(filePaths), parsedCount=0, failedCount=0, rejectedCount=0, deletedCount=0, cancelled=True, diagnostics={})
+        return
+
+    if '.idl' in myTypes and len(myRosTypes) > 0:
+        # an .idl that rosidl generated from the .msg/.srv/.action next to it holds the same types
+        rosStems = {os.path.splitext(filePath)[0] for filePath in filePaths if os.path.splitext(filePath)[1] in myRosTypes}
+        filePaths = [filePath for filePath in filePaths if not filePath.endswith('.idl') or os.path.splitext(filePath)[0] not in rosStems]
+
+    if shard is not None:
+        # (an incremental scan retires the files of the other shards, as if deleted)
+        roots = walkPaths + indexPrefixes
+        filePaths = [filePath for filePath in filePaths if in_shard(filePath, roots, shard)]
+        archivePaths = [archivePath for archivePath in archivePaths if in_shard(archivePath, (), shard)]
+        bagPaths = [bagPath for bagPath in bagPaths if in_shard(bagPath, (), shard)]
+
+    if incremental:
+        # the files under these scan paths that are in the manifest, but no longer exist
+        # (the archives find their own deleted files, as they are read)
+        walkedKeys = {source_key(filePath) for filePath in filePaths}
+        scanRoots = [os.path.join(source_key(path), '') for path in paths]
+        archiveKeys = [source_key(path) for path in archivePaths + bagPaths]
+        for key in manifest:
+            if key not in walkedKeys and any(key.startswith(root) for root in scanRoots):
+                if not any(key == archiveKey or key.startswith(archiveKey + '/') for archiveKey in archiveKeys):
+                    deletedKeys.append(key)
+
+    archives = []
+    if len(archivePaths) > 0:
+        archiveScan = rosarchive.ArchiveScan(archivePaths, myRosTypes, manifest)
+        with scanprofile.phase('walk'):
+            archiveScan.list_archives()
+        fileCounts['ros'] += archiveScan.fileCount
+        archives.append(archiveScan)
+    if len(bagPaths) > 0:
+        archives.append(rosbag.BagScan(bagPaths, myTypes, manifest))
+    yield scanevents.WalkDone(fileCount=fileCounts['ros'], idlCount=fileCounts['idl'], xmlCount=fileCounts['xml'], prunedCount=fileCounts['pruned'])
+    yield from update_events(dbname, tags, filePaths, deletedKeys, manifest, workers, engine=engine, cacheFile=cacheFile, cancel=cancel,
+                             archives=archives, packages=packages, reproducible=roots, baseDbs=baseDbs, checkpoint=checkpoint,
+                             readThreads=readThreads)
+
+# the scan of git repositories at a revision (see scan_events()): list the files of the revision,
+# then read their blobs (the XML type libraries are read from disk: they are not scanned)
+def revision_events(paths, revision, myTypes, tags, dbname, workers, manifest, prune, engine, cacheFile, cancel, shard, reproducible, baseDbs, checkpoint):
+    roots = [os.path.abspath(path) for path in paths]
+    accept = None if shard is None else (lambda filePath: in_shard(filePath, roots, shard))
+    revisionScan = rosgit.RevisionScan(paths, revision, {type for type in myTypes if type not in xmlDataTypes}, manifest, prune, accept)
+    with scanprofile.phase('walk'):
+        revisionScan.list_revision()
+    yield scanevents.WalkDone(fileCount=sum(revisionScan.fileCounts.get(suffix, 0) for suffix in rosDataTypes),
+                              idlCount=revisionScan.fileCounts.get('.idl', 0), xmlCount=0, prunedCount=0)
+    yield from update_events(dbname, tags, [], manifest=manifest, workers=workers, engine=engine, cacheFile=cacheFile, cancel=cancel,
+                             archives=[revisionScan], reproducible=reproducible, baseDbs=baseDbs, checkpoint=checkpoint)
+
+# scan_events(), as a blocking call that prints a summary
+# onEvent: called with each scan event
+def scan_paths(paths, types, tags, dbname, workers=1, incremental=False, prune=True, engine='lexer', cacheFile='', cancel=None, onEvent=None, amentIndex=False, profile=False,
+               shard=None, revision=None, reproducible=False, baseDbs=(), limits=None, checkpointEvery=0, readThreads=0):
+    for event in scan_events(paths, types, tags, dbname, workers, incremental, prune, engine, cacheFile, cancel, amentIndex, profile, shard, revision, reproducible, baseDbs,
+                             limits, checkpointEvery, readThreads):
+        if onEvent is not None:
+            onEvent(event)
+        if event.kind == 'walked':
+            print("ScanTotal: {} ros files, {} IDL files, {} XML files ({} directories pruned)".format(event.fileCount, event.idlCount, event.xmlCount, event.prunedCount))
+        elif event.kind == 'done':
+            if event.cancelled:
+                print("Scan cancelled: {} files parsed".format(event.parsedCount))
+            elif incremental:
+                print("Incremental: {} files changed, {} failed, {} rejected, {} unchanged, {} deleted".format(
+                    event.parsedCount, event.failedCount, event.rejectedCount, unchanged_count(event), event.deletedCount))
+            if len(event.diagnostics) > 0:
+                print('{} (see: scan_cli.py diagnostics --db {})'.format(diagnostics_summary(event.diagnostics), dbname))
@@ -0,0 +1,178 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# roswalk.py -- find the data typedef files under a set of scan paths, skipping the pruneDirs
+#   (build/, install/, log/, .git/..), the directories with a COLCON_IGNORE/AMENT_IGNORE/CATKIN_IGNORE
+#   marker and the '.rosscanignore' patterns; each directory (by its real path) is walked once.
+import os
+import fnmatch
+
+# directory names that are never descended into (unless given as a scan path)
+defaultPruneDirs = {'build', 'install', 'log', '.git', '.hg', '.svn', '.tox', '.venv', 'venv', '.cache', '__pycache__', 'node_modules'}
+# a directory holding one of these files is skipped (colcon / ament / catkin convention)
+ignoreMarkerFiles = {'COLCON_IGNORE', 'AMENT_IGNORE', 'CATKIN_IGNORE'}
+# per-tree ignore file
+ignoreFileName = '.rosscanignore'
+
+# file sniffing: larger .msg/.srv/.action files, or files whose first bytes aren't utf8 text, are not type files
+# (an .idl file can be large)
+maxFileSize = 1024 * 1024
+maxSizeSuffixes = ('.msg', '.srv', '.action')
+sniffSize = 512
+
+# check the first bytes of a data typedef file; returns the reason to reject it, or '' if OK
+def sniff_reject(head, fileSize, fileSuffix):
+    if fileSize > maxFileSize and fileSuffix in maxSizeSuffixes:
+        return 'too large ({} bytes)'.format(fileSize)
+    if b'\0' in head:
+        return 'binary file'
+    try:
+        head.decode('utf8')
+    except UnicodeDecodeError as e:
+        # a multi-byte character may be cut off at the end of the sniffed block
+        if e.start < len(head) - 3 or len(head) < sniffSize:
+            return 'not utf8 text'
+    # is this an email message file?
+    if fileSuffix == '.msg' and head.startswith(b'From:'):
+        return 'email message'
+    return ''
+
+# a source dict (as rosscan.read_source()) for a file that is not parsed: no data, only the
+# diagnostic (severity, code, message) that says why; it goes into the manifest, with no records
+def diagnostic_source(path, key, mtime, size, severity, code, message):
+    return {'path': path, 'key': key, 'mtime': mtime, 'size': size, 'hash': '', 'diagnostic': (severity, code, message)}
+
+
+# read the ignore patterns in dirPath (if any): list of (pattern, dirOnly)
+def read_ignore_file(dirPath):
+    patterns = []
+    try:
+        with open(os.path.join(dirPath, ignoreFileName), 'r', encoding='utf8') as f:
+            for line in f:
+                line = line.strip()
+                if len(line) == 0 or line.startswith('#'):
+                    continue
+                dirOnly = line.endswith('/')
+                patterns.append((line.strip('/'), dirOnly))
+    except (OSError, UnicodeDecodeError):
+        pass
+    return patterns
+
+
+class ScanWalker():
+
+    # suffixes: the file extensions to return; countSuffixes: extensions to just count
+    # sortEntries: list each directory in name order (else in the order of the file system)
+    def __init__(self, suffixes, countSuffixes=(), prune=True, pruneDirs=None, followLinks=True, sortEntries=False):
+        self.suffixes = set(suffixes)
+        self.sortEntries = sortEntries
+        self.countSuffixes = set(countSuffixes)
+        self.prune = prune
+        self.pruneDirs = defaultPruneDirs if pruneDirs is None else set(pruneDirs)
+        self.followLinks = followLinks
+        self.dirRules = {}          # dirPath: [(baseDir, pattern, dirOnly), ...] in effect there (walk() drops them as it goes)
+        self.dirLinks = {}          # dirPath: set of its subdirectory paths that are symlinks (walk() drops them as it goes)
+        self.visited = set()        # the real paths of the directories walked
+        self.fileCounts = {}        # suffix: count of files seen
+        self.prunedCount = 0        # directories skipped
+
+    # is this entry (in dirPath) excluded by an ignore pattern?
+    def _ignored(self, rules, entryPath, name, isDir):
+        for baseDir, pattern, dirOnly in rules:
+            if dirOnly and not isDir:
+                continue
+            if '/' in pattern:
+                relPath = os.path.relpath(entryPath, baseDir).replace(os.sep, '/')
+                if fnmatch.fnmatchcase(relPath, pattern):
+                    return True
+            elif fnmatch.fnmatchcase(name, pattern):
+                return True
+        return False
+
+    # list one directory: (list of subdirectory paths, list of (filePath, suffix)), with the rules applied.
+    # rules: the ignore rules inherited from the parent directory
+    def list_dir(self, dirPath, rules=()):
+        entries = []
+        with os.scandir(dirPath) as dirEntries:
+            for entry in dirEntries:
+                entries.append(entry)
+        if self.sortEntries:
+            entries.sort(key=lambda entry: entry.name)
+        names = {entry.name for entry in entries}
+        if self.prune:
+            if not names.isdisjoint(ignoreMarkerFiles):
+                self.prunedCount += 1
+                return [], []
+            if ignoreFileName in names:
+                rules = list(rules) + [(dirPath, pattern, dirOnly) for pattern, dirOnly in read_ignore_file(dirPath)]
+        self.dirRules[dirPath] = rules
+
+        subdirs = []
+        files = []
+        links = set()
+        for entry in entries:
+            suffix = os.path.splitext(entry.name)[1]
+            try:
+                if entry.is_dir(follow_symlinks=self.followLinks):
+                    if self.prune and (entry.name in self.pruneDirs or self._ignored(rules, entry.path, entry.name, True)):
+                        self.prunedCount += 1
+                        continue
+                    subdirs.append(entry.path)
+                    if entry.is_symlink():
+                        links.add(entry.path)
+                elif suffix in self.suffixes or suffix in self.countSuffixes:
+                    if not entry.is_file():
+                        continue        # broken link, device, ...
+                    if self.prune and self._ignored(rules, entry.path, entry.name, False):
+                        continue
+                    self.fileCounts[suffix] = self.fileCounts.get(suffix, 0) + 1
+                    if suffix in self.suffixes:
+                        files.append((entry.path, suffix))
+            except OSError:
+                continue
+        if len(links) > 0:
+            self.dirLinks[dirPath] = links
+        return subdirs, files
+
+    # the identity of a directory: (st_dev, st_ino), or None if it can't be stat()ed
+    def dir_id(self, dirPath):
+        try:
+            statInfo = os.stat(dirPath)
+        except OSError:
+            return None
+        return (statInfo.st_dev, statInfo.st_ino)
+
+    # yield the path of each data typedef file under paths (depth-first, files before subdirectories)
+    # onDir: called with each directory listed; the walk stops if it returns True
+    # yieldDirs: also yield None after each directory listed
+    def walk(self, paths, onDir=None, yieldDirs=False):
+        for path in paths:
+            # (only a symlink's real path is resolved)
+            pending = [(path, (), os.path.realpath(path))]
+            while len(pending) > 0:
+                dirPath, rules, realPath = pending.pop()
+                # walked before: through another scan path, or a symlink (loop)
+                if realPath in self.visited:
+                    continue
+                self.visited.add(realPath)
+                try:
+                    subdirs, files = self.list_dir(dirPath, rules)
+                except OSError:
+                    continue
+                if onDir is not None and onDir(dirPath):
+                    return
+                if yieldDirs:
+                    yield None
+                for filePath, suffix in files:
+                    yield filePath
+                rules = self.dirRules.pop(dirPath, rules)
+                links = self.dirLinks.pop(dirPath, ())
+                for subdir in reversed(subdirs):
+                    if subdir in links:
+                        pending.append((subdir, rules, os.path.realpath(subdir)))
+                    else:
+                        pending.append((subdir, rules, os.path.join(realPath, os.path.basename(subdir))))
@@ -0,0 +1,227 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# roswatch.py -- keep a type database up to date as the scanned workspace changes: poll the
+#   directories and typedef files with stat(), and apply the changes as an incremental scan.
+import os
+import time, threading
+from rosp import rosscan, roswalk
+
+class ScanWatcher(threading.Thread):
+
+    # onUpdate(changedCount, deletedCount) is called (in the watcher thread) after each update
+    def __init__(self, paths, types, tags, dbname, workers=1, interval=1.0, maxInterval=5.0, debounce=0.5, commitEvery=50, onUpdate=None, prune=True, engine='lexer', cacheFile=''):
+        super().__init__(name='ScanWatcher', daemon=True)
+        self.paths = paths
+        self.types = types
+        self.tags = tags
+        self.dbname = dbname
+        self.workers = workers
+        self.interval = interval            # poll interval after a change
+        self.maxInterval = maxInterval      # poll interval backs off to this while idle
+        self.debounce = debounce            # wait for this long without changes before updating
+        self.commitEvery = commitEvery      # files per transaction when applying an update
+        self.onUpdate = onUpdate
+        self.prune = prune
+        self.engine = engine                # parsing engine (see rosscan.parserEngines)
+        self.cacheFile = cacheFile          # parse cache file ('' = none)
+        self.myRosTypes = {type for type in types if type in rosscan.rosDataTypes}
+        self.myTypes = self.myRosTypes | {type for type in types if type in rosscan.idlDataTypes or type in rosscan.xmlDataTypes}
+        self.walker = roswalk.ScanWalker(self.myTypes, prune=prune)
+        self.stopEvent = threading.Event()
+        self.dirIds = {}        # dirPath: (st_dev, st_ino), to skip symlink loops
+        self.dirState = {}      # dirPath: mtime_ns
+        self.dirFiles = {}      # dirPath: set of typedef file paths in it
+        self.dirSubdirs = {}    # dirPath: set of subdirectory paths
+        self.fileState = {}     # filePath: (mtime_ns, size)
+        self.updateCount = 0
+
+    # stop watching (an update in progress is cancelled)
+    def stop(self):
+        self.stopEvent.set()
+
+    # record a directory and everything below it; returns the typedef files found
+    def _add_tree(self, dirPath):
+        found = []
+        pending = [dirPath]
+        watchedIds = set(self.dirIds.values())
+        while len(pending) > 0:
+            thisDir = pending.pop()
+            dirId = self.walker.dir_id(thisDir)
+            if dirId is None or dirId in watchedIds:
+                continue
+            try:
+                self.dirState[thisDir] = os.stat(thisDir).st_mtime_ns
+                subdirs, files = self._list_dir(thisDir)
+            except OSError:
+                self.dirState.pop(thisDir, None)
+                continue
+            self.dirIds[thisDir] = dirId
+            watchedIds.add(dirId)
+            self.dirFiles[thisDir] = set(files)
+            self.dirSubdirs[thisDir] = set(subdirs)
+            self.fileState.update(files)
+            found.extend(files)
+            pending.extend(subdirs)
+        return found
+
+    # forget a directory and everything below it; returns the typedef files it held
+    def _drop_tree(self, dirPath):
+        lost = []
+        pending = [dirPath]
+        while len(pending) > 0:
+            thisDir = pending.pop()
+            self.dirState.pop(thisDir, None)
+            self.dirIds.pop(thisDir, None)
+            for filePath in self.dirFiles.pop(thisDir, ()):
+                self.fileState.pop(filePath, None)
+                lost.append(filePath)
+            pending.extend(self.dirSubdirs.pop(thisDir, ()))
+        return lost
+
+    # list one directory: (subdirectory paths, {typedef file path: (mtime_ns, size)})
+    def _list_dir(self, dirPath):
+        # the ignore rules in effect here are those of the parent (none for a watched root)
+        parentRules = ()
+        if dirPath not in self.paths:
+            parentRules = self.walker.dirRules.get(os.path.dirname(dirPath), ())
+        subdirs, filePaths = self.walker.list_dir(dirPath, parentRules)
+        files = {}
+        for filePath, suffix in filePaths:
+            try:
+                statInfo = os.stat(filePath)
+            except OSError:
+                continue
+            files[filePath] = (statInfo.st_mtime_ns, statInfo.st_size)
+        return subdirs, files
+
+    # one pass of stat() calls; returns (set of changed/added files, set of deleted files)
+    def poll(self):
+        changed = set()
+        deleted = set()
+        # directories: added / removed entries
+        for dirPath in list(self.dirState):
+            if dirPath not in self.dirState:
+                continue        # dropped along with its parent
+            try:
+                mtime = os.stat(dirPath).st_mtime_ns
+            except OSError:
+                deleted.update(self._drop_tree(dirPath))
+                continue
+            if mtime == self.dirState[dirPath]:
+                continue
+            self.dirState[dirPath] = mtime
+            try:
+                subdirs, files = self._list_dir(dirPath)
+            except OSError:
+                deleted.update(self._drop_tree(dirPath))
+                continue
+            for filePath in self.dirFiles[dirPath] - set(files):
+                self.fileState.pop(filePath, None)
+                deleted.add(filePath)
+            for filePath in set(files) - self.dirFiles[dirPath]:
+                self.fileState[filePath] = files[filePath]
+                changed.add(filePath)
+            self.dirFiles[dirPath] = set(files)
+            for subdir in self.dirSubdirs[dirPath] - set(subdirs):
+                deleted.update(self._drop_tree(subdir))
+            for subdir in set(subdirs) - self.dirSubdirs[dirPath]:
+                changed.update(self._add_tree(subdir))
+            self.dirSubdirs[dirPath] = set(subdirs)
+
+        # files: edits
+        for filePath, state in list(self.fileState.items()):
+            if filePath in changed:
+                continue
+            try:
+                statInfo = os.stat(filePath)
+            except OSError:
+                continue        # its directory changed too; picked up on the next poll
+            newState = (statInfo.st_mtime_ns, statInfo.st_size)
+            if newState != state:
+                self.fileState[filePath] = newState
+                changed.add(filePath)
+
+        # a file deleted then re-created within one poll is a change
+        deleted -= changed
+        return changed, deleted
+
+    # apply a set of changes to the database as an incremental update
+    def apply(self, changed, deleted):
+        manifest = rosscan.read_manifest(self.dbname)
+        deletedKeys = [rosscan.source_key(filePath) for filePath in deleted]
+        if '.idl' in self.myTypes and len(self.myRosTypes) > 0:
+            changed = {filePath for filePath in changed if not rosscan.is_generated_idl(filePath, self.myRosTypes)}
+        parsedCount = rosscan.update_database(self.dbname, self.tags, sorted(changed), deletedKeys, manifest,
+                                              self.workers, self.commitEvery, self.engine, self.cacheFile, self.stopEvent)
+        if self.stopEvent.is_set():
+            return
+        self.updateCount += 1
+        print('Watch: updated {} ({} files changed, {} deleted)'.format(self.dbname, parsedCount, len(deleted)))
+        if self.onUpdate is not None:
+            self.onUpdate(parsedCount, len(deleted))
+
+    def run(self):
+        # bring the database up to date with the tree, then watch it
+        for path in self.paths:
+            self._add_tree(path)
+        rosscan.scan_paths(self.paths, self.types, self.tags, self.dbname, self.workers, incremental=True, prune=self.prune, engine=self.engine,
+                           cacheFile=self.cacheFile, cancel=self.stopEvent)
+        if self.stopEvent.is_set():
+            return
+        if self.onUpdate is not None:
+            self.onUpdate(0, 0)
+
+        interval = self.interval
+        while not self.stopEvent.wait(interval):
+            changed, deleted = self.poll()
+            if len(changed) == 0 and len(deleted) == 0:
+                interval = min(interval * 1.5, self.maxInterval)
+                continue
+
+            # debounce: keep collecting until a poll finds nothing new (or it's been a while)
+            quietBy = time.monotonic() + 20 * self.debounce
+            while not self.stopEvent.wait(self.debounce) and time.monotonic() < quietBy:
+                moreChanged, moreDeleted = self.poll()
+                if len(moreChanged) == 0 and len(moreDeleted) == 0:
+                    break
+                changed = (changed - moreDeleted) | moreChanged
+                deleted = (deleted - moreChanged) | moreDeleted
+            if self.stopEvent.is_set():
+                break
+            try:
+                self.apply(changed, deleted)
+            except Exception as e:
+                print('Watch: update of {} failed: {}'.format(self.dbname, e))
+            interval = self.interval
+
+
+# watch paths, keep dbname up to date until interrupted (headless)
+def watch_paths_for_datatype_files(paths, types, tags, dbname, workers=1, interval=1.0, maxInterval=5.0, debounce=0.5, prune=True, engine='lexer', cacheFile=''):
+    watcher = ScanWatcher(paths, types, tags, dbname, workers, interval, maxInterval, debounce, prune=prune, engine=engine, cacheFile=cacheFile)
+    watcher.start()
+    try:
+        while watcher.is_alive():
+            watcher.join(1.0)
+    except KeyboardInterrupt:
+        watcher.stop()
+        watcher.join()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Keep a type database up to date with a workspace')
+    parser.add_argument('paths', nargs='+', help='paths to scan and watch')
+    parser.add_argument('--db', required=True, help='database file to update')
+    parser.add_argument('--tags', nargs='*', default=[], help='tags to add to the scanned types')
+    parser.add_argument('--workers', type=int, default=1, help='number of parser processes (0 = one per CPU)')
+    parser.add_argument('--interval', type=float, default=1.0, help='poll interval (seconds) after a change')
+    parser.add_argument('--max-interval', type=float, default=5.0, help='poll interval (seconds) when idle')
+    parser.add_argument('--debounce', type=float, default=0.5, help='quiet time (seconds) before applying changes')
+    args = parser.parse_args()
+    watch_paths_for_datatype_files(args.paths, ['.msg', '.srv', '.action'], args.tags, args.db,
+                                   args.workers, args.interval, args.max_interval, args.debounce)
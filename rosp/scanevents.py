@@ -0,0 +1,44 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# scanevents.py -- the events of a scan, as yielded by rosscan.scan_events(), in this order:
+#   DirEntered.. WalkDone, FileParsed/BatchCommitted.., ResolveProgress.., ScanDone (also when cancelled)
+
+class ScanEvent():
+    kind = ''
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join('{}={!r}'.format(k, v) for k, v in self.__dict__.items()))
+
+# a directory was listed: path
+class DirEntered(ScanEvent):
+    kind = 'dir'
+
+# the walk is done: fileCount (ROS typedef files found), idlCount, xmlCount, prunedCount (directories skipped)
+class WalkDone(ScanEvent):
+    kind = 'walked'
+
+# a file was parsed (or taken from the parse cache) and queued for the database writer:
+# path, recordCount, parsedCount (files so far), fileCount (files walked; an incremental scan skips the unchanged ones)
+class FileParsed(ScanEvent):
+    kind = 'file'
+
+# the database writer committed: batchCount (files written so far)
+class BatchCommitted(ScanEvent):
+    kind = 'commit'
+
+# type references resolved: done, total (members)
+class ResolveProgress(ScanEvent):
+    kind = 'resolve'
+
+# the scan is over: fileCount, parsedCount, failedCount, rejectedCount, deletedCount, cancelled,
+# diagnostics (the count of each diagnostic code in the database)
+class ScanDone(ScanEvent):
+    kind = 'done'
@@ -0,0 +1,133 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# scanlimits.py -- the resource bounds of a 'bounded' scan, for hosts that do other work:
+#   maxWorkers (parser processes), niceness (CPU and idle I/O priority), readRate (bytes/s read)
+#   and maxInFlight (bytes read ahead of the database writer).
+import os, sys, time
+import shutil, subprocess
+import threading
+
+# the defaults of a bounded scan
+defaultMaxWorkers = 2
+defaultNiceness = 10
+defaultReadRate = 32 * 1024 * 1024
+defaultMaxInFlight = 64 * 1024 * 1024
+
+# the bounds of the scan in progress, or None
+active = None
+
+# the scan in progress read n bytes of a file: wait if it reads faster than its read rate
+def read_bytes(n):
+    if active is not None:
+        active.throttle(n)
+
+
+class ScanLimits():
+
+    # 0 = no bound
+    def __init__(self, maxWorkers=defaultMaxWorkers, niceness=defaultNiceness, readRate=defaultReadRate, maxInFlight=defaultMaxInFlight):
+        self.maxWorkers = maxWorkers
+        self.niceness = niceness
+        self.readRate = readRate
+        self.maxInFlight = maxInFlight
+        self.priority = []          # what lower_priority() did
+        self.lowered = False
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        self.startTime = time.monotonic()
+        self.tokens = self.readRate
+        self.lastRefill = self.startTime
+        self.bytesRead = 0
+        self.throttledTime = 0.0    # seconds spent waiting for the read rate
+        self.heldCount = 0          # times the read-ahead stopped at maxInFlight
+        self.peakInFlight = 0       # bytes
+        self.stageBytes = {}        # stage: the bytes it holds (see in_flight())
+
+    # the number of worker processes a scan asking for 'workers' may use
+    def workers(self, workers):
+        return workers if self.maxWorkers <= 0 else max(1, min(workers, self.maxWorkers))
+
+    # lower the CPU and I/O priority of this process (inherited by the processes it starts);
+    # only once (a watch scans again and again, with the same limits)
+    def lower_priority(self):
+        if self.niceness <= 0 or self.lowered:
+            return
+        self.lowered = True
+        try:
+            import psutil
+        except ImportError:
+            psutil = None
+        try:
+            if hasattr(os, 'nice'):
+                os.nice(self.niceness)
+                self.priority.append('nice +{}'.format(self.niceness))
+            elif psutil is not None:
+                psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+                self.priority.append('below normal priority')
+        except OSError as e:
+            print('Cannot lower the CPU priority: {}'.format(e))
+        try:
+            if psutil is not None and hasattr(psutil, 'IOPRIO_CLASS_IDLE'):
+                psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+                self.priority.append('idle I/O')
+            elif psutil is not None and sys.platform == 'win32':
+                psutil.Process().ionice(psutil.IOPRIO_VERYLOW)
+                self.priority.append('very low I/O')
+            elif shutil.which('ionice') is not None:
+                subprocess.run(['ionice', '-c', '3', '-p', str(os.getpid())], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                self.priority.append('idle I/O')
+            else:
+                print("Cannot lower the I/O priority: needs the 'psutil' module, or the 'ionice' command")
+        except (OSError, subprocess.CalledProcessError, AttributeError) as e:
+            print('Cannot lower the I/O priority: {}'.format(e))
+
+    # n bytes were read: wait until the read rate allows them
+    def throttle(self, n):
+        with self.lock:
+            self.bytesRead += n
+            if self.readRate <= 0:
+                return
+            now = time.monotonic()
+            self.tokens = min(self.readRate, self.tokens + (now - self.lastRefill) * self.readRate) - n
+            self.lastRefill = now
+            wait = -self.tokens / self.readRate if self.tokens < 0 else 0
+            self.throttledTime += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    # a stage of the read-ahead ('read': the read threads, 'parse': the parser window) holds 'inFlight'
+    # bytes; held: it stopped reading at maxInFlight.  Returns the bytes all the stages hold
+    def in_flight(self, inFlight, held=False, stage='parse'):
+        with self.lock:
+            self.stageBytes[stage] = inFlight
+            total = sum(self.stageBytes.values())
+            self.peakInFlight = max(self.peakInFlight, total)
+            if held:
+                self.heldCount += 1
+            return total
+
+    # a line on the bounds of the scan, and what they cost it
+    def summary(self, workers):
+        seconds = max(time.monotonic() - self.startTime, 0.001)
+        parts = ['{} worker{}'.format(workers, 's' if workers != 1 else '')] + self.priority
+        text = 'Bounded scan ({}): read {} in {:.1f} s ({}/s)'.format(', '.join(parts), size_text(self.bytesRead), seconds, size_text(self.bytesRead / seconds))
+        if self.readRate > 0:
+            text += ', {:.1f} s throttled by the {}/s read limit'.format(self.throttledTime, size_text(self.readRate))
+        if self.maxInFlight > 0:
+            text += ', read-ahead held {} times at the {} in-flight limit (peak {})'.format(
+                self.heldCount, size_text(self.maxInFlight), size_text(self.peakInFlight))
+        return text
+
+
+# '1.5 MB', '12.0 KB'
+def size_text(n):
+    if n >= 1024 * 1024:
+        return '{:.1f} MB'.format(n / (1024 * 1024))
+    return '{:.1f} KB'.format(n / 1024)
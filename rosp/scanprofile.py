@@ -0,0 +1,129 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# scanprofile.py -- where the time of a scan goes (see rosscan.scan_events(profile=True)).
+#   The pipeline marks its phases with 'with scanprofile.phase(name):' (walk, read, hash, clean,
+#   parse, cache, write, resolve, vacuum); the report is written as JSON next to the database.
+import os, time
+import json, heapq
+import collections, contextlib, threading
+
+# the profile of the scan in progress, or None
+active = None
+
+_noPhase = contextlib.nullcontext()
+
+# a context manager that times a phase of the scan in progress (if it is profiled)
+def phase(name):
+    if active is None:
+        return _noPhase
+    return active.phase(name)
+
+# add to a count of the scan in progress (if it is profiled)
+def count(name, n=1):
+    if active is not None:
+        active.count(name, n)
+
+# iterate, timing each step as a phase (for generators: the walk)
+def timed(name, iterable):
+    if active is None:
+        return iterable
+    return active.timed(name, iterable)
+
+
+class ScanProfile():
+
+    def __init__(self, slowestCount=20):
+        self.phases = {}            # name: [wall seconds, cpu seconds, count]
+        self.counts = collections.Counter()
+        self.info = {}              # scan settings and results, for the report
+        self.slowestCount = slowestCount
+        self.slowest = []           # heap of (seconds, path) of the slowest files
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.startWall = time.perf_counter()
+        self.startCpu = time.process_time()
+        self.pid = os.getpid()      # (a worker process forked from this one gets a copy: see rosscan.parse_datatype_source)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        nested = [0.0, 0.0]     # wall, cpu of the phases nested in this one
+        stack.append(nested)
+        startWall = time.perf_counter()
+        startCpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - startWall
+            cpu = time.thread_time() - startCpu
+            stack.pop()
+            if len(stack) > 0:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            self.add_phase(name, wall - nested[0], cpu - nested[1])
+
+    def timed(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_phase(self, name, wall, cpu, n=1):
+        with self.lock:
+            times = self.phases.get(name)
+            if times is None:
+                times = self.phases[name] = [0.0, 0.0, 0]
+            times[0] += wall
+            times[1] += cpu
+            times[2] += n
+
+    # add the phases of another profile (a worker's)
+    def merge_phases(self, phases):
+        for name, (wall, cpu, n) in phases.items():
+            self.add_phase(name, wall, cpu, n)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counts[name] += n
+
+    # a callback for sqlite3 set_trace_callback(): counts the SQL statements run
+    def sql_tracer(self, name='sqlStatements'):
+        return lambda statement: self.count(name)
+
+    # the time it took to read and parse a file (only the slowest are kept)
+    def file_time(self, path, seconds):
+        with self.lock:
+            if len(self.slowest) < self.slowestCount:
+                heapq.heappush(self.slowest, (seconds, path))
+            elif seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, path))
+
+    # the report: a dict that can be written as JSON
+    def report(self, **scanInfo):
+        report = dict(scanInfo)
+        report.update(self.info)
+        report['wallSeconds'] = round(time.perf_counter() - self.startWall, 6)
+        report['cpuSeconds'] = round(time.process_time() - self.startCpu, 6)
+        report['phases'] = {name: {'wallSeconds': round(wall, 6), 'cpuSeconds': round(cpu, 6), 'count': n}
+                            for name, (wall, cpu, n) in sorted(self.phases.items(), key=lambda item: -item[1][0])}
+        report['counts'] = dict(sorted(self.counts.items()))
+        report['slowestFiles'] = [{'path': path, 'seconds': round(seconds, 6)} for seconds, path in sorted(self.slowest, reverse=True)]
+        return report
+
+    # write the report next to the database, return the file name
+    def write_report(self, dbname, **scanInfo):
+        fileName = '{}.profile.json'.format(os.path.splitext(dbname)[0] if dbname.endswith('.db') else dbname)
+        with open(fileName, 'w') as reportFile:
+            reportFile.write(json.dumps(self.report(db=dbname, **scanInfo), indent=2))
+        return fileName
@@ -0,0 +1,48 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# test_roslexer.py -- the lexer engine writes the same records as the legacy parser
+#   python3 -m pytest rosp
+import unittest
+from rosp import parsebench
+
+# typedef files, by path: the common forms and the corners of the .msg syntax
+sourceFiles = {
+    '/ws/geo/msg/Point.msg': 'float64 x\nfloat64 y\nfloat64 z\n',
+    '/ws/geo/msg/Pose.msg': '# a pose\n\nPoint position  # where\nPoint[] path\ngeo/Point[3] corners\nstring<=10 name\nuint16[<=3] few\nstring<=5[<=2] tags\n',
+    '/ws/geo/msg/Consts.msg': 'uint8 RED=1\nint32 NEG = -4\nstring NAME="a # b"\nstring QUOTE=\'it\'\nfloat32 PI=3.14\nbool ON=true\n',
+    '/ws/geo/msg/Defaults.msg': 'int32 a 5\nfloat64[] b [1.0, 2.0]\nstring c "x y"\nbool d False\nint8[3] e [1,2,3]\n',
+    '/ws/geo/msg/Spacing.msg': '\tint32\t\tfirst\r\n  int32   second   \r\n#only a comment\r\nbuiltin_interfaces/Time stamp\r\n',
+    '/ws/geo/msg/Empty.msg': '',
+    '/ws/geo/msg/Comments.msg': '# nothing\n# but comments\n',
+    '/ws/geo/srv/Add.srv': 'int64 a\nint64 b\n---\nint64 sum\n',
+    '/ws/geo/srv/Ping.srv': '---\n',
+    '/ws/geo/action/Move.action': '# goal\nPoint target\n---\nbool ok\n---\nfloat32 progress\n',
+    '/ws/geo/msg/Bad.msg': 'int32\nnot a valid line here\nint32 x\n'
+}
+
+class TestLexerParity(unittest.TestCase):
+
+    def test_same_records(self):
+        sources = [{'path': path, 'data': data} for path, data in sourceFiles.items()]
+        lexerTimes, lexerBatches = parsebench.parse_all(sources, ['t'], 'lexer')
+        legacyTimes, legacyBatches = parsebench.parse_all(sources, ['t'], 'legacy')
+        for source, lexerBatch, legacyBatch in zip(sources, lexerBatches, legacyBatches):
+            with self.subTest(path=source['path']):
+                self.assertEqual(parsebench.comparable_records(lexerBatch), parsebench.comparable_records(legacyBatch))
+                self.assertEqual(lexerBatch.diagnostics, legacyBatch.diagnostics)
+
+    # the lexer caches member lines across files: a second parse gives the same records
+    def test_cached_records(self):
+        sources = [{'path': path, 'data': data} for path, data in sourceFiles.items()]
+        firstTimes, firstBatches = parsebench.parse_all(sources, ['t'], 'lexer')
+        secondTimes, secondBatches = parsebench.parse_all(sources + sources, ['t'], 'lexer')
+        for idx, firstBatch in enumerate(firstBatches):
+            self.assertEqual(parsebench.comparable_records(secondBatches[len(sources) + idx]), parsebench.comparable_records(firstBatch))
+
+if __name__ == '__main__':
+    unittest.main()
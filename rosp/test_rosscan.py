@@ -0,0 +1,88 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# test_rosscan.py -- an incremental scan writes the same database as a full scan of the same files
+#   python3 -m pytest rosp
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+from rosp import rosscan
+
+workspaceFiles = {
+    'geo/msg/Point.msg': 'float64 x\nfloat64 y\nfloat64 z\n',
+    'geo/msg/Pose.msg': 'uint8 RED=1\nPoint position\nPoint[] path\n',
+    'geo/msg/Old.msg': 'int32 gone\n',
+    'nav/msg/Route.msg': 'geo/Pose[] poses\nstring name\n',
+    'nav/srv/Plan.srv': 'geo/Point goal\n---\nnav/Route route\n',
+    'nav/action/Go.action': 'geo/Point goal\n---\nbool ok\n---\nfloat32 progress\n'
+}
+
+def write_files(rootDir, files):
+    for relPath, text in files.items():
+        filePath = os.path.join(rootDir, relPath)
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+        with open(filePath, 'w') as fileOut:
+            fileOut.write(text)
+
+# the rows of a database that a scan writes, less the scan time in the notes of the datatypes
+def comparable_rows(dbName):
+    dbConn = sqlite3.connect(dbName)
+    try:
+        typeRows = set()
+        for row in dbConn.execute('SELECT * FROM datatypes'):
+            notes = json.loads(row[8]) if len(row[8]) > 0 else {}
+            notes.pop('scan', None)
+            typeRows.add(row[:8] + (json.dumps(notes, sort_keys=True),))
+        memberRows = set(dbConn.execute('SELECT * FROM typemembers'))
+        diagnosticRows = set(dbConn.execute('SELECT severity, code, idkey, typeName, typePath, candidates, source, message FROM diagnostics'))
+    finally:
+        dbConn.close()
+    return typeRows, memberRows, diagnosticRows
+
+class TestIncrementalScan(unittest.TestCase):
+
+    def test_incremental_equals_full(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            wsDir = os.path.join(tmpDir, 'ws')
+            write_files(wsDir, workspaceFiles)
+            incrDb = os.path.join(tmpDir, 'incr.db')
+            rosscan.scan_paths([wsDir], rosscan.rosDataTypes, ['t'], incrDb)
+
+            # change, add, delete and break a file
+            write_files(wsDir, {'geo/msg/Pose.msg': 'uint8 RED=1\nuint8 BLUE=3\nPoint position\nstring label\n',
+                                'geo/msg/New.msg': 'Pose pose\nint64 count\n',
+                                'nav/msg/Route.msg': 'geo/Pose[] poses\nnot a member line\n'})
+            os.remove(os.path.join(wsDir, 'geo/msg/Old.msg'))
+            rosscan.scan_paths([wsDir], rosscan.rosDataTypes, ['t'], incrDb, incremental=True)
+
+            fullDb = os.path.join(tmpDir, 'full.db')
+            rosscan.scan_paths([wsDir], rosscan.rosDataTypes, ['t'], fullDb)
+            incrRows = comparable_rows(incrDb)
+            fullRows = comparable_rows(fullDb)
+            self.assertEqual(incrRows[0], fullRows[0])
+            self.assertEqual(incrRows[1], fullRows[1])
+            self.assertEqual(incrRows[2], fullRows[2])
+            self.assertFalse(any(row[1] == 'Old' for row in incrRows[0]))
+
+    def test_unchanged_rescan(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            wsDir = os.path.join(tmpDir, 'ws')
+            write_files(wsDir, workspaceFiles)
+            dbName = os.path.join(tmpDir, 'ws.db')
+            rosscan.scan_paths([wsDir], rosscan.rosDataTypes, ['t'], dbName)
+            firstRows = comparable_rows(dbName)
+            doneEvents = []
+            rosscan.scan_paths([wsDir], rosscan.rosDataTypes, ['t'], dbName, incremental=True,
+                               onEvent=lambda event: doneEvents.append(event) if event.kind == 'done' else None)
+            self.assertEqual(comparable_rows(dbName), firstRows)
+            self.assertEqual(doneEvents[0].parsedCount, 0)
+            self.assertEqual(rosscan.unchanged_count(doneEvents[0]), len(workspaceFiles))
+
+if __name__ == '__main__':
+    unittest.main()
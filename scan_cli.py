@@ -0,0 +1,330 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# scan_cli.py -- the headless entry point (no tkinter, no display): scan, watch, merge, query, export
+#   python3 scan_cli.py scan --db dbfiles/myws.db --tags myws ~/ros2_ws/src
+#   python3 scan_cli.py scan --db dbfiles/myws-1.0.db --tags myws-1.0 --rev 1.0 ~/ros2_ws/src/myrepo
+#   python3 scan_cli.py watch --db dbfiles/myws.db --tags myws ~/ros2_ws/src
+#   python3 scan_cli.py merge --db dbfiles/myws.db shard1.db shard2.db
+#   python3 scan_cli.py query --db dbfiles/ros2h.db --name Pose --path geometry_msgs
+#   python3 scan_cli.py export --db dbfiles/ros2h.db --name PoseStamped --format idl
+#   python3 scan_cli.py diagnostics --db dbfiles/myws.db --severity warning
+#   Each subcommand imports only the modules it needs; trg-config.json gives the defaults.
+import os, sys
+import json
+import argparse
+
+my_cwd = os.path.dirname(os.path.realpath(__file__))
+
+# export formats, as in the GUI export list: (file name suffix, module, function, takes the list of selected types)
+exportTargets = {
+    'idl': ('_types.idl', 'idlp.idltypex', 'export_idl_type_file', False),
+    'idlcmake': ('_types.idl', 'cxxp.cxxcodex', 'export_idl_cxx11_app', True),
+    'xml': ('_types.xml', 'xmlp.xmltypex', 'export_xml_type_file', False),
+    'connector': ('_connector.xml', 'xmlp.xmltypex', 'export_xml_connector_cfg_file', True),
+    'routsvc': ('_routsvc.xml', 'xmlp.xmltypex', 'export_xml_routsvc_cfg_file', True),
+    'recsvc': ('_recsvc.xml', 'xmlp.xmltypex', 'export_xml_recsvc_cfg_file', True)
+}
+
+# read the GUI settings, if any (paths in it are relative to its directory)
+def read_config():
+    try:
+        with open(os.path.join(my_cwd, 'trg-config.json'), 'r') as cfgFileContents:
+            return json.loads(cfgFileContents.read())
+    except (OSError, ValueError):
+        return {}
+
+def config_path(path):
+    if len(path) == 0 or os.path.isabs(path):
+        return path
+    return os.path.join(my_cwd, path)
+
+# load the types of the database files: { idkey: [typeName, typePath, tags, memberCount, memberErr, dbFile] }
+# and the set of idkeys that match the tag filter 'tags'
+def load_types(dbFiles, tags=''):
+    from sqldb import sql3db
+    typeRef = {}
+    tagGroups = sql3db.tag_query(tags)
+    tagIds = set()
+    for dbFile in dbFiles:
+        # (sqlite would create a missing file)
+        if not os.path.isfile(dbFile):
+            raise SystemExit('No such database file: {}'.format(dbFile))
+        mydb = sql3db.SQL3Util(dbFile, readOnly=True)
+        for dtKey, dtVal in mydb.datatypes_reftree().items():
+            if dtKey in typeRef:
+                tags = typeRef[dtKey][2].split()
+                tags.extend(tag for tag in dtVal[2].split() if tag not in tags)
+                typeRef[dtKey][2] = ' '.join(tags)
+            else:
+                typeRef[dtKey] = dtVal + [dbFile]
+        tagIds.update(mydb.datatypes_tag_query(tagGroups))
+        mydb.database_close()
+    return typeRef, tagIds
+
+# the GUI filters: name and path match a part of the typeName/typePath
+# (the tags are matched by load_types())
+def type_matches(typeVal, name, path):
+    if len(name) > 0 and typeVal[0].find(name) == -1:
+        return False
+    if len(path) > 0 and typeVal[1].find(path) == -1:
+        return False
+    return True
+
+# the idkeys of the types that pass the filters (or are listed in args.id), sorted by path/name
+# tagIds: the types that match the tag filter (args.tags), from load_types()
+def select_types(typeRef, tagIds, args):
+    if len(args.id) > 0:
+        missing = [idkey for idkey in args.id if idkey not in typeRef]
+        if len(missing) > 0:
+            raise SystemExit('No such type id: {}'.format(' '.join(missing)))
+        return list(args.id)
+    typeIds = [dtKey for dtKey, dtVal in typeRef.items() if dtKey in tagIds and type_matches(dtVal, args.name, args.path)]
+    return sorted(typeIds, key=lambda dtKey: (typeRef[dtKey][1], typeRef[dtKey][0]))
+
+def default_db_files(args, cfgVal):
+    if len(args.db) > 0:
+        return args.db
+    dbFiles = [config_path(dbFile) for dbFile in cfgVal.get('lastLoadedDbFiles', [])]
+    if len(dbFiles) == 0:
+        raise SystemExit('No database file: use --db')
+    return dbFiles
+
+
+# the file suffixes to scan
+def scan_types(args):
+    from rosp import rosscan
+    return rosscan.rosDataTypes + (rosscan.idlDataTypes if args.idl else []) + (rosscan.xmlDataTypes if args.xml else [])
+
+# the bounds of a --bounded scan (a scanlimits.ScanLimits), or None; a bound given alone implies --bounded
+def scan_limits(args):
+    from rosp import scanlimits
+    bounds = (args.max_workers, args.nice, args.read_limit, args.max_in_flight)
+    if not args.bounded and all(bound is None for bound in bounds):
+        return None
+    megabyte = 1024 * 1024
+    return scanlimits.ScanLimits(
+        maxWorkers=scanlimits.defaultMaxWorkers if args.max_workers is None else args.max_workers,
+        niceness=scanlimits.defaultNiceness if args.nice is None else args.nice,
+        readRate=scanlimits.defaultReadRate if args.read_limit is None else int(args.read_limit * megabyte),
+        maxInFlight=scanlimits.defaultMaxInFlight if args.max_in_flight is None else int(args.max_in_flight * megabyte))
+
+def cmd_scan(args, cfgVal):
+    from rosp import rosscan
+    import threading, time
+    for baseName in args.base:
+        if not os.path.isfile(baseName):
+            raise SystemExit('No such database file: {}'.format(baseName))
+    cancel = threading.Event()
+    events = rosscan.scan_events(args.paths, scan_types(args), args.tags, args.db, args.workers, args.incremental,
+                                 not args.no_prune, args.engine, args.cache_file, cancel, args.ament_index, args.profile, args.shard, args.rev,
+                                 args.reproducible, args.base, scan_limits(args), args.checkpoint, args.read_threads)
+    nextProgress = 0
+    try:
+        for event in events:
+            if event.kind == 'walked':
+                print('ScanTotal: {} ros files, {} IDL files, {} XML files ({} directories pruned)'.format(event.fileCount, event.idlCount, event.xmlCount,
+                                                                                                       event.prunedCount))
+            elif event.kind == 'done':
+                if args.incremental:
+                    print('{}: {} files parsed, {} failed, {} rejected, {} unchanged, {} deleted{}'.format(
+                        args.db, event.parsedCount, event.failedCount, event.rejectedCount, rosscan.unchanged_count(event), event.deletedCount,
+                        ' (cancelled)' if event.cancelled else ''))
+                else:
+                    print('{}: {} files parsed, {} failed, {} rejected{}'.format(args.db, event.parsedCount, event.failedCount, event.rejectedCount,
+                                                                                ' (cancelled)' if event.cancelled else ''))
+                if len(event.diagnostics) > 0:
+                    print('{} (see: scan_cli.py diagnostics --db {})'.format(rosscan.diagnostics_summary(event.diagnostics), args.db))
+            elif args.progress and time.monotonic() > nextProgress:
+                nextProgress = time.monotonic() + 0.5
+                if event.kind == 'file':
+                    print('  {} of {} files'.format(event.parsedCount, event.fileCount), file=sys.stderr)
+                elif event.kind == 'resolve':
+                    print('  resolved {} of {} members'.format(event.done, event.total), file=sys.stderr)
+    except KeyboardInterrupt:
+        # stop the scan: the database is left as of the last commit
+        events.close()
+        print('{}: scan cancelled'.format(args.db))
+        return 130
+    return 0
+
+def cmd_watch(args, cfgVal):
+    from rosp import roswatch
+    roswatch.watch_paths_for_datatype_files(args.paths, scan_types(args), args.tags, args.db, args.workers,
+                                            prune=not args.no_prune, engine=args.engine, cacheFile=args.cache_file)
+    return 0
+
+def cmd_merge(args, cfgVal):
+    from sqldb import dbmerge
+    try:
+        counts = dbmerge.merge_databases(args.db, args.shards)
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    print('{}: {} types, {} members added, {} members unresolved'.format(args.db, counts['types'], counts['members'], counts['unresolved']))
+    return 0
+
+# --shard K/N: (K-1, N)
+def shard_arg(text):
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected K/N, as '2/4'")
+    if count < 1 or index < 1 or index > count:
+        raise argparse.ArgumentTypeError('expected 1 <= K <= N')
+    return (index - 1, count)
+
+def cmd_query(args, cfgVal):
+    typeRef, tagIds = load_types(default_db_files(args, cfgVal), args.tags)
+    typeIds = select_types(typeRef, tagIds, args)
+    if args.json:
+        print(json.dumps([{'idkey': dtKey, 'typeName': typeRef[dtKey][0], 'typePath': typeRef[dtKey][1], 'tags': typeRef[dtKey][2].split(),
+                           'memberCount': int(typeRef[dtKey][3]), 'unresolved': typeRef[dtKey][4] == 'UNDEF', 'db': typeRef[dtKey][5]}
+                          for dtKey in typeIds], indent=2))
+    else:
+        nameWidth = max([len(typeRef[dtKey][1]) + len(typeRef[dtKey][0]) + 1 for dtKey in typeIds] + [0])
+        for dtKey in typeIds:
+            dtVal = typeRef[dtKey]
+            print('{}  {:{}s} {:>3s} {:5s}  {}'.format(dtKey, dtVal[1] + '/' + dtVal[0], nameWidth, dtVal[3], dtVal[4], dtVal[2]))
+    # (as grep does: nothing found is an error)
+    return 0 if len(typeIds) > 0 else 1
+
+def cmd_diagnostics(args, cfgVal):
+    from sqldb import sql3db
+    diagnostics = []
+    for dbFile in default_db_files(args, cfgVal):
+        if not os.path.isfile(dbFile):
+            raise SystemExit('No such database file: {}'.format(dbFile))
+        mydb = sql3db.SQL3Util(dbFile, readOnly=True)
+        diagnostics.extend(row + (dbFile,) for row in mydb.diagnostics_readall(args.severity, args.code, args.source))
+        mydb.database_close()
+    if args.json:
+        print(json.dumps([{'severity': severity, 'code': code, 'idkey': idkey, 'typeName': typeName, 'typePath': typePath,
+                           'candidates': json.loads(candidates), 'source': source, 'message': message, 'db': dbFile}
+                          for severity, code, idkey, typeName, typePath, candidates, source, message, dbFile in diagnostics], indent=2))
+    else:
+        for severity, code, idkey, typeName, typePath, candidates, source, message, dbFile in diagnostics:
+            print('{}: {} [{}] {}'.format(source or dbFile, severity, code, message))
+    # (as query: nothing found is an error)
+    return 0 if len(diagnostics) > 0 else 1
+
+def cmd_export(args, cfgVal):
+    import importlib
+    from sqldb import sql3db, hashutil
+    typeRef, tagIds = load_types(default_db_files(args, cfgVal), args.tags)
+    typeIds = select_types(typeRef, tagIds, args)
+    if len(typeIds) == 0:
+        raise SystemExit('No types match the filters')
+
+    # the selected types [ID, typeName, typePath, dbFileName], as in the GUI
+    typesToExport = [[dtKey, typeRef[dtKey][0], typeRef[dtKey][1], typeRef[dtKey][5]] for dtKey in typeIds]
+
+    # each type with its dependencies, once (as the GUI export)
+    typeInfoToExport = []
+    exportedIds = set()
+    for typexp in typesToExport:
+        mydb = sql3db.SQL3Util(typexp[3], readOnly=True)
+        typeRec = mydb.get_record_tree_by_typename_or_idkey('', '', typexp[0])
+        mydb.database_close()
+        for typeItem in reversed(typeRec):
+            if typeItem[0][0] not in exportedIds:
+                exportedIds.add(typeItem[0][0])
+                typeInfoToExport.append(typeItem)
+
+    fileNameSuffix, moduleName, functionName, takesTypeList = exportTargets[args.format]
+    fileNameToCreate = args.out
+    if len(fileNameToCreate) == 0:
+        # the name the GUI suggests: SelectedTypeName_countOfSelectedTypes_3CharHashOfTypeIds_NameSuffix.ext
+        typeCountStr = '_{}'.format(len(typeIds)) if len(typeIds) > 1 else ''
+        groupTypeId = '_{}'.format(hashutil.hex_from_hash_base64(hashutil.hash_list_of_strings(typeIds))[0:3])
+        fileNameToCreate = '{}{}{}{}'.format(typesToExport[0][1], typeCountStr, groupTypeId, fileNameSuffix)
+    fileNameToCreate = os.path.abspath(fileNameToCreate)
+    os.makedirs(os.path.dirname(fileNameToCreate), exist_ok=True)
+
+    exportFunction = getattr(importlib.import_module(moduleName), functionName)
+    if takesTypeList:
+        fileNameCreated = exportFunction(typeInfoToExport, fileNameToCreate, typesToExport)
+    else:
+        fileNameCreated = exportFunction(typeInfoToExport, fileNameToCreate)
+    print('Wrote to file: {}'.format(fileNameCreated))
+    return 0
+
+
+def main(argv=None):
+    cfgVal = read_config()
+    parser = argparse.ArgumentParser(description='RTI Integration Toolkit for ROS types, without the GUI')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    for command, helpText in (('scan', 'scan paths for .msg/.srv/.action files into a database'),
+                              ('watch', 'scan, then keep the database up to date with the paths')):
+        subparser = subparsers.add_parser(command, help=helpText)
+        subparser.add_argument('paths', nargs='+', help='paths to scan (directories, archives, .mcap/rosbag2 recordings)')
+        subparser.add_argument('--db', required=True, help='database file to write')
+        subparser.add_argument('--tags', nargs='*', default=[], help='tags to add to the scanned types')
+        subparser.add_argument('--workers', type=int, default=cfgVal.get('scanWorkers', 0), help='number of parser processes (0 = one per CPU)')
+        subparser.add_argument('--engine', choices=['lexer', 'legacy'], default=cfgVal.get('scanParser', 'lexer'), help='parsing engine')
+        subparser.add_argument('--cache-file', default=config_path(cfgVal.get('scanCacheFile', '')), help="parse cache file ('' = none)")
+        subparser.add_argument('--no-prune', action='store_true', help='also scan build/, install/, log/.. and ignored directories')
+        subparser.add_argument('--idl', action='store_true', help='also scan .idl files (an .idl generated from the .msg/.srv/.action next to it is skipped)')
+        subparser.add_argument('--xml', action='store_true', help='also scan .xml files for Connext XML type libraries')
+        if command == 'scan':
+            subparser.add_argument('--incremental', action='store_true', help='only re-parse the files changed since the last scan into --db')
+            subparser.add_argument('--progress', action='store_true', help='print progress (to stderr)')
+            subparser.add_argument('--profile', action='store_true', help='time the phases of the scan, into a .profile.json file next to --db')
+            subparser.add_argument('--ament-index', action=argparse.BooleanOptionalAction, default=cfgVal.get('scanAmentIndex', False),
+                                   help='scan an install prefix by the interface files of its ament index, instead of walking it')
+            subparser.add_argument('--shard', type=shard_arg, default=None, metavar='K/N',
+                                   help='scan only shard K of N of the files (merge the shard databases with the merge command)')
+            subparser.add_argument('--base', action='append', default=[], metavar='DB',
+                                   help='resolve the types the scanned files use but do not define in this (read-only) database; can be repeated')
+            subparser.add_argument('--reproducible', action='store_true',
+                                   help='write the same database file (byte for byte) for the same files: cacheable by its hash')
+            subparser.add_argument('--rev', default=None, metavar='REVISION',
+                                   help='the paths are git repositories: scan them as they are at this commit, branch or tag (no checkout)')
+            subparser.add_argument('--read-threads', type=int, default=cfgVal.get('scanReadThreads', 0), metavar='N',
+                                   help='threads that read the files ahead of the parser, for network file systems (0 = none)')
+            subparser.add_argument('--checkpoint', type=int, default=cfgVal.get('scanCheckpointEvery', 0), metavar='N',
+                                   help='commit every N files, so an interrupted scan is resumed by the same scan command (0 = commit at the end)')
+            subparser.add_argument('--bounded', action='store_true',
+                                   help='share the host: few workers, low CPU/IO priority, a read rate and a read-ahead memory limit (the bounds below)')
+            subparser.add_argument('--max-workers', type=int, default=None, metavar='N', help='bounded: at most N parser processes (default 2, 0 = no bound)')
+            subparser.add_argument('--nice', type=int, default=None, metavar='N', help='bounded: lower the CPU priority by N, and use idle I/O (default 10, 0 = no change)')
+            subparser.add_argument('--read-limit', type=float, default=None, metavar='MB', help='bounded: read the files at most at MB/s (default 32, 0 = no bound)')
+            subparser.add_argument('--max-in-flight', type=float, default=None, metavar='MB',
+                                   help='bounded: at most MB of files read ahead of the database writer (default 64, 0 = no bound)')
+
+    subparser = subparsers.add_parser('merge', help='merge databases (as the shards of a scan) into one, then resolve the types')
+    subparser.add_argument('shards', nargs='+', help='database files to merge')
+    subparser.add_argument('--db', required=True, help='database file to write (created, or added to)')
+
+    for command, helpText in (('query', 'list the types in the database(s) that pass the filters'),
+                              ('export', 'export the types that pass the filters (and their dependencies)')):
+        subparser = subparsers.add_parser(command, help=helpText)
+        subparser.add_argument('--db', action='append', default=[], help='database file to read (repeat for more; default: lastLoadedDbFiles of trg-config.json)')
+        subparser.add_argument('--name', default='', help='typeName filter (part of the name)')
+        subparser.add_argument('--path', default='', help='typePath filter (part of the path)')
+        subparser.add_argument('--tags', default='', help="tag filter: words (whole tags) are OR'ed, '&' between groups AND's them")
+        subparser.add_argument('--id', action='append', default=[], help='select a type by idkey (instead of the filters; repeat for more)')
+        if command == 'query':
+            subparser.add_argument('--json', action='store_true', help='print the types as JSON')
+        else:
+            subparser.add_argument('--format', choices=list(exportTargets), default='idl', help='export format')
+            subparser.add_argument('--out', default='', help='file to write (default: named as in the GUI, in the current directory)')
+
+    subparser = subparsers.add_parser('diagnostics', help='list what the scans found wrong in the files (parse errors, unresolved or ambiguous types..)')
+    subparser.add_argument('--db', action='append', default=[], help='database file to read (repeat for more; default: lastLoadedDbFiles of trg-config.json)')
+    subparser.add_argument('--severity', choices=['error', 'warning', 'info'], default='', help='only the diagnostics of this severity')
+    subparser.add_argument('--code', default='', help='only the diagnostics with this code (parse, read, rejected, unresolved, ambiguous, wrongpath, multimatch, unsupported, base)')
+    subparser.add_argument('--source', default='', help='source file filter (part of the path)')
+    subparser.add_argument('--json', action='store_true', help='print the diagnostics as JSON')
+
+    args = parser.parse_args(argv)
+    commands = {'scan': cmd_scan, 'watch': cmd_watch, 'merge': cmd_merge, 'query': cmd_query, 'export': cmd_export, 'diagnostics': cmd_diagnostics}
+    return commands[args.command](args, cfgVal)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,7 @@
 # This code contains trade secrets of Real-Time Innovations, Inc.
 #
 import os, platform
-import json
+import time, threading
 import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog as fd
@@ -14,7 +14,7 @@ from tkinter import scrolledtext
 from sqldb import sql3db, hashutil
 from idlp import idltypex
 from xmlp import xmltypex
-from rosp import rosparser
+from rosp import roswatch, rosscan
 from cxxp import cxxcodex
 from cfgx import cfgsettings
 from pathlib import Path
@@ -30,6 +30,9 @@ class TypeRepoUI(tk.Tk):
 		self.filterName = ''		# filters for typeName, typePath, keywords
 		self.filterPath = ''
 		self.filterKeys = ''
+		self.filterTagGroups = []	# the filterKeys groups (see sql3db.tag_query())
+		self.typeTagSets = {}		# idkey: set of the type's tags (for the tag filter)
+		self.tagEdits = []			# the tag edits not yet written: (dbFileName, 'add' or 'remove', idkeys, tags)
 		self.my_cwd = os.path.dirname(os.path.realpath(__file__))
 		self.scanFilePath = ''				# path to scan for data type files
 		self.scanDBaseFilePath = ''			# path to write scan database result
@@ -43,6 +46,11 @@ class TypeRepoUI(tk.Tk):
 		self.typeTreeSortReverse = False	# toggle to sort normal/reverse order
 		self.dbFileName = ''				# name of database file to open
 		self.dbFileNames = []				# list of database files opened
+		self.scanWatcher = None				# watch-mode thread (roswatch.ScanWatcher), if running
+		self.scanWatchUpdated = False		# set by the watcher thread when its database changed
+		self.scanEvents = None				# the scan in progress (rosscan.scan_events generator), if any
+		self.scanCancel = threading.Event()	# set to stop the scan in progress
+		self.scanDbFile = ''				# database file of the scan in progress
 
 		# images
 		self.box_checked = tk.PhotoImage('checked', file='./images/checked1.gif')
@@ -58,6 +66,7 @@ class TypeRepoUI(tk.Tk):
 		self.m.add_cascade(menu=self.m_file, label="File")
 		self.m_file.add_command(label="Open db...", command=lambda: self.event_generate("<<OpenFileDialog>>"))
 		self.m_file.add_command(label="Unload all", command=lambda: self.event_generate("<<UnloadAllFromTree>>"))
+		self.m_file.add_command(label="Scan diagnostics...", command=lambda: self.event_generate("<<ShowDiagnostics>>"))
 		self['menu']=self.m
 
 		# main containers
@@ -98,10 +107,14 @@ class TypeRepoUI(tk.Tk):
 		self.scanTypeLabel = ttk.Label(self.tabScan, text='FileTypes:')
 		self.scanRosVar = tk.BooleanVar(value=True)
 		self.scanTypeRos = ttk.Checkbutton(self.tabScan, text='ROS(msg/srv/action)', variable=self.scanRosVar, onvalue=True)
-		#self.scanIdlVar = tk.BooleanVar(value=False)
-		#self.scanTypeIdl = ttk.Checkbutton(self.tabScan, text='IDL', variable=self.scanIdlVar, onvalue=True)
-		#self.scanXmlVar = tk.BooleanVar(value=False)
-		#self.scanTypeXml = ttk.Checkbutton(self.tabScan, text='XML', variable=self.scanXmlVar, onvalue=True)
+		self.scanIncrementalVar = tk.BooleanVar(value=False)
+		self.scanIncremental = ttk.Checkbutton(self.tabScan, text='Changed files only', variable=self.scanIncrementalVar, onvalue=True)
+		self.scanWatchVar = tk.BooleanVar(value=False)
+		self.scanWatch = ttk.Checkbutton(self.tabScan, text='Watch for changes', variable=self.scanWatchVar, onvalue=True, command=self.scanWatchToggled)
+		self.scanIdlVar = tk.BooleanVar(value=False)
+		self.scanTypeIdl = ttk.Checkbutton(self.tabScan, text='IDL', variable=self.scanIdlVar, onvalue=True)
+		self.scanXmlVar = tk.BooleanVar(value=False)
+		self.scanTypeXml = ttk.Checkbutton(self.tabScan, text='XML', variable=self.scanXmlVar, onvalue=True)
 		# path to write database file
 		self.scanDBasePathValue = tk.StringVar()
 		self.scanDBasePathValue.set(self.my_cwd)
@@ -216,8 +229,10 @@ class TypeRepoUI(tk.Tk):
 		self.scanTags.grid(column=1, row=2, sticky=(tk.W))
 		self.scanTypeLabel.grid(column=0, row=3)
 		self.scanTypeRos.grid(column=1, row=3, sticky=(tk.W))
-		#self.scanTypeIdl.grid(column=2, row=3, sticky=(tk.W))
-		#self.scanTypeXml.grid(column=3, row=3, sticky=(tk.W))
+		self.scanIncremental.grid(column=4, row=3, sticky=(tk.E))
+		self.scanWatch.grid(column=4, row=2, sticky=(tk.E))
+		self.scanTypeIdl.grid(column=2, row=3, sticky=(tk.W))
+		self.scanTypeXml.grid(column=3, row=3, sticky=(tk.W))
 		self.scanDBasePathButton.grid(column=0, row=4)
 		self.scanDBasePath.grid(column=1, row=4)
 		self.scanDBaseFileNameLabel.grid(column=0, row=5)
@@ -324,6 +339,7 @@ class TypeRepoUI(tk.Tk):
 		# bind functions to events
 		self.bind("<<OpenFileDialog>>", self.launchOpenFileDialog)
 		self.bind("<<UnloadAllFromTree>>", self.unloadAllFromTree)
+		self.bind("<<ShowDiagnostics>>", self.showDiagnostics)
 		self.bind("<<SelectPathDialog>>", self.launchSelectPathDialog)
 		self.bind("<<SelectDBasePathDialog>>", self.launchSelectDBasePathDialog)
 		self.bind("<<StartScan>>", self.launchScanOperation)
@@ -406,18 +422,10 @@ class TypeRepoUI(tk.Tk):
 				if self.typeTreeRef[dtId][1].find(self.filterPath) == -1:
 					add_to_tree = False
 
-			# filter by tag(s)
-			if len(self.filterKeys) > 0:
-				# filter: if multiple words, OR is implied unless '&' between groups
-				filterANDgroups = self.filterKeys.split('&')
-				for filterGroup in filterANDgroups:
-					if add_to_tree == True:
-						filterORterms = filterGroup.split()
-						tag_filter_matched = False
-						for filterTerm in filterORterms:
-							if self.typeTreeRef[dtId][2].find(filterTerm) != -1:
-								tag_filter_matched = True
-						add_to_tree = tag_filter_matched
+			# filter by tag(s): if multiple words, OR is implied unless '&' between groups
+			if len(self.filterTagGroups) > 0:
+				if not sql3db.tags_match(self.typeTagSets[dtId], self.filterTagGroups):
+					add_to_tree = False
 
 			if add_to_tree == True:
 				if self.typeTreeRef[dtId][4] == 'UNDEF':
@@ -440,8 +448,18 @@ class TypeRepoUI(tk.Tk):
 		if len(databaseFileName) == 0:
 			return
 		self.dbFileName = databaseFileName
-		self.dbFileNames.append(self.dbFileName)
-		dbFileIndex = str(len(self.dbFileNames)-1)
+		checkedKeys = set()
+		if self.dbFileName in self.dbFileNames:
+			# reloading (after a rescan): drop this database's types from the tree first
+			dbFileIndex = str(self.dbFileNames.index(self.dbFileName))
+			for dtKey in [dtKey for dtKey in self.typeTreeRef if self.typeTreeRef[dtKey][5] == dbFileIndex]:
+				if self.typeTreeRef[dtKey][-1] == 'checked':
+					checkedKeys.add(dtKey)
+				del self.typeTreeRef[dtKey]
+				del self.typeTagSets[dtKey]
+		else:
+			self.dbFileNames.append(self.dbFileName)
+			dbFileIndex = str(len(self.dbFileNames)-1)
 
 		mydb = sql3db.SQL3Util(self.dbFileName)
 		# get a dict of: idkey:[name, path, keys, countOfMembers]
@@ -452,7 +470,7 @@ class TypeRepoUI(tk.Tk):
 			# list order: 0:typeName, 1:typePath, 2:keywords, 3:memberCount, 4:memberErr
 			# append: 5:dbFileIndex, 6:'unchecked'
 			dbFileTypeTree[dtKey].append(dbFileIndex)			
-			dbFileTypeTree[dtKey].append('unchecked')
+			dbFileTypeTree[dtKey].append('checked' if dtKey in checkedKeys else 'unchecked')
 
 			if dtKey in self.typeTreeRef:
 				# this type already in refTree; merge the keywords
@@ -468,6 +486,7 @@ class TypeRepoUI(tk.Tk):
 				self.typeTreeRef[dtKey] = refTypeVal
 			else:
 				self.typeTreeRef[dtKey] = dbFileTypeTree[dtKey]
+			self.typeTagSets[dtKey] = set(self.typeTreeRef[dtKey][2].split())
 
 		# now update the displayed tree (using filters)
 		self.updateTypeTreeWithFilters()
@@ -492,10 +511,63 @@ class TypeRepoUI(tk.Tk):
 	# unload all loaded databases from tree, and clear the last-loaded file list
 	def unloadAllFromTree(self, *args):
 		self.typeTreeRef.clear()
+		self.typeTagSets.clear()
+		self.tagEdits.clear()
 		self.typeTree.delete(*self.typeTree.get_children())
 		self.MyConfig.cfgVal['lastLoadedDbFiles'].clear()
 		self.MyConfig.updateFile()
 
+	# a window listing the diagnostics (parse errors, unresolved or ambiguous types..) of the loaded databases
+	def showDiagnostics(self, *args):
+		dbFiles = [self.dbFileNames[int(dbFileIndex)] for dbFileIndex in sorted({dtVal[5] for dtVal in self.typeTreeRef.values()}, key=int)]
+		window = tk.Toplevel(self)
+		window.title('Scan diagnostics')
+		window.geometry('{}x{}'.format(1000, 350))
+		window.grid_rowconfigure(1, weight=1)
+		window.grid_columnconfigure(1, weight=1)
+		severityValue = tk.StringVar(value='all')
+		severityBox = ttk.Combobox(window, textvariable=severityValue, values=['all', 'error', 'warning', 'info'], state='readonly', width=10)
+		sourceValue = tk.StringVar()
+		sourceEntry = ttk.Entry(window, textvariable=sourceValue)
+		countText = tk.StringVar()
+		diagTree = ttk.Treeview(window, columns=('#1', '#2', '#3', '#4'))
+		diagTree.heading('#0', text='Severity')
+		diagTree.heading('#1', text='Code')
+		diagTree.heading('#2', text='Type')
+		diagTree.heading('#3', text='Source')
+		diagTree.heading('#4', text='Message')
+		diagTree.column('#0', width=60, anchor=tk.W)
+		diagTree.column('#1', width=70, anchor=tk.W)
+		diagTree.column('#2', width=150, anchor=tk.W)
+		diagTree.column('#3', width=250, anchor=tk.W)
+		diagTree.column('#4', width=450, anchor=tk.W)
+		diagTree.tag_configure('error', background='yellow')
+		diagScroll = ttk.Scrollbar(window, orient=tk.VERTICAL, command=diagTree.yview)
+		diagTree.configure(yscrollcommand=diagScroll.set)
+
+		def loadDiagnostics(*args):
+			diagTree.delete(*diagTree.get_children())
+			severity = '' if severityValue.get() == 'all' else severityValue.get()
+			diagCount = 0
+			for dbFile in dbFiles:
+				mydb = sql3db.SQL3Util(dbFile)
+				for severity_, code, idkey, typeName, typePath, candidates, source, message in mydb.diagnostics_readall(severity, '', sourceValue.get()):
+					typeText = '{}/{}'.format(typePath, typeName) if len(typeName) > 0 else ''
+					diagTree.insert('', tk.END, text=severity_, values=(code, typeText, source or dbFile, message), tags=(severity_,))
+					diagCount += 1
+				mydb.database_close()
+			countText.set('{} diagnostics in {} database(s)'.format(diagCount, len(dbFiles)))
+
+		ttk.Label(window, text='Severity:').grid(column=0, row=0, sticky=tk.W, padx=3, pady=3)
+		severityBox.grid(column=0, row=0, sticky=tk.E, padx=3, pady=3)
+		sourceEntry.grid(column=1, row=0, sticky=(tk.W, tk.E), padx=3, pady=3)
+		ttk.Label(window, textvariable=countText).grid(column=2, row=0, sticky=tk.E, padx=3, pady=3)
+		diagTree.grid(column=0, row=1, columnspan=3, sticky=(tk.N, tk.W, tk.E, tk.S))
+		diagScroll.grid(column=3, row=1, sticky=(tk.N, tk.S))
+		severityBox.bind('<<ComboboxSelected>>', loadDiagnostics)
+		sourceEntry.bind('<Return>', loadDiagnostics)
+		loadDiagnostics()
+
 	# dialog for choosing a scan path
 	def launchSelectPathDialog(self, *args):
 		self.scanFilePath = os.path.realpath(fd.askdirectory(title='select', initialdir=self.MyConfig.cfgVal['scanPath']))
@@ -512,23 +584,111 @@ class TypeRepoUI(tk.Tk):
 		self.MyConfig.cfgVal['scanDbStorePath'] = self.scanDBaseFilePath
 		self.MyConfig.updateFile()
 
-	# Launch the scan operation
+	# Launch the scan operation (or stop the one in progress)
 	def launchScanOperation(self, *args):
+		if self.scanEvents is not None:
+			self.scanCancel.set()
+			self.statusText.set('Stopping the scan..')
+			return
 		if self.scanDBaseFileNameValue.get() == '':
 			self.statusText.set('ERROR: must set name of the database file to write')
 			return
 		# FIXME: this needs to ensure the path and filename/ext format is correct.
 		dbFilePathToWrite = os.path.realpath('{}/{}.db'.format(self.scanDBasePathValue.get(), self.scanDBaseFileNameValue.get()))
-		rosparser.scan_paths_for_datatype_files([self.scanPathValue.get()], ['.msg', '.srv', '.action'], [self.scanTagsValue.get()], dbFilePathToWrite)
+		scanTypes = (rosscan.rosDataTypes if self.scanRosVar.get() else []) + (rosscan.idlDataTypes if self.scanIdlVar.get() else []) + \
+			(rosscan.xmlDataTypes if self.scanXmlVar.get() else [])
+		if len(scanTypes) == 0:
+			self.statusText.set('ERROR: must select the file types to scan')
+			return
+		if self.scanWatchVar.get():
+			# watch mode: the watcher thread does the (incremental) scan, and keeps it up to date
+			self.stopScanWatcher()
+			self.scanWatcher = roswatch.ScanWatcher([self.scanPathValue.get()], scanTypes, [self.scanTagsValue.get()], dbFilePathToWrite,
+				workers=self.MyConfig.cfgVal.get('scanWorkers', 0), onUpdate=self.scanWatcherUpdated, engine=self.MyConfig.cfgVal.get('scanParser', 'lexer'),
+				cacheFile=self.MyConfig.cfgVal.get('scanCacheFile', ''))
+			self.scanWatcher.start()
+			self.statusText.set('Watching {} for changes'.format(self.scanPathValue.get()))
+			self.after(500, self.checkScanWatcher)
+			return
+		# the scan runs in steps between GUI events (see stepScanOperation), the button stops it
+		self.scanCancel.clear()
+		self.scanDbFile = dbFilePathToWrite
+		self.scanEvents = rosscan.scan_events([self.scanPathValue.get()], scanTypes, [self.scanTagsValue.get()], dbFilePathToWrite,
+			workers=self.MyConfig.cfgVal.get('scanWorkers', 0), incremental=self.scanIncrementalVar.get(), engine=self.MyConfig.cfgVal.get('scanParser', 'lexer'),
+			cacheFile=self.MyConfig.cfgVal.get('scanCacheFile', ''), cancel=self.scanCancel, amentIndex=self.MyConfig.cfgVal.get('scanAmentIndex', False),
+			checkpointEvery=self.MyConfig.cfgVal.get('scanCheckpointEvery', 0), readThreads=self.MyConfig.cfgVal.get('scanReadThreads', 0))
+		self.scanLaunchButton.configure(text='Stop Scan')
+		self.statusText.set('Scanning {}'.format(self.scanPathValue.get()))
+		self.after(1, self.stepScanOperation)
+
+	# run the scan in progress for a moment, show where it is, and come back for more
+	def stepScanOperation(self):
+		stepEnd = time.monotonic() + 0.1
+		try:
+			for event in self.scanEvents:
+				if event.kind == 'done':
+					self.scanOperationDone(event)
+					return
+				if time.monotonic() > stepEnd:
+					if event.kind == 'dir':
+						self.statusText.set('Scanning: {}'.format(event.path))
+					elif event.kind == 'file':
+						self.statusText.set('Scanning: {} of {} files'.format(event.parsedCount, event.fileCount))
+					elif event.kind == 'resolve':
+						self.statusText.set('Resolving type references: {} of {}'.format(event.done, event.total))
+					break
+		except Exception as e:
+			self.scanEvents = None
+			self.scanLaunchButton.configure(text='Start Scan')
+			self.statusText.set('ERROR: scan failed: {}'.format(e))
+			return
+		self.after(1, self.stepScanOperation)
+
+	def scanOperationDone(self, doneEvent):
+		self.scanEvents = None
+		self.scanLaunchButton.configure(text='Start Scan')
+		if doneEvent.cancelled:
+			self.statusText.set('Scan stopped ({} files parsed)'.format(doneEvent.parsedCount))
+			return
 
 		# now load the database
-		self.databaseOpenAndLoadFile(dbFilePathToWrite)
+		self.databaseOpenAndLoadFile(self.scanDbFile)
+		if len(doneEvent.diagnostics) > 0:
+			self.statusText.set('{} (File > Scan diagnostics...)'.format(rosscan.diagnostics_summary(doneEvent.diagnostics)))
 
 		# also add this database to the cfgVal list (for auto-loading next time)
-		self.MyConfig.cfgVal['lastLoadedDbFiles'].append(dbFilePathToWrite)
+		self.MyConfig.cfgVal['lastLoadedDbFiles'].append(self.scanDbFile)
 		self.MyConfig.updateFile()
 
 
+	# called from the watcher thread; the GUI picks this up in checkScanWatcher()
+	def scanWatcherUpdated(self, changedCount, deletedCount):
+		self.scanWatchUpdated = True
+
+	# periodic check (in the GUI thread) for watch-mode database updates
+	def checkScanWatcher(self):
+		if self.scanWatcher is None:
+			return
+		if self.scanWatchUpdated:
+			self.scanWatchUpdated = False
+			self.databaseOpenAndLoadFile(self.scanWatcher.dbname)
+			if self.scanWatcher.dbname not in self.MyConfig.cfgVal['lastLoadedDbFiles']:
+				self.MyConfig.cfgVal['lastLoadedDbFiles'].append(self.scanWatcher.dbname)
+				self.MyConfig.updateFile()
+		self.after(500, self.checkScanWatcher)
+
+	# stop watch mode (if running)
+	def stopScanWatcher(self):
+		if self.scanWatcher is not None:
+			self.scanWatcher.stop()
+			self.scanWatcher = None
+
+	# 'Watch for changes' checkbox: turning it off stops a running watcher
+	def scanWatchToggled(self, *args):
+		if not self.scanWatchVar.get():
+			self.stopScanWatcher()
+			self.statusText.set('Stopped watching for changes')
+
 	# open database, get / return type list by ID
 	def getTypesFromDatabase(self, typeKeyId, dbToOpen):
 		# open the database
@@ -658,6 +818,7 @@ class TypeRepoUI(tk.Tk):
 			self.filterPath = queryVar.get()
 		elif qfield == 'keys':
 			self.filterKeys = queryVar.get()
+			self.filterTagGroups = sql3db.tag_query(self.filterKeys)
 		# now update the tree and status area
 		self.updateTypeTreeWithFilters()
 		self.updateStatusPaneWithCounts()
@@ -750,70 +911,55 @@ class TypeRepoUI(tk.Tk):
 		treeAll = self.typeTree.get_children()
 		for tRow in treeAll:
 			if self.typeTree.item(tRow)['image'][0] == 'checked':
-				itemTagList = self.typeTreeRef[tRow][2].split()
-				for itemTag in itemTagList:
-					tagSet.add(itemTag)
+				tagSet.update(self.typeTagSets[tRow])
 		tagSetString = ' '.join(list(tagSet))
 		self.currentTagsVar.set("{}".format(tagSetString))
 
-	# update the selected types with new TAGS
-	def appendTagsToSelectedTypes(self, *args):
-		tagSet = set()
+	# add (editKind 'add') or remove ('remove') the tags of the Change Tags entry in the selected types;
+	# the edit is kept, by database file, for 'Write to Database'
+	def editTagsOfSelectedTypes(self, editKind):
 		newTagList = self.changeTags.get().split()
+		if len(newTagList) == 0:
+			return
+		editIds = {}
 		treeAll = self.typeTree.get_children()
 		for tRow in treeAll:
 			if self.typeTree.item(tRow)['image'][0] == 'checked':
-				itemTagList = self.typeTreeRef[tRow][2].split()
-				for itemTag in itemTagList:
-					tagSet.add(itemTag)
-				for newTag in newTagList:
-					tagSet.add(newTag)
-				newTagString = ' '.join(list(tagSet))
-				self.typeTreeRef[tRow][2] = newTagString
+				tagSet = self.typeTagSets[tRow]
+				if editKind == 'add':
+					tagSet.update(newTagList)
+				else:
+					tagSet.difference_update(newTagList)
+				self.typeTreeRef[tRow][2] = ' '.join(sorted(tagSet))
+				editIds.setdefault(self.dbFileNames[int(self.typeTreeRef[tRow][5])], []).append(tRow)
 				itemRowNum = self.typeTree.index(tRow)
 				self.typeTree.delete(tRow)
 				self.typeTree.insert('', itemRowNum, tRow, values=self.typeTreeRef[tRow][:-1], image=self.box_checked)
+		for dbFileName, idkeys in editIds.items():
+			self.tagEdits.append((dbFileName, editKind, idkeys, newTagList))
 
+	# update the selected types with new TAGS
+	def appendTagsToSelectedTypes(self, *args):
+		self.editTagsOfSelectedTypes('add')
 
 	# remove TAGS from the selected types
 	def removeTagsInSelectedTypes(self, *args):
-		tagSet = set()
-		newTagList = self.changeTags.get().split()
-		treeAll = self.typeTree.get_children()
-		for tRow in treeAll:
-			if self.typeTree.item(tRow)['image'][0] == 'checked':
-				itemTagList = self.typeTreeRef[tRow][2].split()
-				# get existing set of tags
-				for itemTag in itemTagList:
-					tagSet.add(itemTag)
-				# remove new tags
-				for newTag in newTagList:
-					tagSet.discard(newTag)
-				newTagString = ' '.join(list(tagSet))
-				self.typeTreeRef[tRow][2] = newTagString
-				itemRowNum = self.typeTree.index(tRow)
-				self.typeTree.delete(tRow)
-				self.typeTree.insert('', itemRowNum, tRow, values=self.typeTreeRef[tRow][:-1], image=self.box_checked)
+		self.editTagsOfSelectedTypes('remove')
 
-	# update the database with the tags for the selected types
+	# write the tag edits (of the types selected when they were made) to the database(s), in order:
+	# one update of all the types of an edit, in each database file
 	def updateDatabaseTagsForSelectedTypes(self, *args):
-		# this creates a dict of: { dbFileNames { idKey:'json-stringlist-of-tags',,, },, }
-		updateItems = {}
-		treeAll = self.typeTree.get_children()
-		for tRow in treeAll:
-			if self.typeTree.item(tRow)['image'][0] == 'checked':
-				thisTypesDBFile = self.dbFileNames[int(self.typeTreeRef[tRow][5])]
-				if thisTypesDBFile not in updateItems:
-					updateItems[thisTypesDBFile] = {}
-				updateItems[thisTypesDBFile][tRow] = json.dumps(self.typeTreeRef[tRow][2].split())
-
-		# now update the database(s)
-		for itemDbFileName in updateItems:
+		for itemDbFileName in dict.fromkeys(dbFileName for dbFileName, editKind, idkeys, tags in self.tagEdits):
 			itemDb = sql3db.SQL3Util(itemDbFileName)
-			for itemRowId in updateItems[itemDbFileName]:
-				itemDb.update_tags(itemRowId, updateItems[itemDbFileName][itemRowId])
+			for dbFileName, editKind, idkeys, tags in self.tagEdits:
+				if dbFileName == itemDbFileName:
+					if editKind == 'add':
+						itemDb.datatypes_add_tags(idkeys, tags)
+					else:
+						itemDb.datatypes_remove_tags(idkeys, tags)
 			itemDb.database_commit()
 			itemDb.database_close()
+		self.tagEdits.clear()
 
 # --------------------------------------------------
 if __name__ == "__main__":
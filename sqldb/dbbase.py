@@ -0,0 +1,107 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# dbbase.py -- resolve the type references of a scan against read-only base databases (as dbfiles/ros2h.db);
+#   a type found there is copied into the scanned database with the types it depends on.
+import json, sqlite3
+from pathlib import Path
+from . import sql3db
+
+_datatypeColumns = ('idkey', 'typeName', 'typePath', 'typeKind', 'inherits', 'memberList', 'tags', 'flags', 'notes')
+_memberColumns = ('idkey', 'memberName', 'typeName', 'typePath', 'attributes', 'idkeyRef', 'valdefs', 'tags', 'flags', 'notes')
+
+
+# a base database, opened read-only
+class BaseDatabase():
+
+    def __init__(self, dbname):
+        self.dbname = dbname
+        if not Path(dbname).is_file():
+            raise FileNotFoundError('No such database file: {}'.format(dbname))
+        self.connection = sqlite3.connect(Path(dbname).resolve().as_uri() + '?mode=ro', uri=True)
+        self.cursor = self.connection.cursor()
+        # (the TEMP schema is writable, the base is not)
+        self.cursor.execute('CREATE TEMP TABLE basetypes AS SELECT idkey, typeName, typePath FROM main.datatypes')
+        self.cursor.execute('CREATE INDEX temp.basetypes_name ON basetypes (typeName, typePath)')
+
+    def close(self):
+        self.connection.close()
+
+    # the idkey of the type a member references, or None
+    # (by path and name; else by name alone, if there is one and the path was implied)
+    def find_type(self, typeName, typePath, flags):
+        if typePath == '':
+            found = self.cursor.execute('SELECT idkey FROM basetypes WHERE typeName=? ORDER BY rowid', (typeName,)).fetchall()
+        else:
+            found = self.cursor.execute('SELECT idkey FROM basetypes WHERE typeName=? AND typePath=? ORDER BY rowid', (typeName, typePath,)).fetchall()
+            if len(found) == 0:
+                found = self.cursor.execute('SELECT idkey FROM basetypes WHERE typeName=? ORDER BY rowid', (typeName,)).fetchall()
+                if len(found) != 1 or 'IMPLIEDPATH' not in flags:
+                    return None
+        return found[0][0] if len(found) > 0 else None
+
+    # the rows (datatypes, typemembers) of these types and of all the types they depend on
+    def closure(self, typeIds):
+        typeRows = {}
+        memberRows = {}
+        pending = set(typeIds)
+        while len(pending) > 0:
+            memberIds = set()
+            nextTypes = set()
+            for idkeyChunk in sql3db._chunks(list(pending)):
+                marks = ','.join('?' * len(idkeyChunk))
+                for row in self.cursor.execute('SELECT {} FROM datatypes WHERE idkey IN ({})'.format(', '.join(_datatypeColumns), marks), idkeyChunk).fetchall():
+                    typeRows[row[0]] = row
+                    memberIds.update(json.loads(row[5]) if len(row[5]) > 0 else [])
+                    nextTypes.update(json.loads(row[4]) if len(row[4]) > 0 else [])
+            for idkeyChunk in sql3db._chunks(list(memberIds - memberRows.keys())):
+                marks = ','.join('?' * len(idkeyChunk))
+                for row in self.cursor.execute('SELECT {} FROM typemembers WHERE idkey IN ({})'.format(', '.join(_memberColumns), marks), idkeyChunk).fetchall():
+                    memberRows[row[0]] = row
+                    # (a basic type's idkeyRef is its type number)
+                    if row[5] != '-1' and not row[5].isdigit():
+                        nextTypes.add(row[5])
+            pending = nextTypes - typeRows.keys()
+        return list(typeRows.values()), list(memberRows.values())
+
+
+# resolve the unresolved members of 'mydb' (a sql3db.SQL3Util) against the base databases baseNames, in order.
+# memberIds: the members to resolve (None = all the unresolved members)
+# returns the number of members resolved
+def resolve_from_bases(mydb, baseNames, memberIds=None):
+    if memberIds is None:
+        memberIds = mydb.typemembers_unresolved()
+    unresolved = []
+    for idkeyChunk in sql3db._chunks(list(memberIds)):
+        marks = ','.join('?' * len(idkeyChunk))
+        unresolved.extend(mydb.cursor.execute("SELECT idkey, typeName, typePath, flags FROM typemembers WHERE idkeyRef='-1' AND idkey IN ({})".format(marks),
+                                              idkeyChunk).fetchall())
+    resolvedIds = []
+    for baseName in baseNames:
+        if len(unresolved) == 0:
+            break
+        base = BaseDatabase(baseName)
+        try:
+            found = {}
+            stillUnresolved = []
+            for idkey, typeName, typePath, flags in unresolved:
+                typeId = base.find_type(typeName, typePath, flags)
+                if typeId is None:
+                    stillUnresolved.append((idkey, typeName, typePath, flags))
+                else:
+                    found[idkey] = typeId
+            typeRows, memberRows = base.closure(set(found.values()))
+        finally:
+            base.close()
+        mydb.cursor.executemany('INSERT OR IGNORE INTO datatypes ({}) VALUES ({})'.format(', '.join(_datatypeColumns), ','.join('?' * len(_datatypeColumns))), typeRows)
+        mydb.cursor.executemany('INSERT OR IGNORE INTO typemembers ({}) VALUES ({})'.format(', '.join(_memberColumns), ','.join('?' * len(_memberColumns))), memberRows)
+        mydb.cursor.executemany('UPDATE typemembers SET idkeyRef=? WHERE idkey=?', [(typeId, idkey) for idkey, typeId in found.items()])
+        resolvedIds.extend(found.keys())
+        unresolved = stillUnresolved
+    mydb.typemembers_clear_unres(resolvedIds)
+    mydb.diagnostics_clear(resolvedIds)
+    return len(resolvedIds)
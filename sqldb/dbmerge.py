@@ -0,0 +1,98 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# dbmerge.py -- combine type databases into one (as the shards of a scan: see rosscan.scan_events(shard=));
+#   a type in more than one gets the tags of all, then the members still unresolved are resolved once.
+import os
+from . import sql3db
+
+_datatypeColumns = 'idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags, notes'
+_memberColumns = 'idkey, memberName, typeName, typePath, attributes, idkeyRef, valdefs, tags, flags, notes'
+
+# the tags of both rows, when the other row has a tag this one doesn't
+_tagUnion = """tags = (SELECT json_group_array(value) FROM
+        (SELECT value FROM json_each({table}.tags) UNION SELECT value FROM json_each(excluded.tags)))"""
+_newTags = """EXISTS (SELECT value FROM json_each(excluded.tags) EXCEPT SELECT value FROM json_each({table}.tags))"""
+
+_mergeDatatypes = """INSERT INTO datatypes ({columns}) SELECT {columns} FROM merged.datatypes WHERE true
+    ON CONFLICT (idkey) DO UPDATE SET {tagUnion}
+    WHERE {newTags}""".format(columns=_datatypeColumns, tagUnion=_tagUnion.format(table='datatypes'), newTags=_newTags.format(table='datatypes'))
+
+_mergeMembers = """INSERT INTO typemembers ({columns}) SELECT {columns} FROM merged.typemembers WHERE true
+    ON CONFLICT (idkey) DO UPDATE SET {tagUnion},
+        idkeyRef = CASE WHEN typemembers.idkeyRef = '-1' THEN excluded.idkeyRef ELSE typemembers.idkeyRef END,
+        flags = CASE WHEN typemembers.idkeyRef = '-1' THEN excluded.flags ELSE typemembers.flags END
+    WHERE {newTags} OR (typemembers.idkeyRef = '-1' AND excluded.idkeyRef != '-1')""".format(
+        columns=_memberColumns, tagUnion=_tagUnion.format(table='typemembers'), newTags=_newTags.format(table='typemembers'))
+
+# (the records of a file are copied only if the file is not in the manifest yet)
+_mergeSourceRecords = """INSERT INTO sourcerecords (path, idkey, tableName) SELECT path, idkey, tableName FROM merged.sourcerecords
+    WHERE path NOT IN (SELECT path FROM main.sourcefiles)"""
+_mergeSourceFiles = """INSERT OR IGNORE INTO sourcefiles (path, mtime, size, hash) SELECT path, mtime, size, hash FROM merged.sourcefiles"""
+_diagnosticColumns = 'severity, code, idkey, typeName, typePath, candidates, source, message'
+_mergeDiagnostics = """INSERT INTO diagnostics ({columns}) SELECT {columns} FROM merged.diagnostics
+    EXCEPT SELECT {columns} FROM main.diagnostics""".format(columns=_diagnosticColumns)
+
+# members resolved at a time (between two onProgress calls)
+resolveChunkSize = 500
+
+# merge the databases dbNames into database 'dbname' (created if needed), then resolve the members.
+# onProgress: called with a message after each step (None = print it)
+# returns {'types': types added, 'members': members added, 'unresolved': members left unresolved}
+def merge_databases(dbname, dbNames, onProgress=None):
+    if onProgress is None:
+        onProgress = print
+    mydb = sql3db.SQL3Util(dbname)
+    try:
+        mydb.create_tables()
+        mydb.database_commit()
+        startTypes, startMembers = table_counts(mydb)
+        for mergeName in dbNames:
+            if not os.path.isfile(mergeName):
+                raise FileNotFoundError('No such database file: {}'.format(mergeName))
+            if os.path.realpath(mergeName) == os.path.realpath(dbname):
+                continue
+            typeCount, memberCount = table_counts(mydb)
+            # (ATTACH/DETACH can't be in a transaction)
+            mydb.cursor.execute('ATTACH DATABASE ? AS merged', (mergeName,))
+            try:
+                tableNames = {name for (name,) in mydb.cursor.execute("SELECT name FROM merged.sqlite_master WHERE type='table'")}
+                mydb.cursor.execute(_mergeDatatypes)
+                mydb.cursor.execute(_mergeMembers)
+                if 'sourcefiles' in tableNames and 'sourcerecords' in tableNames:
+                    mydb.cursor.execute(_mergeSourceRecords)
+                    mydb.cursor.execute(_mergeSourceFiles)
+                if 'diagnostics' in tableNames:
+                    mydb.cursor.execute(_mergeDiagnostics)
+                mydb.database_commit()
+            except Exception:
+                mydb.database_rollback()
+                raise
+            finally:
+                mydb.cursor.execute('DETACH DATABASE merged')
+            newTypes, newMembers = table_counts(mydb)
+            onProgress('Merged {}: {} types, {} members added'.format(mergeName, newTypes - typeCount, newMembers - memberCount))
+
+        # resolve once, against all the types
+        resolveIds = mydb.typemembers_unresolved()
+        for idx in range(0, len(resolveIds), resolveChunkSize):
+            mydb.resolve_member_trefs([], resolveIds[idx:idx + resolveChunkSize])
+            onProgress('Resolved {} of {} members'.format(min(idx + resolveChunkSize, len(resolveIds)), len(resolveIds)))
+        # (the members resolved now were flagged 'UNRES' by the scan of their database)
+        mydb.typemembers_clear_unres(resolveIds)
+        mydb.database_commit()
+        mydb.datatypes_flag_member_errors()
+        endTypes, endMembers = table_counts(mydb)
+        return {'types': endTypes - startTypes, 'members': endMembers - startMembers, 'unresolved': len(mydb.typemembers_unresolved())}
+    finally:
+        mydb.database_close()
+
+# (count of datatypes, count of typemembers)
+def table_counts(mydb):
+    typeCount = mydb.cursor.execute('SELECT count(*) FROM datatypes').fetchone()[0]
+    memberCount = mydb.cursor.execute('SELECT count(*) FROM typemembers').fetchone()[0]
+    return typeCount, memberCount
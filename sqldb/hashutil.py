@@ -6,49 +6,26 @@
 # This code contains trade secrets of Real-Time Innovations, Inc.
 #
 from hashlib import blake2b
+from binascii import b2a_base64
 import base64, json
 
 # return a 96-bit, BASE64-encoded 16-char hash of the passed-in member(dict); type or const
 # all members: idkey, memberName, typeName, typePath, attributes, idkeyRef, valdefs, tags, flags, notes
 # create a hash from: memberName, typeName, typePath, attributes, idkeyRef, valdefs,       flags
+# (one update with the fields joined is the same hash as an update per field)
 def hash_member(member):
-    h = blake2b(digest_size=12)
-    if len(member['memberName']) > 0:
-        h.update(member['memberName'].encode())
-    if len(member['typeName']) > 0:
-        h.update(member['typeName'].encode())
-    if len(member['typePath']) > 0:
-        h.update(member['typePath'].encode())
-    if len(member['attributes']) > 0:
-        h.update(member['attributes'].encode())
-    if len(member['idkeyRef']) > 0:
-        h.update(member['idkeyRef'].encode())
-    if len(member['valdefs']) > 0:
-        h.update(member['valdefs'].encode())
-    if len(member['flags']) > 0:
-        h.update(member['flags'].encode())
-    baseval = base64.b64encode(h.digest())
-    return baseval.decode()
+    h = blake2b((member['memberName'] + member['typeName'] + member['typePath'] + member['attributes'] +
+                 member['idkeyRef'] + member['valdefs'] + member['flags']).encode(), digest_size=12)
+    # (base64.b64encode() without its wrapper: the scan hashes every member)
+    return b2a_base64(h.digest(), newline=False).decode()
 
 # return a 96-bit, BASE64-encoded 16-char hash of the passed-in datatype(dict); type or Constants
 # datatypes: idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags, notes
 # create hash from: typeName, typePath, typeKind, inherits, memberList,       flags
 def hash_datatype(dtype):
-    h = blake2b(digest_size=12)
-    if len(dtype['typeName']) > 0:
-        h.update(dtype['typeName'].encode())
-    if len(dtype['typePath']) > 0:
-        h.update(dtype['typePath'].encode())
-    if len(dtype['typeKind']) > 0:
-        h.update(dtype['typeKind'].encode())
-    if len(dtype['inherits']) > 0:
-        h.update(dtype['inherits'].encode())
-    if len(dtype['memberList']) > 0:
-        h.update(dtype['memberList'].encode())
-    if len(dtype['flags']) > 0:
-        h.update(dtype['flags'].encode())
-    baseval = base64.b64encode(h.digest())
-    return baseval.decode()
+    h = blake2b((dtype['typeName'] + dtype['typePath'] + dtype['typeKind'] + dtype['inherits'] +
+                 dtype['memberList'] + dtype['flags']).encode(), digest_size=12)
+    return b2a_base64(h.digest(), newline=False).decode()
 
 # return a hex string from a BASE64 encoded value 
 # (expected to be 16-char string input; 96-bit hash)
@@ -64,3 +41,18 @@ def hash_list_of_strings(stringList):
         h.update(hString.encode())
     baseval = base64.b64encode(h.digest())
     return baseval.decode()
+
+# return a 96-bit, BASE64-encoded 16-char hash of a source file's contents (bytes)
+def hash_file_contents(data):
+    h = blake2b(data, digest_size=12)
+    baseval = base64.b64encode(h.digest())
+    return baseval.decode()
+
+# hash_file_contents() of a file read in blocks: update() the hasher with each block,
+# then hash_digest() it
+def file_hasher():
+    return blake2b(digest_size=12)
+
+def hash_digest(h):
+    baseval = base64.b64encode(h.digest())
+    return baseval.decode()
@@ -0,0 +1,56 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# parsecache.py -- a persistent cache of parsed data typedef files, keyed by content
+#   (the records less their tags and scan notes); the file can be deleted at any time.
+import sqlite3
+import json
+
+# part of every key: change this when the parser output changes, to ignore the older entries
+cacheVersion = 2
+
+class ParseCache():
+
+    def __init__(self, dbName):
+        self.dbName = dbName
+        self.connection = sqlite3.connect(self.dbName)
+        self.cursor = self.connection.cursor()
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS parsecache (key TEXT PRIMARY KEY, records TEXT, recordIds TEXT, diagnostics TEXT)")
+        # (a cache file of version 1 has no diagnostics)
+        columnNames = [row[1] for row in self.cursor.execute('PRAGMA table_info(parsecache)')]
+        if 'diagnostics' not in columnNames:
+            self.cursor.execute("ALTER TABLE parsecache ADD COLUMN diagnostics TEXT DEFAULT '[]'")
+        self.hitCount = 0
+        self.missCount = 0
+
+    # close the cache, keeping what was added
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    # (cached records, [(tableName, idkey)...], diagnostics) for this key, or None
+    def get(self, key):
+        row = self.cursor.execute('SELECT records, recordIds, diagnostics FROM parsecache WHERE key=?', (key,)).fetchone()
+        if row is None:
+            self.missCount += 1
+            return None
+        self.hitCount += 1
+        return json.loads(row[0]), [tuple(recordId) for recordId in json.loads(row[1])], json.loads(row[2] or '[]')
+
+    def contains(self, key):
+        return self.cursor.execute('SELECT 1 FROM parsecache WHERE key=?', (key,)).fetchone() is not None
+
+    # add the records of a parsed file (see RecordBatch.records / .recordIds / .diagnostics)
+    def put(self, key, records, recordIds, diagnostics=()):
+        cachedRecords = []
+        for tableName, record in records:
+            record = {k: v for k, v in record.items() if k != 'tags'}
+            if tableName == 'datatypes':
+                record.pop('notes', None)
+            cachedRecords.append((tableName, record))
+        self.cursor.execute('INSERT OR REPLACE INTO parsecache (key, records, recordIds, diagnostics) VALUES (?, ?, ?, ?)',
+                            (key, json.dumps(cachedRecords), json.dumps(recordIds), json.dumps(list(diagnostics))))
@@ -0,0 +1,47 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+from . import hashutil
+
+# A stand-in for SQL3Util that a parser can write into without a database connection:
+# the records are hashed as SQL3Util would, and kept in a list to replay with SQL3Util.records_insert()
+class RecordBatch():
+
+    def __init__(self, srcPath=''):
+        self.srcPath = srcPath      # source file these records came from
+        self.records = []           # list of ('datatypes'|'typemembers', dict), in write order
+        self.srcInfo = None         # source file manifest info: {key, mtime, size, hash}
+        self.recordIds = []         # list of (tableName, idkey) of the records, in write order
+        self.shared = False         # True: another file of this scan wrote these records (see rosscan.parse_sources)
+        self.profile = None         # (seconds, worker phases) when the scan is profiled (see rosscan.parse_datatype_source)
+        self.part = 0               # a file read in parts (see xmlparser.py): the index of this part
+        self.more = False           # more parts of this file follow
+        self.failed = False         # the file could not be parsed (a diagnostic says why): the records of its parts before are kept
+        self.diagnostics = []       # what the parser found wrong in the file (see diagnostic_add())
+
+    # same signature/return as SQL3Util.datatype_insert
+    def datatype_insert(self, typeinfo):
+        idkey = hashutil.hash_datatype(typeinfo)
+        self.records.append(('datatypes', dict(typeinfo)))
+        self.recordIds.append(('datatypes', idkey))
+        return idkey
+
+    # same signature/return as SQL3Util.member_insert
+    def member_insert(self, member, idkey=None):
+        if idkey is None:
+            idkey = hashutil.hash_member(member)
+        self.records.append(('typemembers', dict(member)))
+        self.recordIds.append(('typemembers', idkey))
+        return idkey
+
+    # same signature as SQL3Util.diagnostic_add (the writer gives it the source file)
+    def diagnostic_add(self, severity, code, message, idkey='', typeName='', typePath='', candidates=(), source=''):
+        self.diagnostics.append({'severity': severity, 'code': code, 'message': message, 'idkey': idkey, 'typeName': typeName,
+                                 'typePath': typePath, 'candidates': list(candidates), 'source': source})
+
+    def __len__(self):
+        return len(self.records)
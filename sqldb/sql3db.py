@@ -5,16 +5,100 @@
 # must display this notice unaltered.
 # This code contains trade secrets of Real-Time Innovations, Inc.
 #
+import os
 import sqlite3
 import json
-from . import hashutil, types
+from . import types
+
+_datatypeColumns = ('idkey', 'typeName', 'typePath', 'typeKind', 'inherits', 'memberList', 'tags', 'flags', 'notes')
+_memberColumns = ('idkey', 'memberName', 'typeName', 'typePath', 'attributes', 'idkeyRef', 'valdefs', 'tags', 'flags', 'notes')
+
+# page cache of a scan's connections (see scan_pragmas()), in KB
+scanCacheKB = 64 * 1024
+
+# insert a record, or update the row with the same idkey (its tags are the union of both)
+def _upsert_sql(table, columns):
+    newTags = 'EXISTS (SELECT value FROM json_each(excluded.tags) EXCEPT SELECT value FROM json_each({}.tags))'.format(table)
+    tagUnion = """(SELECT '[' || group_concat(json_quote(value), ', ') || ']' FROM
+        (SELECT value FROM json_each({0}.tags) UNION SELECT value FROM json_each(excluded.tags) ORDER BY value))""".format(table)
+    valueColumns = [column for column in columns if column not in ('idkey', 'tags')]
+    return """INSERT INTO {table} ({columns}) VALUES ({marks})
+    ON CONFLICT (idkey) DO UPDATE SET {setValues}, tags = CASE WHEN {newTags} THEN {tagUnion} ELSE {table}.tags END
+    WHERE {newTags} OR {changed}""".format(
+        table=table, columns=', '.join(columns), marks=','.join('?' * len(columns)),
+        setValues=', '.join('{0}=excluded.{0}'.format(column) for column in valueColumns), newTags=newTags, tagUnion=tagUnion,
+        changed=' OR '.join('{0}.{1} IS NOT excluded.{1}'.format(table, column) for column in valueColumns))
+
+_upsertDatatype = _upsert_sql('datatypes', _datatypeColumns)
+_upsertMember = _upsert_sql('typemembers', _memberColumns)
+
+# the schema of a database written by this version (one without a schema_version table is version 1 or 2)
+schemaVersion = 3
+
+# the statements of a trigger that sets the typetags rows of the datatypes row NEW from its tags
+# (no 'INSERT OR IGNORE': a trigger uses the conflict clause of the statement that fired it)
+_tagValues = "SELECT value FROM json_each(CASE WHEN json_valid(NEW.tags) THEN NEW.tags ELSE '[]' END)"
+_tagSync = ("DELETE FROM typetags WHERE idkey = NEW.idkey; "
+            "INSERT INTO tags (tag) SELECT DISTINCT value FROM ({0}) WHERE value NOT IN (SELECT tag FROM tags); "
+            "INSERT INTO typetags (idkey, tagId) SELECT NEW.idkey, tagId FROM tags WHERE tag IN ({0});").format(_tagValues)
+
+# the statements that upgrade a database to each version after 1 (see schema_upgrade())
+# sourcefiles, sourcerecords: the manifest of the scanned files, and the records each produced
+# scancheckpoint: the last unfinished scan into this database
+# diagnostics: what the parsers and the resolver found wrong (see diagnostic_add())
+# datatypes_name, typemembers_idkeyref: the lookups of the types by name, and of the members by reference
+# tags, typetags: the tags of each type, kept in step with datatypes.tags by triggers
+_schemaMigrations = [
+    (2, ["CREATE TABLE IF NOT EXISTS sourcefiles (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, hash TEXT)",
+         "CREATE TABLE IF NOT EXISTS sourcerecords (path TEXT, idkey TEXT, tableName TEXT)",
+         "CREATE INDEX IF NOT EXISTS sourcerecords_path ON sourcerecords (path)",
+         "CREATE INDEX IF NOT EXISTS sourcerecords_idkey ON sourcerecords (idkey)",
+         "CREATE TABLE IF NOT EXISTS scancheckpoint (scan TEXT PRIMARY KEY, position TEXT, fileCount INTEGER)",
+         "CREATE TABLE IF NOT EXISTS diagnostics (severity TEXT, code TEXT, idkey TEXT, typeName TEXT, typePath TEXT, candidates TEXT, source TEXT, message TEXT)",
+         "CREATE INDEX IF NOT EXISTS diagnostics_idkey ON diagnostics (idkey)",
+         "CREATE INDEX IF NOT EXISTS diagnostics_source ON diagnostics (source)",
+         "CREATE INDEX IF NOT EXISTS datatypes_name ON datatypes (typeName, typePath)",
+         "CREATE INDEX IF NOT EXISTS typemembers_idkeyref ON typemembers (idkeyRef, typeName)"]),
+    (3, ["CREATE TABLE IF NOT EXISTS tags (tagId INTEGER PRIMARY KEY, tag TEXT UNIQUE)",
+         "CREATE TABLE IF NOT EXISTS typetags (idkey TEXT, tagId INTEGER, PRIMARY KEY (idkey, tagId)) WITHOUT ROWID",
+         "CREATE INDEX IF NOT EXISTS typetags_tag ON typetags (tagId, idkey)",
+         "CREATE TRIGGER IF NOT EXISTS datatypes_tags_insert AFTER INSERT ON datatypes BEGIN {} END".format(_tagSync),
+         "CREATE TRIGGER IF NOT EXISTS datatypes_tags_update AFTER UPDATE OF tags ON datatypes WHEN OLD.tags IS NOT NEW.tags BEGIN {} END".format(_tagSync),
+         "CREATE TRIGGER IF NOT EXISTS datatypes_tags_delete AFTER DELETE ON datatypes BEGIN DELETE FROM typetags WHERE idkey = OLD.idkey; END",
+         # (the tags of the rows already written)
+         "INSERT OR IGNORE INTO tags (tag) SELECT value FROM datatypes, json_each(CASE WHEN json_valid(datatypes.tags) THEN datatypes.tags ELSE '[]' END) ORDER BY datatypes.rowid",
+         "INSERT OR IGNORE INTO typetags (idkey, tagId) SELECT datatypes.idkey, tags.tagId FROM datatypes, "
+         "json_each(CASE WHEN json_valid(datatypes.tags) THEN datatypes.tags ELSE '[]' END) JOIN tags ON tags.tag = json_each.value"]),
+]
+
+# the words of a tag filter: words are OR'ed, '&' between groups of words AND's them
+# returns the groups, each a list of tags (a type matches if it has one tag of each group)
+def tag_query(text):
+    return [group.split() for group in text.split('&') if len(group.split()) > 0]
+
+# does a type with this set of tags match the groups of tag_query()?
+def tags_match(tagSet, tagGroups):
+    return all(any(tag in tagSet for tag in group) for group in tagGroups)
 
 class SQL3Util():
 
-    def __init__(self, dbName):
+    # readOnly: open the file as it is, for a query (no schema upgrade; the file must exist)
+    def __init__(self, dbName, readOnly=False):
         self.dbName = dbName
-        self.connection = sqlite3.connect(self.dbName)
+        if readOnly:
+            uriPath = os.path.abspath(dbName).replace('%', '%25').replace('?', '%3f').replace('#', '%23')
+            self.connection = sqlite3.connect('file:{}?mode=ro'.format(uriPath), uri=True)
+        else:
+            self.connection = sqlite3.connect(self.dbName)
         self.cursor = self.connection.cursor()
+        self.tagTables = False      # the tags/typetags tables are there (schema version 3)
+        self.typeOrder = 'rowid'    # the order of the types found for a reference: the first is used (see path_record_find_by_name_path())
+        # (an older database, as dbfiles/ros2h.db, is upgraded when it is opened)
+        if self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='datatypes'").fetchone() is not None:
+            if readOnly:
+                self.tagTables = self.schema_version() >= 3
+            else:
+                self.schema_upgrade()
 
     # close the database
     def database_close(self):
@@ -24,90 +108,218 @@ class SQL3Util():
     def database_commit(self):
         self.connection.commit()
 
-    # create the tables for datatypes, typemembers
+    # discard the changes since the last commit
+    def database_rollback(self):
+        self.connection.rollback()
+
+    # create the tables for datatypes, typemembers, and the manifest of scanned source files
     def create_tables(self):
         self.cursor.execute("CREATE TABLE IF NOT EXISTS datatypes (idkey TEXT PRIMARY KEY, typeName TEXT, typePath TEXT, typeKind TEXT, inherits TEXT, memberList TEXT, tags TEXT, flags TEXT, notes TEXT)")
         self.cursor.execute("CREATE TABLE IF NOT EXISTS typemembers (idkey TEXT PRIMARY KEY, memberName TEXT, typeName TEXT, typePath TEXT, attributes TEXT, idkeyRef TEXT, valdefs TEXT, tags TEXT, flags TEXT, notes TEXT)")
+        # (and the tables and indexes of the later versions)
+        self.schema_upgrade()
+
+    # the schema version of this database (1 if it predates the schema_version table)
+    def schema_version(self):
+        if self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'").fetchone() is None:
+            return 1
+        row = self.cursor.execute('SELECT version FROM schema_version').fetchone()
+        return 1 if row is None else row[0]
+
+    # bring the schema up to schemaVersion; a database that can't be written is left as it is
+    def schema_upgrade(self):
+        version = self.schema_version()
+        self.tagTables = version >= 3
+        if version >= schemaVersion:
+            return
+        try:
+            for migrationVersion, statements in _schemaMigrations:
+                if migrationVersion > version:
+                    for statement in statements:
+                        self.cursor.execute(statement)
+            self.cursor.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER)')
+            self.cursor.execute('DELETE FROM schema_version')
+            self.cursor.execute('INSERT INTO schema_version (version) VALUES (?)', (schemaVersion,))
+            self.database_commit()
+            self.tagTables = True
+        except sqlite3.OperationalError:
+            self.database_rollback()
 
     # insert this type (dict) into the datatypes table, merge the TAGS if row already exists
     # columns: idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags, notes
     def datatype_insert(self, typeinfo):
         # hash the non-TAG contents to create a unique ID
+        # (hashutil is imported by the writers only: a query doesn't load hashlib)
+        from . import hashutil
         idkey = hashutil.hash_datatype(typeinfo)
-        # fetch the record if it exists
-        dTypeList = self.cursor.execute('SELECT tags FROM datatypes WHERE idkey=?', (idkey,)).fetchall()
-        tagSet = set(typeinfo['tags'])
-        if len(dTypeList) > 0:
-            # should be only 1 record
-            if len(dTypeList) > 1:
-                print("ERROR ------ sql3db.py line 28-ish: {}".format(dTypeList))
-
-            # add the current tag to the TAGS retrieved
-            for tagP in dTypeList:
-                for tagM in tagP:
-                    tagN = json.loads(tagM)
-                    for tag in tagN:
-                        tagSet.add(tag)
-
-        tagString = json.dumps(list(tagSet))
-
-        self.cursor.execute("INSERT or REPLACE INTO datatypes (idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags, notes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", 
-                            (idkey, typeinfo['typeName'], typeinfo['typePath'], typeinfo['typeKind'], typeinfo['inherits'], typeinfo['memberList'], tagString, typeinfo['flags'], typeinfo['notes']))
+        self.cursor.execute(_upsertDatatype, _record_row(idkey, typeinfo, _datatypeColumns, {}))
         return idkey
 
     # insert this data member into the 'typemembers' table, merge the TAGS if row already exists
     # columns: idkey, memberName, typeName, typePath, attributes, idkeyRef, valdefs, tags, flags, notes
-    def member_insert(self, member):
+    # idkey: hashutil.hash_member(member), if the caller already has it
+    def member_insert(self, member, idkey=None):
         # Hash contents to get the member IDKEY
-        idkey = hashutil.hash_member(member)
-        tagSet = set(member['tags'])
-        # fetch the record if it exists
-        tMemberList = self.cursor.execute('SELECT tags FROM typemembers WHERE idkey=?', (idkey,)).fetchall()
-        if len(tMemberList) > 0:
-            # should be only 1 record
-            if len(tMemberList) > 1:
-                print("ERROR ------ sql3db.py line 53-ish: {}".format(tMemberList))
-
-            # add the current tag to the TAGS retrieved
-            for tagP in tMemberList:
-                for tagM in tagP:
-                    tagN = json.loads(tagM)
-                    for tag in tagN:
-                        tagSet.add(tag)
-        tagString = json.dumps(list(tagSet))
-
-        self.cursor.execute("INSERT OR REPLACE INTO typemembers (idkey, memberName, typeName, typePath, attributes, idkeyRef, valdefs, tags, flags, notes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", 
-                            (idkey, member['memberName'], member['typeName'], member['typePath'], member['attributes'], member['idkeyRef'], member['valdefs'], tagString, member['flags'], member['notes']))
+        if idkey is None:
+            from . import hashutil
+            idkey = hashutil.hash_member(member)
+        self.cursor.execute(_upsertMember, _record_row(idkey, member, _memberColumns, {}))
         return idkey
 
+    # replay a list of records (as collected by recbatch.RecordBatch), in order, one executemany per table
+    # recordIds: the (tableName, idkey) of each record, if the caller has them (else they are hashed)
+    # returns a list of (tableName, idkey) for the inserted records
+    def records_insert(self, records, recordIds=None):
+        if recordIds is None:
+            from . import hashutil
+            recordIds = [(tableName, hashutil.hash_datatype(record) if tableName == 'datatypes' else hashutil.hash_member(record))
+                         for tableName, record in records]
+        tagStrings = {}
+        datatypeRows = []
+        memberRows = []
+        for (tableName, record), (tableName_, idkey) in zip(records, recordIds):
+            if tableName == 'datatypes':
+                datatypeRows.append(_record_row(idkey, record, _datatypeColumns, tagStrings))
+            else:
+                memberRows.append(_record_row(idkey, record, _memberColumns, tagStrings))
+        if len(datatypeRows) > 0:
+            self.cursor.executemany(_upsertDatatype, datatypeRows)
+        if len(memberRows) > 0:
+            self.cursor.executemany(_upsertMember, memberRows)
+        return list(recordIds)
+
+    # tune this connection for a scan writing many records: a write-ahead log, synced at checkpoints, a larger page cache
+    def scan_pragmas(self):
+        self.cursor.execute('PRAGMA journal_mode=WAL').fetchone()
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
+        self.cursor.execute('PRAGMA cache_size=-{}'.format(scanCacheKB))
+        self.cursor.execute('PRAGMA temp_store=MEMORY')
+
+    # the scan is over: back to a rollback journal, so the database is one file again
+    # (stays in WAL mode if another connection has it open)
+    def scan_pragmas_end(self):
+        try:
+            self.cursor.execute('PRAGMA journal_mode=DELETE').fetchone()
+        except sqlite3.OperationalError:
+            pass
+
+    # return the manifest of scanned source files as a dict of { path: (mtime, size, hash) }
+    def sourcefiles_readall(self):
+        rtnDict = {}
+        for path, mtime, size, hash in self.cursor.execute('SELECT path, mtime, size, hash FROM sourcefiles').fetchall():
+            rtnDict[path] = (mtime, size, hash)
+        return rtnDict
+
+    # record a scanned source file and the (tableName, idkey) list it produced; replaces any previous entry
+    # (and the diagnostics of an earlier read of the file)
+    def sourcefile_update(self, path, mtime, size, hash, recordIds):
+        self.cursor.execute('DELETE FROM sourcerecords WHERE path=?', (path,))
+        self.cursor.execute("DELETE FROM diagnostics WHERE source=? AND idkey=''", (path,))
+        self.sourcefiles_add([(path, mtime, size, hash)], [(path, idkey, tableName) for tableName, idkey in sorted(set(recordIds))])
+
+    # sourcefile_update() of many files at once: fileRows of (path, mtime, size, hash), and the (path, idkey, tableName)
+    # recordRows they produced, added to those recorded (the files are new, or retired by sourcefile_retire())
+    def sourcefiles_add(self, fileRows, recordRows):
+        if len(fileRows) > 0:
+            self.cursor.executemany('INSERT OR REPLACE INTO sourcefiles (path, mtime, size, hash) VALUES (?, ?, ?, ?)', fileRows)
+        if len(recordRows) > 0:
+            self.cursor.executemany('INSERT INTO sourcerecords (path, idkey, tableName) VALUES (?, ?, ?)', recordRows)
+
+    # return the set of the paths of the source files that have records in the database: those of the manifest,
+    # and of a file read in parts whose scan stopped before its last part
+    def sourcefiles_paths(self):
+        return {path for (path,) in self.cursor.execute('SELECT path FROM sourcefiles UNION SELECT DISTINCT path FROM sourcerecords').fetchall()}
+
+    # return the (position, fileCount) of the checkpoint of this scan, or None
+    def scancheckpoint_read(self, scan):
+        return self.cursor.execute('SELECT position, fileCount FROM scancheckpoint WHERE scan=?', (scan,)).fetchone()
+
+    # record the checkpoint of a scan (it replaces the checkpoint of any other scan)
+    def scancheckpoint_update(self, scan, position, fileCount):
+        self.cursor.execute('DELETE FROM scancheckpoint WHERE scan!=?', (scan,))
+        self.cursor.execute('INSERT OR REPLACE INTO scancheckpoint (scan, position, fileCount) VALUES (?, ?, ?)', (scan, position, fileCount,))
+
+    # the scan is finished: forget its checkpoint
+    def scancheckpoint_clear(self, scan):
+        self.cursor.execute('DELETE FROM scancheckpoint WHERE scan=?', (scan,))
+
+    # return the (tableName, idkey) lists of these source files, as a dict of { path: [(tableName, idkey)..] }
+    def sourcerecords_read(self, paths):
+        rtnDict = {}
+        for pathChunk in _chunks(list(paths)):
+            marks = ','.join('?' * len(pathChunk))
+            for path, idkey, tableName in self.cursor.execute('SELECT path, idkey, tableName FROM sourcerecords WHERE path IN ({})'.format(marks), pathChunk).fetchall():
+                rtnDict.setdefault(path, []).append((tableName, idkey))
+        return rtnDict
+
+    # the file is unchanged (same content hash), only its stat info changed
+    def sourcefile_touch(self, path, mtime, size):
+        self.cursor.execute('UPDATE sourcefiles SET mtime=?, size=? WHERE path=?', (mtime, size, path,))
+
+    # forget a source file, and delete the datatypes/typemembers that no other source file produced.
+    # members that referenced a deleted datatype are reset to unresolved (idkeyRef '-1').
+    # returns the set of member idkeys that were reset.
+    def sourcefile_retire(self, path):
+        recordIds = self.cursor.execute('SELECT idkey, tableName FROM sourcerecords WHERE path=?', (path,)).fetchall()
+        self.cursor.execute('DELETE FROM sourcerecords WHERE path=?', (path,))
+        self.cursor.execute('DELETE FROM sourcefiles WHERE path=?', (path,))
+        retiredTypes = []
+        for idkey, tableName in recordIds:
+            if self.cursor.execute('SELECT 1 FROM sourcerecords WHERE idkey=? LIMIT 1', (idkey,)).fetchone() is None:
+                if tableName == 'datatypes':
+                    self.cursor.execute('DELETE FROM datatypes WHERE idkey=?', (idkey,))
+                    retiredTypes.append(idkey)
+                else:
+                    self.cursor.execute('DELETE FROM typemembers WHERE idkey=?', (idkey,))
+                    self.cursor.execute('DELETE FROM diagnostics WHERE idkey=?', (idkey,))
+        self.cursor.execute("DELETE FROM diagnostics WHERE source=? AND idkey=''", (path,))
+
+        resetMembers = set()
+        for idkeyChunk in _chunks(retiredTypes):
+            marks = ','.join('?' * len(idkeyChunk))
+            for (idkey,) in self.cursor.execute('SELECT idkey FROM typemembers WHERE idkeyRef IN ({})'.format(marks), idkeyChunk).fetchall():
+                resetMembers.add(idkey)
+            self.cursor.execute("UPDATE typemembers SET idkeyRef='-1' WHERE idkeyRef IN ({})".format(marks), idkeyChunk)
+        return resetMembers
+
+    # return the idkeys of unresolved members (idkeyRef '-1')
+    # uncheckedOnly: only those that resolve_member_trefs() never flagged 'UNRES' (as left by a cancelled scan)
+    def typemembers_unresolved(self, uncheckedOnly=False):
+        if uncheckedOnly:
+            memberList = self.cursor.execute("SELECT idkey FROM typemembers WHERE idkeyRef='-1' AND flags NOT LIKE '%UNRES%'").fetchall()
+        else:
+            memberList = self.cursor.execute("SELECT idkey FROM typemembers WHERE idkeyRef='-1'").fetchall()
+        return [idkey for (idkey,) in memberList]
+
+    # return the idkeys of unresolved members (idkeyRef '-1') that reference any of these type names
+    def typemembers_unresolved_by_typename(self, typeNames):
+        rtnList = []
+        for nameChunk in _chunks(list(typeNames)):
+            marks = ','.join('?' * len(nameChunk))
+            for (idkey,) in self.cursor.execute("SELECT idkey FROM typemembers WHERE idkeyRef='-1' AND typeName IN ({})".format(marks), nameChunk).fetchall():
+                rtnList.append(idkey)
+        return rtnList
+
     # recursive finder: return a collection of records and their dependencies that match a typeName
     def get_record_tree_by_typename_or_idkey_recurs(self, tags, typeRef, idkey=0):
+        # filter-out any rows without one of the tags
+        tagWhere, tagParams = self.tag_match_sql(tags, False)
         if idkey != 0:            # if an IDKEY was passed, use it first
-            dTypeList = self.cursor.execute('SELECT idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags FROM datatypes WHERE idkey=?', (idkey,)).fetchall()
+            dTypeList = self.cursor.execute('SELECT idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags FROM datatypes WHERE idkey=? AND ' + tagWhere, (idkey,) + tagParams).fetchall()
         elif '/' in typeRef:
             # otherwise, find by path/type name (such as 'std_msgs/')
             tparts = typeRef.split('/')
             typeName = tparts[-1]
             typeGroup = tparts[0]
-            dTypeList = self.cursor.execute('SELECT idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags FROM datatypes WHERE typeName=? AND typePath=?', (typeName,typeGroup,)).fetchall()
+            dTypeList = self.cursor.execute('SELECT idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags FROM datatypes WHERE typeName=? AND typePath=? AND ' + tagWhere + ' ORDER BY rowid', (typeName,typeGroup,) + tagParams).fetchall()
         else:
             # else find by type name only
             typeName = typeRef
-            dTypeList = self.cursor.execute('SELECT idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags FROM datatypes WHERE typeName=?', (typeName,)).fetchall()
+            dTypeList = self.cursor.execute('SELECT idkey, typeName, typePath, typeKind, inherits, memberList, tags, flags FROM datatypes WHERE typeName=? AND ' + tagWhere + ' ORDER BY rowid', (typeName,) + tagParams).fetchall()
 
         if dTypeList == None:
             return []
-        if len(tags) != 0:      # filter-out any rows with non-matching tags
-            tmpList = []
-            for dType in dTypeList:
-                tagmatch = False
-                for tag in tags:
-                    if tag in dType[6]:
-                        tagmatch = True
-                if tagmatch == True:
-                    tmpList.append(dType)
-            dTypeList = tmpList
-            
+
         typeGroup = []
         rtnVal = []
         const_id = ''
@@ -173,27 +385,50 @@ class SQL3Util():
 
 
     # find a type record by name(may have path elements).  Returns record IDKey list
+    # (in the order the types were written; only those with all the tags of tagmatch)
     def path_record_find_by_name_path(self, tagmatch, typeName, typePath=''):
+        tagWhere, tagParams = self.tag_match_sql(tagmatch, True)
         if typePath == '':
-            dbRtn = self.cursor.execute('SELECT idkey, tags FROM datatypes WHERE typeName=?', (typeName,)).fetchall()
+            dbRtn = self.cursor.execute('SELECT idkey FROM datatypes WHERE typeName=? AND ' + tagWhere + ' ORDER BY ' + self.typeOrder, (typeName,) + tagParams).fetchall()
         else:
-            dbRtn = self.cursor.execute('SELECT idkey, tags FROM datatypes WHERE typeName=? AND typePath=?', (typeName,typePath,)).fetchall()
-        
-        # do the tags match?
-        rtnVal = []
-        for dbId, dbTag in dbRtn:
-            dbtags = json.loads(dbTag)
-            if all(tags in dbtags for tags in tagmatch):
-                rtnVal.append(dbId)
-        return rtnVal
+            dbRtn = self.cursor.execute('SELECT idkey FROM datatypes WHERE typeName=? AND typePath=? AND ' + tagWhere + ' ORDER BY ' + self.typeOrder, (typeName,typePath,) + tagParams).fetchall()
+        return [dbId for (dbId,) in dbRtn]
+
+    # the condition (and its parameters) on a datatypes row to have one of the tags (all of them: matchAll);
+    # always true if there are no tags
+    def tag_match_sql(self, tags, matchAll):
+        tags = tuple(sorted(set(tags)))
+        if len(tags) == 0:
+            return '1', ()
+        marks = ','.join('?' * len(tags))
+        if self.tagTables:
+            tagRows = 'SELECT tagId FROM typetags WHERE typetags.idkey = datatypes.idkey AND tagId IN (SELECT tagId FROM tags WHERE tag IN ({}))'.format(marks)
+        else:
+            tagRows = "SELECT DISTINCT value FROM json_each(CASE WHEN json_valid(datatypes.tags) THEN datatypes.tags ELSE '[]' END) WHERE value IN ({})".format(marks)
+        if matchAll:
+            return '(SELECT count(*) FROM ({})) = {}'.format(tagRows, len(tags)), tags
+        return 'EXISTS ({})'.format(tagRows), tags
 
     # go through the typemembers & try to fix any unknown idKeyRef(-1)
-    def resolve_member_trefs(self, tags):
+    # memberIds: limit this to a collection of member idkeys (for an incremental scan), None = all
+    # what can't be resolved (or is resolved by a guess) is recorded in the diagnostics table
+    # returns the idkeys of the members it resolved
+    def resolve_member_trefs(self, tags, memberIds=None):
         # get all typemembers, process only those with idKeyRef == '-1'
-        allMembers = self.cursor.execute('SELECT idkey, typeName, typePath, idKeyRef, flags FROM typemembers').fetchall()
+        if memberIds is None:
+            allMembers = self.cursor.execute('SELECT idkey, typeName, typePath, idKeyRef, flags FROM typemembers').fetchall()
+        else:
+            allMembers = []
+            for idkeyChunk in _chunks(list(memberIds)):
+                marks = ','.join('?' * len(idkeyChunk))
+                allMembers.extend(self.cursor.execute('SELECT idkey, typeName, typePath, idKeyRef, flags FROM typemembers WHERE idkey IN ({})'.format(marks), idkeyChunk).fetchall())
+        resolvedIds = []
+        foundIds = []
+        diagnostics = []
         for idkey, typeName, typePath, idKeyTag, flags in allMembers:
             # if a tag was used, then filter out any non-matches
             if idKeyTag == '-1':
+                resolvedIds.append(idkey)
                 # first, search by typePath and typeName
                 findIdx = self.path_record_find_by_name_path(tags, typeName, typePath)
                 if len(findIdx) == 0:
@@ -208,69 +443,128 @@ class SQL3Util():
                         self.cursor.execute('SELECT flags FROM typemembers WHERE idkey=?', (idkey,))
                         memberFlagSet = set(self.cursor.fetchall())
                         memberFlagSet.add('UNRES')
-                        self.cursor.execute('UPDATE typemembers SET flags=? WHERE idkey=?', (json.dumps(list(memberFlagSet)), idkey,))
-                        print('No match found for {}:{}/{}'.format(idkey, typePath, typeName))
+                        self.cursor.execute('UPDATE typemembers SET flags=? WHERE idkey=?', (json.dumps(sorted(memberFlagSet, key=str)), idkey,))
+                        diagnostics.append(('warning', 'unresolved', idkey, typeName, typePath, [], 'No match found for {}/{}'.format(typePath, typeName)))
                     else:
                         if len(findIdx) > 1:
                             # multiple results have been returned, ask the user for help
                             printPath = typePath
                             if 'IMPLIEDPATH' in flags:
                                 printPath = '(no-path)'
-                            print("FIXME: ambiguous path/name({}/{}) in source file (under {}) returns {} possible matches:".format(printPath, typeName, typePath, len(findIdx)))
-                            for idk in findIdx:
-                                tmpDType = self.cursor.execute('SELECT typeName, typePath FROM datatypes WHERE idkey=?', (idk,)).fetchall()[0]
-                                print('   ID: {}, {}/{}'.format(idk, tmpDType[1], tmpDType[0]))
-                            print("   This can be resolved by editing the source file to add a definitive path prefix")
+                            # (listed by path/name)
+                            candidates = sorted((self.datatype_path_name(idk), idk) for idk in findIdx)
+                            diagnostics.append(('warning', 'ambiguous', idkey, typeName, typePath, [idk for pathName, idk in candidates],
+                                                'Ambiguous path/name ({}/{}) has {} possible matches: {}; add a definitive path prefix in the source file'.format(
+                                                    printPath, typeName, len(findIdx), ', '.join(pathName for pathName, idk in candidates))))
 
                         else:
                             # We've found a potential match for this type reference,
                             # IF the typePath was implied by being in the same path as the parent -- OK to use
                             if 'IMPLIEDPATH' in flags:
                                 self.cursor.execute('UPDATE typemembers SET idkeyRef=? WHERE idkey=?', (findIdx[0], idkey,))
+                                foundIds.append(idkey)
                             else:
                                 # IF not implied from parent -- this requires edits to the source file
                                 # ** Let the user know of the trouble, and of the potential solution
-                                print('FIXME: data member references: "{}/{}", but that type cannot be found'.format(typePath, typeName))
-                                newPathType = self.cursor.execute('SELECT typeName, typePath FROM datatypes WHERE idkey=?', (findIdx[0],)).fetchall()[0]
-                                print('       a potential solution is "{}/{}", please update the source file'.format(newPathType[1], newPathType[0]))
+                                diagnostics.append(('warning', 'wrongpath', idkey, typeName, typePath, findIdx,
+                                                    'References "{}/{}", but that type cannot be found; a potential solution is "{}" in the source file'.format(
+                                                        typePath, typeName, self.datatype_path_name(findIdx[0]))))
                         
                 else:
                     # should have just 1 returned idkey; too many tags in use?
                     if len(findIdx) > 1:
-                        print("WARN: path/name:({}/{}) with tags({}), returns {} matches:".format(typePath, typeName, tags, len(findIdx)))
-                        for idk in findIdx:
-                            tmpDType = self.cursor.execute('SELECT typeName, typePath FROM datatypes WHERE idkey=?', (idk,)).fetchall()[0]
-                            print('   ID: {}, {}/{}'.format(idk, tmpDType[1], tmpDType[0]))
-                        print("   Defaulting to use the first match in the above list")
+                        diagnostics.append(('info', 'multimatch', idkey, typeName, typePath, findIdx,
+                                            'Path/name ({}/{}) with tags {} has {} matches; the first one is used'.format(typePath, typeName, tags, len(findIdx))))
 
                     # update the idkeyref for this member
                     self.cursor.execute('UPDATE typemembers SET idkeyRef=? WHERE idkey=?', (findIdx[0], idkey,))
-
-    # step through the datatypes, check each member for valid ID, set flag if trouble
+                    foundIds.append(idkey)
+
+        # (the diagnostics of an earlier resolve of these members are replaced)
+        self.diagnostics_clear(resolvedIds)
+        self.cursor.executemany("INSERT INTO diagnostics (severity, code, idkey, typeName, typePath, candidates, source, message) VALUES (?, ?, ?, ?, ?, ?, "
+                                "(SELECT path FROM sourcerecords WHERE idkey=? ORDER BY path LIMIT 1), ?)",
+                                [(severity, code, idkey, typeName, typePath, json.dumps(candidates), idkey, message)
+                                 for severity, code, idkey, typeName, typePath, candidates, message in diagnostics])
+        return foundIds
+
+    # 'typePath/typeName' of a datatype
+    def datatype_path_name(self, idkey):
+        typeName, typePath = self.cursor.execute('SELECT typeName, typePath FROM datatypes WHERE idkey=?', (idkey,)).fetchone()
+        return '{}/{}'.format(typePath, typeName)
+
+    # record a diagnostic ('error'|'warning'|'info', a code as 'parse', a one-line message) of the source file being written
+    # (same signature as RecordBatch.diagnostic_add)
+    def diagnostic_add(self, severity, code, message, idkey='', typeName='', typePath='', candidates=(), source=''):
+        self.diagnostics_insert([{'severity': severity, 'code': code, 'message': message, 'idkey': idkey, 'typeName': typeName,
+                                  'typePath': typePath, 'candidates': list(candidates)}], source)
+
+    # add diagnostic dicts (as collected by RecordBatch.diagnostic_add) of a source file
+    def diagnostics_insert(self, diagnostics, source=''):
+        self.cursor.executemany('INSERT INTO diagnostics (severity, code, idkey, typeName, typePath, candidates, source, message) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                [(diag['severity'], diag['code'], diag['idkey'], diag['typeName'], diag['typePath'], json.dumps(diag['candidates']),
+                                  diag.get('source') or source, diag['message']) for diag in diagnostics])
+
+    # forget the diagnostics of these members (they are resolved again); the ones of the parsers have no idkey
+    def diagnostics_clear(self, memberIds):
+        for idkeyChunk in _chunks(list(memberIds)):
+            marks = ','.join('?' * len(idkeyChunk))
+            self.cursor.execute('DELETE FROM diagnostics WHERE idkey IN ({})'.format(marks), idkeyChunk)
+
+    # forget the diagnostics of a code (those of the last scan are recorded again)
+    def diagnostics_clear_code(self, code):
+        self.cursor.execute('DELETE FROM diagnostics WHERE code=?', (code,))
+
+    # return the diagnostics, as a list of (severity, code, idkey, typeName, typePath, candidates, source, message)
+    # severity, code: only these ('' = all); source: only the source files with this in their path
+    def diagnostics_readall(self, severity='', code='', source=''):
+        if self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='diagnostics'").fetchone() is None:
+            return []
+        return self.cursor.execute("SELECT severity, code, idkey, typeName, typePath, candidates, source, message FROM diagnostics "
+                                   "WHERE (?='' OR severity=?) AND (?='' OR code=?) AND instr(coalesce(source, ''), ?) > 0 ORDER BY source, code, typePath, typeName",
+                                   (severity, severity, code, code, source,)).fetchall()
+
+    # return the count of diagnostics of each code, as a dict of { code: count }
+    def diagnostics_counts(self):
+        return dict(self.cursor.execute('SELECT code, count(*) FROM diagnostics GROUP BY code ORDER BY code').fetchall())
+
+    # restore the flags of the members of memberIds that were flagged 'UNRES' and are now resolved
+    # (resolve_member_trefs() saved their flags as [[flags], 'UNRES'])
+    def typemembers_clear_unres(self, memberIds):
+        for idkeyChunk in _chunks(list(memberIds)):
+            marks = ','.join('?' * len(idkeyChunk))
+            for idkey, flags in self.cursor.execute("SELECT idkey, flags FROM typemembers WHERE idkeyRef != '-1' AND flags LIKE '%UNRES%' AND idkey IN ({})".format(marks),
+                                                    idkeyChunk).fetchall():
+                try:
+                    savedFlags = [flag[0] for flag in json.loads(flags) if isinstance(flag, list) and len(flag) > 0]
+                except ValueError:
+                    continue
+                if len(savedFlags) > 0:
+                    self.cursor.execute('UPDATE typemembers SET flags=? WHERE idkey=?', (savedFlags[0], idkey,))
+
+    # step through the datatypes, check each member for valid ID, set (or clear) flag if trouble
     def datatypes_flag_member_errors(self):
         # get all the members, find any that have UNDEF ID's
-        undefMembers = []
-        memberList = self.typemembers_readall()
-        for thisMember in memberList:
-            if thisMember[5] == '-1':
-                #print('MemberUndef: {}:{}/{} {}'.format(thisMember[0], thisMember[3], thisMember[2], thisMember[1]))
-                undefMembers.append(thisMember[0])
-
-        if len(undefMembers) > 0:
-            # step through each type, see if it has any undefMembers
-            typeList = self.datatypes_readall()
-            for thisType in typeList:
-                typeMembers = json.loads(thisType[5])
-                for memberId in typeMembers:
-                    if memberId in undefMembers:
-                        #print("FlagUndefTypeMember in {}/{}".format(thisType[2], thisType[1]))
-                        # add an 'UNRES' flag to the type record
-                        typeFlags = []
-                        if len(thisType[7]) > 0:
-                            typeFlags = list(json.loads(thisType[7]))
-                        typeFlags.append('UNRES')
-                        self.cursor.execute('UPDATE datatypes SET flags=? WHERE idkey=?', (json.dumps(typeFlags), thisType[0],))
-            self.database_commit()
+        undefMembers = set()
+        for (memberId,) in self.cursor.execute("SELECT idkey FROM typemembers WHERE idkeyRef='-1'").fetchall():
+            undefMembers.add(memberId)
+
+        # step through each type, see if it has any undefMembers
+        # (an incremental scan can also resolve a type that was flagged before)
+        typeList = self.cursor.execute('SELECT idkey, memberList, flags FROM datatypes').fetchall()
+        for typeId, typeMemberList, flags in typeList:
+            if len(undefMembers) == 0 and 'UNRES' not in flags:
+                continue
+            typeFlags = []
+            if len(flags) > 0:
+                typeFlags = [flag for flag in json.loads(flags) if flag != 'UNRES']
+            if any(memberId in undefMembers for memberId in json.loads(typeMemberList)):
+                # add an 'UNRES' flag to the type record
+                typeFlags.append('UNRES')
+            newFlags = json.dumps(typeFlags) if len(typeFlags) > 0 else ''
+            if newFlags != flags:
+                self.cursor.execute('UPDATE datatypes SET flags=? WHERE idkey=?', (newFlags, typeId,))
+        self.database_commit()
 
 
     def datatypes_readall(self):
@@ -315,3 +609,54 @@ class SQL3Util():
     def update_tags(self, idKey, newTags):
         self.cursor.execute('UPDATE datatypes SET tags=? WHERE idkey=?', (newTags, idKey,))
 
+    # the idkeys (a set) of the types that match the tag groups of tag_query(): one tag of each group
+    def datatypes_tag_query(self, tagGroups):
+        if len(tagGroups) == 0:
+            return {idkey for (idkey,) in self.cursor.execute('SELECT idkey FROM datatypes')}
+        selects = []
+        params = []
+        for group in tagGroups:
+            if self.tagTables:
+                selects.append('SELECT idkey FROM typetags WHERE tagId IN (SELECT tagId FROM tags WHERE tag IN ({}))'.format(','.join('?' * len(group))))
+            else:
+                selects.append("SELECT idkey FROM datatypes, json_each(CASE WHEN json_valid(datatypes.tags) THEN datatypes.tags ELSE '[]' END) WHERE value IN ({})".format(','.join('?' * len(group))))
+            params.extend(group)
+        return {idkey for (idkey,) in self.cursor.execute(' INTERSECT '.join(selects), params)}
+
+    # add the tags to the types 'idkeys' (as an update of their JSON lists: the triggers update typetags)
+    # only the types that lack one of them are written
+    def datatypes_add_tags(self, idkeys, tags):
+        tagWhere, tagParams = self.tag_match_sql(tags, True)
+        if len(tagParams) == 0:
+            return
+        for idkeyChunk in _chunks(list(idkeys)):
+            self.cursor.execute("""UPDATE datatypes SET tags = (SELECT '[' || group_concat(json_quote(value), ', ') || ']' FROM
+                (SELECT value FROM json_each(CASE WHEN json_valid(datatypes.tags) THEN datatypes.tags ELSE '[]' END) UNION SELECT value FROM json_each(?) ORDER BY value))
+                WHERE idkey IN ({}) AND NOT {}""".format(','.join('?' * len(idkeyChunk)), tagWhere),
+                [json.dumps(list(tagParams))] + idkeyChunk + list(tagParams))
+
+    # remove the tags from the types 'idkeys'; only the types that have one of them are written
+    def datatypes_remove_tags(self, idkeys, tags):
+        tagWhere, tagParams = self.tag_match_sql(tags, False)
+        if len(tagParams) == 0:
+            return
+        for idkeyChunk in _chunks(list(idkeys)):
+            self.cursor.execute("""UPDATE datatypes SET tags = coalesce((SELECT '[' || group_concat(json_quote(value), ', ') || ']' FROM
+                (SELECT value FROM json_each(datatypes.tags) EXCEPT SELECT value FROM json_each(?) ORDER BY value)), '[]')
+                WHERE idkey IN ({}) AND {}""".format(','.join('?' * len(idkeyChunk)), tagWhere),
+                [json.dumps(list(tagParams))] + idkeyChunk + list(tagParams))
+
+# the column values of a datatype/member record, for _upsertDatatype/_upsertMember
+# tagStrings: a cache of the tags text of each tag list (the records of a scan share one)
+def _record_row(idkey, record, columns, tagStrings):
+    tags = tuple(record['tags'])
+    tagString = tagStrings.get(tags)
+    if tagString is None:
+        # (sorted: the same tags are always the same text)
+        tagString = tagStrings[tags] = json.dumps(sorted(set(tags)))
+    return [idkey] + [tagString if column == 'tags' else record[column] for column in columns[1:]]
+
+# split a list into chunks small enough for an SQL 'IN (?,?,..)' clause
+def _chunks(itemList, chunkSize=500):
+    for idx in range(0, len(itemList), chunkSize):
+        yield itemList[idx:idx + chunkSize]
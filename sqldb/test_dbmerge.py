@@ -0,0 +1,66 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# test_dbmerge.py -- a type in more than one merged database gets the tags of all
+#   python3 -m pytest sqldb
+import os
+import json
+import sqlite3
+import tempfile
+import unittest
+from rosp import rosscan
+from sqldb import dbmerge
+
+def write_files(rootDir, files):
+    for relPath, text in files.items():
+        filePath = os.path.join(rootDir, relPath)
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+        with open(filePath, 'w') as fileOut:
+            fileOut.write(text)
+
+# {typeName: tags} and {memberName: tags} of a database
+def type_tags(dbName):
+    dbConn = sqlite3.connect(dbName)
+    try:
+        typeTags = {typeName: json.loads(tags) for typeName, tags in dbConn.execute('SELECT typeName, tags FROM datatypes')}
+        memberTags = {memberName: json.loads(tags) for memberName, tags in dbConn.execute('SELECT memberName, tags FROM typemembers')}
+    finally:
+        dbConn.close()
+    return typeTags, memberTags
+
+class TestMergeTags(unittest.TestCase):
+
+    def scan(self, tmpDir, name, files, tags):
+        wsDir = os.path.join(tmpDir, name)
+        write_files(wsDir, files)
+        dbName = os.path.join(tmpDir, name + '.db')
+        rosscan.scan_paths([wsDir], rosscan.rosDataTypes, tags, dbName)
+        return dbName
+
+    def test_tag_union(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            shared = {'geo/msg/Point.msg': 'float64 x\nfloat64 y\n'}
+            firstDb = self.scan(tmpDir, 'first', dict(shared, **{'geo/msg/Only1.msg': 'int32 one\n'}), ['a', 'common'])
+            secondDb = self.scan(tmpDir, 'second', dict(shared, **{'geo/msg/Only2.msg': 'int32 two\n'}), ['b', 'common'])
+            mergedDb = os.path.join(tmpDir, 'merged.db')
+            counts = dbmerge.merge_databases(mergedDb, [firstDb, secondDb], onProgress=lambda message: None)
+            self.assertEqual(counts['types'], 3)
+            self.assertEqual(counts['unresolved'], 0)
+
+            typeTags, memberTags = type_tags(mergedDb)
+            self.assertEqual(sorted(typeTags['Point']), ['a', 'b', 'common'])
+            self.assertEqual(sorted(typeTags['Only1']), ['a', 'common'])
+            self.assertEqual(sorted(typeTags['Only2']), ['b', 'common'])
+            self.assertEqual(sorted(memberTags['x']), ['a', 'b', 'common'])
+
+            # merging again adds nothing
+            counts = dbmerge.merge_databases(mergedDb, [secondDb], onProgress=lambda message: None)
+            self.assertEqual((counts['types'], counts['members']), (0, 0))
+            self.assertEqual(type_tags(mergedDb), (typeTags, memberTags))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -147,23 +147,23 @@ rosTypeLookupTable = {
 }
 
 
+# reverse of the type tables: { format: { typeName: typeNumber } }, first match in table order wins
+typeNumberLookup = {}
+for typeFormat, typeTable in (('ros', rosTypeLookupTable), ('idl', idlTypeLookupTable), ('xml', xmlTypeLookupTable)):
+    typeNumberLookup[typeFormat] = {}
+    for typeNumLine in typeTable:
+        for typeName in typeTable[typeNumLine]:
+            typeNumberLookup[typeFormat].setdefault(typeName, typeNumLine)
+
 # given a type name and format (idl, xml, ros),
 # returns a primitive type number or -1 if unknown type name
 def typeNameToTypeNumber(typeName, typeFormat):
-    if typeFormat == 'ros':
-        typeTable = rosTypeLookupTable
-    elif typeFormat == 'idl':
-        typeTable = idlTypeLookupTable
-    elif typeFormat == 'xml':
-        typeTable = xmlTypeLookupTable
-    else:
+    typeLookup = typeNumberLookup.get(typeFormat)
+    if typeLookup is None:
         print('typeNameToTypeNumber: unknown format({})'.format(typeFormat))
         return -2
     # find the type
-    for typeNumLine in typeTable:
-        if typeName in typeTable[typeNumLine]:
-            return typeNumLine
-    return -1
+    return typeLookup.get(typeName, -1)
 
 # given a type number and format (idl, xml, ros)
 # returns a data type name for that format
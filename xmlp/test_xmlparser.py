@@ -0,0 +1,35 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# test_xmlparser.py -- the XML exported from a scanned workspace parses back to the same types
+#   python3 -m pytest xmlp
+import os
+import tempfile
+import unittest
+from rosp import rosscan
+from xmlp import xmltypex
+from idlp.test_idlparser import workspaceFiles, write_files, export_types, type_names
+
+class TestXMLRoundTrip(unittest.TestCase):
+
+    def test_export_parse_export(self):
+        with tempfile.TemporaryDirectory() as tmpDir:
+            write_files(os.path.join(tmpDir, 'ws'), workspaceFiles)
+            rosDb = os.path.join(tmpDir, 'ros.db')
+            rosscan.scan_paths([os.path.join(tmpDir, 'ws')], rosscan.rosDataTypes, ['t'], rosDb)
+            xmlText = export_types(rosDb, xmltypex.export_xml_type_file, os.path.join(tmpDir, 'ros_types.xml'))
+
+            write_files(os.path.join(tmpDir, 'xml'), {'types.xml': xmlText})
+            xmlDb = os.path.join(tmpDir, 'xml.db')
+            rosscan.scan_paths([os.path.join(tmpDir, 'xml')], rosscan.xmlDataTypes, ['t'], xmlDb)
+            self.assertEqual(export_types(xmlDb, xmltypex.export_xml_type_file, os.path.join(tmpDir, 'xml_types.xml')), xmlText)
+
+            # the types keep their ROS names and paths
+            self.assertEqual(type_names(xmlDb), type_names(rosDb))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+#
+# (c) 2022 Copyright, Real-Time Innovations.  All rights reserved.
+# No duplications, whole or partial, manual or electronic, may be made
+# without express written permission.  Any such copies, or revisions thereof,
+# must display this notice unaltered.
+# This code contains trade secrets of Real-Time Innovations, Inc.
+#
+# xmlparser.py -- read Connext XML type libraries (the <types> of a .xml file, as xmltypex.py writes
+#   them) into the datatypes/typemembers tables (the '.xml' scan type), as the IDL they stand for.
+#   The file is read in blocks by a pull parser, so a type library of any size is read in bounded memory.
+import re, json, base64
+import xml.etree.ElementTree as ET
+from sqldb import recbatch, hashutil
+from sqldb import types as idltypes
+from idlp import idlparser
+
+readSize = 256 * 1024       # bytes read at a time
+partRecords = 2000          # records per part (about)
+
+_xmlTypeLookup = idltypes.typeNumberLookup['xml']
+# the type names of older Connext XML files
+_xmlTypeAliases = {'char': 'char8', 'wchar': 'char16', 'octet': 'byte', 'short': 'int16', 'unsignedShort': 'uint16',
+                   'long': 'int32', 'unsignedLong': 'uint32', 'longLong': 'int64', 'unsignedLongLong': 'uint64',
+                   'float': 'float32', 'double': 'float64', 'longDouble': 'float128'}
+
+_skippedElements = {'union', 'valuetype', 'bitset', 'bitmask', 'sparse_valuetype'}
+_rootElements = {'dds', 'types'}
+# the elements that hold definitions: a definition is dropped from them once read
+_containerElements = {'dds', 'types', 'module'}
+# a <module> start tag named '..._Constants' (with any namespace prefix)
+_constantsModule = re.compile(rb'<(?:[\w.-]+:)?module\s[^>]*?\bname\s*=\s*["\']([^"\']*_Constants)["\']')
+
+
+class XMLError(Exception):
+    pass
+
+
+# the names of the '..._Constants' modules of an XML file (from its blocks): read without parsing the
+# XML, so a name in a comment is found as well (a struct is then only held back longer)
+def constants_module_names(dataBlocks):
+    names = set()
+    tail = b''
+    for block in dataBlocks:
+        text = tail + block
+        # (a tag cut by the end of the block is read with the next one)
+        cut = text.rfind(b'<')
+        if cut < 0:
+            cut = len(text)
+        names.update(match.group(1).decode('utf8', 'replace') for match in _constantsModule.finditer(text, 0, cut))
+        tail = text[cut:]
+    names.update(match.group(1).decode('utf8', 'replace') for match in _constantsModule.finditer(tail))
+    return names
+
+
+# an element's tag, without its namespace
+def local_name(elem):
+    tag = elem.tag
+    return tag if tag[0] != '{' else tag.rsplit('}', 1)[-1]
+
+
+# (the records are written as an IDL file's)
+class XMLParser(idlparser.IDLParser):
+
+    # from a file contents, update the database (same signature as IDLParser.extract)
+    def extract(self, file_contents, file_path, tags, dbase, module_path=None):
+        try:
+            fileData = file_contents.encode('utf8')
+            for batch in self.parse_parts([fileData], file_path, tags, partSize=0, constModules=constants_module_names([fileData])):
+                self.batch = batch
+                self.write_records(dbase)
+        except (XMLError, ET.ParseError) as e:
+            dbase.diagnostic_add('error', 'parse', 'XML parse error: {}'.format(e))
+
+    # read a file in blocks: yield its records as RecordBatch parts (see parse_parts()).
+    # self.contentHash is the hash of the file contents when the last part is yielded
+    # onRead: called with the size of each block read (None = nothing)
+    def parse_file(self, filePath, tags, partSize=partRecords, onRead=None):
+        self.part = 0
+        hasher = hashutil.file_hasher()
+        with open(filePath, 'rb') as xmlFile:
+            def rawBlocks():
+                for block in iter(lambda: xmlFile.read(readSize), b''):
+                    if onRead is not None:
+                        onRead(len(block))
+                    yield block
+            constModules = constants_module_names(rawBlocks())
+            xmlFile.seek(0)
+            def blocks():
+                while True:
+                    block = xmlFile.read(readSize)
+                    if len(block) == 0:
+                        return
+                    if onRead is not None:
+                        onRead(len(block))
+                    hasher.update(block)
+                    yield block
+            fileBlocks = blocks()
+            for batch in self.parse_parts(fileBlocks, filePath, tags, partSize, constModules):
+                if not batch.more:
+                    # (not a type library: the rest of the file is only hashed)
+                    for block in fileBlocks:
+                        pass
+                    self.contentHash = hashutil.hash_digest(hasher)
+                yield batch
+
+    # parse the blocks of an XML file: yield a RecordBatch each time partSize records are
+    # collected (0 = all in one), with more=True, then a last one with more=False
+    # constModules: the names of the '..._Constants' modules of the file (None = hold every struct to the end)
+    def parse_parts(self, dataBlocks, file_path, tags, partSize=partRecords, constModules=None):
+        self.reset(file_path, tags)
+        pullParser = ET.XMLPullParser(events=('start', 'end'))
+        self.elements = []          # the open elements, root first
+        self.typesDepth = 0         # > 0: inside <types>
+        self.typeLibrary = True     # False: the root element is not a type library's
+        self.constModules = constModules
+        self.heldStructs = {}       # (typePath, name of a _Constants module): [(scope, name, base, memberIds)] of the structs waiting for it
+        self.heldNames = {}         # scoped name: the heldStructs key of a struct held back
+        self.fileRead = False       # True: no struct is held back any more
+        self.part = 0
+        for block in dataBlocks:
+            pullParser.feed(block)
+            yield from self.read_events(pullParser, partSize)
+            if not self.typeLibrary:
+                break
+        else:
+            pullParser.close()
+            yield from self.read_events(pullParser, partSize)
+            if len(self.elements) > 0:
+                raise XMLError('unexpected end of file')
+        self.write_constants()
+        # (the structs whose _Constants module never came)
+        self.fileRead = True
+        for constKey in list(self.heldStructs):
+            self.release_structs(constKey)
+        self.batch.part = self.part
+        yield self.batch
+
+    # handle the events parsed so far; yields a part each time partSize records are collected
+    # (self.typeLibrary is False, and nothing is read, if this is not a type library)
+    def read_events(self, pullParser, partSize):
+        for event, elem in pullParser.read_events():
+            tag = local_name(elem)
+            if event == 'start':
+                if len(self.elements) == 0 and tag not in _rootElements:
+                    self.typeLibrary = False
+                    return
+                self.elements.append(elem)
+                if tag == 'types':
+                    self.typesDepth += 1
+                elif tag == 'module' and self.typesDepth > 0:
+                    self.scope.append(self.name_of(elem))
+                    self.scopeConsts.append([])
+                continue
+
+            self.elements.pop()
+            if tag == 'types':
+                self.typesDepth -= 1
+            elif self.typesDepth == 0:
+                pass
+            elif tag == 'module':
+                self.write_constants()
+                self.scopeConsts.pop()
+                self.scope.pop()
+            elif tag == 'struct':
+                self.read_struct(elem)
+            elif tag == 'const':
+                self.read_const(elem)
+            elif tag == 'enum':
+                self.read_enum(elem)
+            elif tag == 'typedef':
+                self.read_typedef(elem)
+            elif tag in _skippedElements:
+                self.batch.diagnostic_add('info', 'unsupported', 'Skipping XML {} {} (not supported)'.format(tag, elem.get('name', '')))
+            # done with a definition (its content, members.., is read with it): drop it from the tree
+            if len(self.elements) > 0 and local_name(self.elements[-1]) in _containerElements:
+                self.elements[-1].remove(elem)
+            if partSize > 0 and len(self.batch) >= partSize:
+                self.batch.part = self.part
+                self.batch.more = True
+                yield self.batch
+                self.part += 1
+                self.batch = recbatch.RecordBatch()
+
+    def name_of(self, elem):
+        name = elem.get('name')
+        if name is None or len(name) == 0:
+            raise XMLError('<{}> without a name'.format(local_name(elem)))
+        return name
+
+    def read_struct(self, elem):
+        memberIds = []
+        for memberElem in elem:
+            if local_name(memberElem) == 'member':
+                typeSpec = self.type_of(memberElem)
+                memberIds.append(self.write_member(self.name_of(memberElem), typeSpec, [], self.member_annotations(memberElem)))
+        base = elem.get('baseType')
+        if base is not None and len(base) == 0:
+            base = None
+        self.write_struct(self.name_of(elem), base, memberIds)
+
+    # a struct is held back while its _Constants module or its base struct is still to come
+    def write_struct(self, name, base, memberIds):
+        typePath, kindModule, inDds = idlparser.type_path(self.scope)
+        structName = name[:-1] if inDds and name.endswith('_') else name
+        constKey = (typePath, structName + '_Constants')
+        heldKey = None
+        if not self.fileRead:
+            if base is not None and len(self.heldNames) > 0:
+                heldKey = self.lookup(self.heldNames, base)
+            if heldKey is None and constKey not in self.constTypes and (self.constModules is None or constKey[1] in self.constModules):
+                heldKey = constKey
+        if heldKey is None:
+            idlparser.IDLParser.write_struct(self, name, base, memberIds)
+        else:
+            self.heldStructs.setdefault(heldKey, []).append((tuple(self.scope), name, base, memberIds))
+            self.heldNames[self.scoped(name)] = heldKey
+            self.localTypes[self.scoped(name)] = (structName, typePath)
+
+    def write_constants(self):
+        constKeys = set(self.constTypes)
+        idlparser.IDLParser.write_constants(self)
+        for constKey in set(self.constTypes) - constKeys:
+            self.release_structs(constKey)
+
+    # write the structs held back for the _Constants module constKey (in the order they were read)
+    def release_structs(self, constKey):
+        scope = self.scope
+        for heldScope, name, base, memberIds in self.heldStructs.pop(constKey, []):
+            self.scope = list(heldScope)
+            del self.heldNames[self.scoped(name)]
+            # (held back again if it waits for another module too)
+            self.write_struct(name, base, memberIds)
+        self.scope = scope
+
+    def read_const(self, elem):
+        name = self.name_of(elem)
+        typeSpec = self.type_of(elem)
+        value = self.value_of(elem.get('value', ''))
+        self.consts[self.scoped(name)] = value
+        if self.scope[-1:] == ['dds_'] or (len(self.scope) > 1 and self.scope[-2] == 'dds_'):
+            name = name[:-1] if name.endswith('_') else name
+        value = idlparser.unquote(value)
+        if typeSpec['typeName'] == 'boolean':
+            value = value.upper()
+        member = {'memberName': name, 'typeName': typeSpec['typeName'], 'typePath': typeSpec['typePath'], 'attributes': idlparser.attributes_json(typeSpec['attribs']),
+                  'idkeyRef': typeSpec['idkeyRef'], 'valdefs': json.dumps({'const': value}), 'tags': self.tags, 'flags': typeSpec['flags'], 'notes': ''}
+        self.scopeConsts[-1].append(self.batch.member_insert(member))
+
+    def read_enum(self, elem):
+        enumerators = []
+        value = 0
+        for enumElem in elem:
+            if local_name(enumElem) != 'enumerator':
+                continue
+            if enumElem.get('value') is not None:
+                try:
+                    value = int(self.value_of(enumElem.get('value')), 0)
+                except ValueError:
+                    raise XMLError('enumerator {} value is not an integer'.format(enumElem.get('name')))
+            enumerators.append((self.name_of(enumElem), value))
+            value += 1
+        self.write_enum(self.name_of(elem), enumerators)
+
+    def read_typedef(self, elem):
+        self.typedefs[self.scoped(self.name_of(elem))] = self.type_of(elem)
+
+    # the type of a member/const/typedef element (as IDLParser.type_spec(), its attributes included)
+    def type_of(self, elem):
+        typeName = elem.get('type', '')
+        attribs = []
+        arrayDimensions = elem.get('arrayDimensions')
+        if arrayDimensions is not None:
+            attribs.extend('a' + self.value_of(dim) for dim in arrayDimensions.split(','))
+        sequenceMaxLength = elem.get('sequenceMaxLength')
+        if sequenceMaxLength is not None:
+            attribs.append('q' + self.value_of(sequenceMaxLength))
+        stringMaxLength = elem.get('stringMaxLength')
+        if (typeName == 'string' or typeName == 'wstring') and stringMaxLength is not None:
+            attribs.append('s' + self.value_of(stringMaxLength))
+
+        typeName = _xmlTypeAliases.get(typeName, typeName)
+        if typeName in _xmlTypeLookup:
+            typeNumber = _xmlTypeLookup[typeName]
+            return {'typeName': idltypes.typeNumberToTypeName(typeNumber, 'idl'), 'typePath': '', 'idkeyRef': str(typeNumber),
+                    'flags': '', 'attribs': attribs}
+        if typeName == 'nonBasic':
+            typeName = elem.get('nonBasicTypeName', '')
+        if len(typeName) == 0:
+            raise XMLError('<{} name="{}"> without a type'.format(local_name(elem), elem.get('name', '')))
+        typeSpec = self.lookup(self.typedefs, typeName)
+        if typeSpec is None:
+            typeSpec = self.type_reference(typeName)
+        return dict(typeSpec, attribs=attribs + typeSpec['attribs'])
+
+    # an attribute value: a number, or an expression of the consts declared before it
+    def value_of(self, text):
+        text = text.strip()
+        if text.isdigit() or (text.startswith('-') and text[1:].isdigit()):
+            return text
+        return self.evaluate(idlparser.tokenize(text))
+
+    # the valdefs of a member element ({'default': .., 'min': .., 'max': ..}), as IDL annotations
+    def member_annotations(self, elem):
+        return {name: elem.get(name) for name in ('default', 'min', 'max') if elem.get(name) is not None}
+
+    # (an XML member's valdefs come from its attributes, not from annotation tokens)
+    def member_valdefs(self, annotations):
+        valdefs = {}
+        if 'default' in annotations:
+            value = annotations['default']
+            try:
+                valdefs['default'] = json.loads(value)
+            except ValueError:
+                valdefs['default-x'] = base64.b64encode(value.encode('utf8')).decode('ascii')
+        for name in ('min', 'max'):
+            if name in annotations:
+                valdefs[name] = annotations[name]
+        return json.dumps(valdefs) if len(valdefs) > 0 else ''
@@ -6,10 +6,13 @@
 # This code contains trade secrets of Real-Time Innovations, Inc.
 #
 # xmltypex.py -- export XML data type info from database record list
-import json
+import os, json
 from sqldb import types as idltypes
 from pathlib import Path
 
+# the file templates are in exports/, next to this file (so an export works from any directory)
+templateDir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'exports')
+
 # export (print) a single XML file of the passed-in type collection
 def export_xml_type(trec):
     xmlout = []
@@ -255,7 +258,7 @@ def export_xml_connector_cfg_file(trec, typeFileName, typeNameList):
     f.close()
 
     # now create a python application example (publish-only)
-    with open('./xmlp/exports/connector_pub.py.txt') as fr:
+    with open(os.path.join(templateDir, 'connector_pub.py.txt')) as fr:
         frbuf = fr.readlines()
     fr.close()
 